@@ -0,0 +1,140 @@
+"""
+音频库索引序列化性能测试
+比较旧的 json.dumps(default=encode, indent=4) + 逐字段重建 与 msgspec 类型化编码/解码（JSON与MessagePack）
+在源码根目录运行：python -m benchmarks.serialization_benchmark [条目数量]
+"""
+from typing import *
+import sys
+import json
+import time
+
+import msgspec
+
+import utils
+from zeta_bot import audio, schema
+from zeta_bot.resource import DownloadType
+
+
+def build_library(entry_num: int) -> list:
+    """
+    生成<entry_num>条与DoubleLinkedListDict.encode()格式相同的测试索引
+    """
+    node_list = []
+    for i in range(entry_num):
+        uid = f"bilibili_BV{i:010d}"
+        new_audio = audio.Audio(
+            title=f"测试音频 Test Audio {i}",
+            uid=uid,
+            source="bilibili",
+            source_id=f"BV{i:010d}",
+            download_type=DownloadType.BILIBILI_SINGLE,
+            path=f"./downloads/{uid} - 测试音频 Test Audio {i}.mp3",
+            duration=180 + i % 600
+        )
+        new_audio.set_cover_url(f"https://i0.hdslb.com/bfs/archive/{i}.jpg")
+        node_list.append({"item": new_audio, "key": uid})
+    return node_list
+
+
+def legacy_audio_dict(target_audio: audio.Audio) -> dict:
+    """
+    旧版Audio.encode()生成的字典
+    """
+    return {
+        "title": target_audio.get_title(),
+        "uid": target_audio.get_uid(),
+        "source": target_audio.get_source(),
+        "source_id": target_audio.get_source_id(),
+        "download_type": target_audio.get_download_type().encode(),
+        "path": target_audio.get_path(),
+        "duration": target_audio.get_duration(),
+        "duration_str": target_audio.get_duration_str(),
+        "cover_path": target_audio.get_cover_path(),
+        "cover_url": target_audio.get_cover_url()
+    }
+
+
+def legacy_encode(node_list: list) -> bytes:
+    legacy_list = [{"item": legacy_audio_dict(node["item"]), "key": node["key"]} for node in node_list]
+    return json.dumps(legacy_list, sort_keys=False, indent=4, ensure_ascii=False).encode("utf-8")
+
+
+def legacy_decode(content: bytes) -> list:
+    result = []
+    for node_dict in json.loads(content):
+        info_dict = node_dict["item"]
+        try:
+            download_type = DownloadType.decode(info_dict["download_type"])
+        except ValueError:
+            download_type = DownloadType.UNKNOWN
+        decoded_audio = audio.Audio(
+            title=info_dict["title"],
+            uid=info_dict["uid"],
+            source=info_dict["source"],
+            source_id=info_dict["source_id"],
+            download_type=download_type,
+            path=info_dict["path"],
+            duration=info_dict["duration"],
+        )
+        if info_dict["cover_path"] is not None:
+            decoded_audio.set_cover_path(info_dict["cover_path"])
+        if info_dict["cover_url"] is not None:
+            decoded_audio.set_cover_url(info_dict["cover_url"])
+        result.append({"item": decoded_audio, "key": node_dict["key"]})
+    return result
+
+
+def msgspec_json_encode(node_list: list) -> bytes:
+    return utils.json_dumps(node_list, indent=None).encode("utf-8")
+
+
+def msgspec_json_decode(content: bytes) -> list:
+    records = msgspec.json.decode(content, type=List[schema.LibraryNodeRecord])
+    return [{"item": audio.audio_decoder(record.item), "key": record.key} for record in records]
+
+
+msgpack_encoder = msgspec.msgpack.Encoder(enc_hook=lambda x: x.encode())
+msgpack_decoder = msgspec.msgpack.Decoder(List[schema.LibraryNodeRecord])
+
+
+def msgspec_msgpack_encode(node_list: list) -> bytes:
+    return msgpack_encoder.encode(node_list)
+
+
+def msgspec_msgpack_decode(content: bytes) -> list:
+    return [{"item": audio.audio_decoder(record.item), "key": record.key} for record in msgpack_decoder.decode(content)]
+
+
+def best_time(function: Callable, argument, repeat: int) -> Tuple[float, Any]:
+    """
+    返回<repeat>次运行中最快的一次的耗时（秒）以及运行结果
+    """
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(argument)
+        cost = time.perf_counter() - start
+        if best is None or cost < best:
+            best = cost
+    return best, result
+
+
+def main(entry_num: int = 50000, repeat: int = 3) -> None:
+    node_list = build_library(entry_num)
+    print(f"音频库索引条目数量：{entry_num}，每项取{repeat}次运行中的最快值\n")
+    print(f"{'方式':<24}{'编码 (ms)':>12}{'解码 (ms)':>12}{'大小 (KB)':>12}")
+
+    for name, encoder, decoder in [
+        ("json + indent=4（旧）", legacy_encode, legacy_decode),
+        ("msgspec JSON（紧凑）", msgspec_json_encode, msgspec_json_decode),
+        ("msgspec MessagePack", msgspec_msgpack_encode, msgspec_msgpack_decode),
+    ]:
+        encode_time, content = best_time(encoder, node_list, repeat)
+        decode_time, decoded = best_time(decoder, content, repeat)
+        assert len(decoded) == entry_num and decoded[-1]["key"] == node_list[-1]["key"]
+        print(f"{name:<24}{encode_time * 1000:>12.1f}{decode_time * 1000:>12.1f}{len(content) / 1024:>12.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
@@ -53,6 +53,21 @@ class JSONFileError(Exception):
         return f"JSON文件<{self.path}>已损坏"
 
 
+class JSONSchemaError(Exception):
+    """
+    json文件可以正常解析，但内容不符合要求的格式，与JSONFileError不同，不应被视为文件损坏
+    <raw>为按普通json解析得到的内容，可用于逐条转换
+    """
+    def __init__(self, path: str, raw: Any, description: str = ""):
+        super().__init__()
+        self.path = path
+        self.raw = raw
+        self.description = description
+
+    def __str__(self):
+        return f"JSON文件<{self.path}>的内容不符合格式：{self.description}"
+
+
 class KeyAlreadyExists(KeyError):
     def __init__(self, key: str):
         super().__init__()
@@ -0,0 +1,18 @@
+import os
+import sys
+import tempfile
+
+# 测试从仓库根目录导入模块，语言文件使用相对于根目录的路径
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from zeta_bot import output_console
+
+# 控制台为单例，需要在导入其他模块之前初始化，日志写入临时目录
+output_console.Console(tempfile.mkdtemp(prefix="zeta_bot_test_logs_"), "test", False)
+
+# 语言文件加载完成后切换到临时工作目录，导入模块时生成的配置文件不会写入仓库
+WORKING_DIRECTORY = tempfile.mkdtemp(prefix="zeta_bot_test_")
+os.makedirs(f"{WORKING_DIRECTORY}/configs")
+os.chdir(WORKING_DIRECTORY)
@@ -0,0 +1,112 @@
+import asyncio
+import time
+
+import pytest
+
+from zeta_bot import download_scheduler
+from zeta_bot.download_scheduler import DownloadPriority
+
+
+def test_slots_granted_by_priority_then_arrival():
+    order = []
+
+    async def main():
+        slots = download_scheduler.PrioritySlots(1)
+        await slots.acquire(DownloadPriority.BULK)
+
+        async def waiter(name, priority):
+            await slots.acquire(priority)
+            order.append(name)
+            slots.release()
+
+        tasks = []
+        for name, priority in (("prefetch", DownloadPriority.PREFETCH), ("bulk-1", DownloadPriority.BULK),
+                               ("now", DownloadPriority.NOW_PLAYING), ("bulk-2", DownloadPriority.BULK),
+                               ("next", DownloadPriority.NEXT_UP)):
+            tasks.append(asyncio.create_task(waiter(name, priority)))
+            await asyncio.sleep(0)
+        assert slots.waiting_num() == 5
+        assert slots.waiting_num(DownloadPriority.BULK) == 2
+
+        slots.release()
+        await asyncio.gather(*tasks)
+        assert slots.active_num() == 0
+
+    asyncio.run(main())
+    assert order == ["now", "next", "bulk-1", "bulk-2", "prefetch"]
+
+
+def test_new_request_does_not_jump_queue():
+    async def main():
+        slots = download_scheduler.PrioritySlots(1)
+        await slots.acquire(DownloadPriority.BULK)
+        waiter = asyncio.create_task(slots.acquire(DownloadPriority.PREFETCH))
+        await asyncio.sleep(0)
+
+        # 槽位空出后已分配给等待者，新的请求需要排队
+        slots.release()
+        late = asyncio.create_task(slots.acquire(DownloadPriority.NOW_PLAYING))
+        await asyncio.sleep(0)
+        assert waiter.done()
+        assert not late.done()
+
+        slots.release()
+        await late
+        assert slots.active_num() == 1
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_hands_slot_to_next():
+    async def main():
+        slots = download_scheduler.PrioritySlots(1)
+        await slots.acquire(DownloadPriority.BULK)
+        first = asyncio.create_task(slots.acquire(DownloadPriority.NOW_PLAYING))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(slots.acquire(DownloadPriority.PREFETCH))
+        await asyncio.sleep(0)
+
+        # 槽位已经分配给first，但first在被唤醒前取消
+        slots.release()
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        await asyncio.wait_for(second, timeout=1)
+        assert slots.active_num() == 1
+        assert slots.waiting_num() == 0
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def main():
+        slots = download_scheduler.PrioritySlots(1)
+        await slots.acquire(DownloadPriority.BULK)
+        waiter = asyncio.create_task(slots.acquire(DownloadPriority.NEXT_UP))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert slots.waiting_num() == 0
+
+        slots.release()
+        assert slots.active_num() == 0
+
+    asyncio.run(main())
+
+
+def test_token_bucket_limits_rate():
+    bucket = download_scheduler.TokenBucket(rate=20, capacity=2)
+
+    async def main():
+        start_time = time.monotonic()
+        for _ in range(2):
+            await bucket.acquire()
+        # 初始积累的令牌可以立即使用
+        assert time.monotonic() - start_time < 0.05
+
+        for _ in range(3):
+            await bucket.acquire()
+        return time.monotonic() - start_time
+
+    assert asyncio.run(main()) >= 3 / 20 * 0.9
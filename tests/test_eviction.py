@@ -0,0 +1,67 @@
+import asyncio
+
+from zeta_bot import eviction, file_management
+
+
+def test_get_policy():
+    assert isinstance(eviction.get_policy("LFU"), eviction.LFUPolicy)
+    assert isinstance(eviction.get_policy("gdsf"), eviction.GDSFPolicy)
+    assert isinstance(eviction.get_policy("unknown"), eviction.LRUPolicy)
+
+
+def test_lru_keeps_order():
+    policy = eviction.LRUPolicy()
+    assert policy.order(["a", "b", "c"]) == ["a", "b", "c"]
+
+
+def test_lfu_orders_by_frequency_then_recency():
+    policy = eviction.LFUPolicy()
+    for key in ("a", "b", "c", "a", "a", "c"):
+        policy.on_access(key, 1)
+    assert policy.order(["a", "b", "c"]) == ["b", "c", "a"]
+
+    policy.on_evict(["b"])
+    policy.on_access("b", 1)
+    assert policy.order(["a", "c", "b"]) == ["b", "c", "a"]
+
+
+def test_gdsf_prefers_large_rarely_used_files_and_ages():
+    policy = eviction.GDSFPolicy()
+    policy.on_access("large", 1000)
+    policy.on_access("small", 10)
+    policy.on_access("frequent", 1000)
+    policy.on_access("frequent", 1000)
+    assert policy.order(["small", "frequent", "large"]) == ["large", "frequent", "small"]
+
+    # 淘汰后膨胀值上升，新访问的音频优先级高于未再使用的旧音频
+    policy.on_evict(["small"])
+    policy.on_access("new", 1000)
+    assert policy.order(["new", "frequent", "large"]) == ["large", "frequent", "new"]
+
+
+def test_plan_eviction_skips_locked_audio(tmp_path):
+    root = tmp_path / "audio"
+    root.mkdir()
+    library = file_management.AudioFileLibrary(str(root), str(tmp_path / "library.json"), storage_capacity=10)
+    asyncio.run(library.initialize())
+
+    audio_dict = {}
+    for key, size in (("a", 4), ("b", 4), ("c", 2)):
+        (root / f"{key}.mp3").write_bytes(b"0" * size)
+        audio_dict[key] = file_management.audio.Audio(
+            key, key, "bilibili", key, file_management.DownloadType.BILIBILI_SINGLE, str(root / f"{key}.mp3"), 1
+        )
+        library._dl_list.append(audio_dict[key], key)
+        library._file_sizes[key] = size
+        library._used_storage_size += size
+
+    library.lock_audio("guild", audio_dict["a"])
+    victim_list = library._plan_eviction(3)
+    assert [item.get_uid() for item in victim_list] == ["b"]
+    # 删除所有未锁定的音频也无法腾出空间
+    assert library._plan_eviction(7) is None
+
+    assert asyncio.run(library._make_space(3))
+    assert "b" not in library
+    assert not (root / "b.mp3").exists()
+    assert library.get_used_storage_size() == 6
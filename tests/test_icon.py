@@ -0,0 +1,22 @@
+import time
+
+from zeta_bot import icon
+
+
+def test_resolve_returns_matching_url_and_files(tmp_path):
+    (tmp_path / "a.png").write_bytes(b"png")
+    icon_lib = icon.IconLib.cls()
+    icon_lib.load_icons(str(tmp_path))
+
+    icon_url, files = icon_lib.resolve("a.png")
+    assert icon_url == "attachment://a.png"
+    assert [file.filename for file in files] == ["a.png"]
+
+    # 上传完成后通过CDN链接引用，不再附带附件
+    expires_at = time.time() + 2 * icon.ICON_URL_REFRESH_MARGIN
+    icon_lib._uploaded["a.png"] = {"url": "https://cdn.example/a.png", "expires_at": expires_at}
+    assert icon_lib.resolve("a.png") == ("https://cdn.example/a.png", [])
+
+    # 即将过期的链接不再使用
+    icon_lib._uploaded["a.png"]["expires_at"] = time.time()
+    assert icon_lib.resolve("a.png")[0] == "attachment://a.png"
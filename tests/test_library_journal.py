@@ -0,0 +1,116 @@
+import asyncio
+import time
+
+import utils
+
+from zeta_bot import file_management, schema
+
+
+def make_record(key: str) -> schema.AudioRecord:
+    return schema.AudioRecord(
+        title=key, uid=key, source="bilibili", source_id=key, download_type="BILIBILI_SINGLE", path=f"{key}.mp3", duration=1
+    )
+
+
+def test_replay_applies_records_in_order(tmp_path):
+    journal = file_management.LibraryJournal(str(tmp_path / "library.journal"))
+    snapshot = [schema.LibraryNodeRecord(item=make_record(key), key=key) for key in ("a", "b", "c")]
+
+    journal.append({"op": "touch", "key": "a"})
+    journal.append({"op": "remove", "key": "b"})
+    journal.append({"op": "add", "key": "d", "item": make_record("d")})
+    journal.append({"op": "add", "key": "c", "item": make_record("c")})
+    assert len(journal) == 4
+
+    replayed = journal.replay(snapshot)
+    assert [node.key for node in replayed] == ["a", "d", "c"]
+    assert len(journal) == 4
+
+
+def test_replay_ignores_truncated_record(tmp_path):
+    path = tmp_path / "library.journal"
+    journal = file_management.LibraryJournal(str(path))
+    journal.append({"op": "add", "key": "a", "item": make_record("a")})
+    # 写入中断留下的不完整记录
+    with open(path, "a", encoding="utf-8") as file:
+        file.write('{"op": "remove", "ke')
+
+    replayed = journal.replay([])
+    assert [node.key for node in replayed] == ["a"]
+    assert len(journal) == 1
+
+    journal.rotate()
+    journal.discard_rotated()
+    assert not path.exists()
+    assert journal.replay([]) == []
+
+
+def test_library_compacts_journal_into_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_management, "JOURNAL_COMPACT_THRESHOLD", 3)
+    root = tmp_path / "audio"
+    root.mkdir()
+    path = tmp_path / "library.json"
+    library = file_management.AudioFileLibrary(str(root), str(path))
+    asyncio.run(library.initialize())
+
+    for key in ("a", "b"):
+        (root / f"{key}.mp3").write_bytes(b"0")
+        library._dl_list.append(file_management.audio.audio_decoder(make_record(key)), key)
+        asyncio.run(library._journal_append({"op": "add", "key": key, "item": make_record(key)}))
+    assert len(library._journal) == 2
+    assert utils.json_load(str(path)) == []
+
+    # 达到合并阈值后日志被合并进快照并清空
+    asyncio.run(library._journal_append({"op": "touch", "key": "a"}))
+    assert len(library._journal) == 0
+    assert [node["key"] for node in utils.json_load(str(path))] == ["a", "b"]
+
+
+def test_rotated_journal_is_replayed_until_discarded(tmp_path):
+    path = tmp_path / "library.journal"
+    journal = file_management.LibraryJournal(str(path))
+    journal.append({"op": "add", "key": "a", "item": make_record("a")})
+    journal.rotate()
+    assert len(journal) == 0
+    # 快照写入期间的新记录写入新的日志
+    journal.append({"op": "add", "key": "b", "item": make_record("b")})
+
+    # 快照写入中断：被转移的日志仍会被应用
+    assert [node.key for node in journal.replay([])] == ["a", "b"]
+    # 再次合并时追加到未完成的被转移日志中
+    journal.rotate()
+    assert not path.exists()
+    assert [node.key for node in journal.replay([])] == ["a", "b"]
+
+    journal.discard_rotated()
+    assert journal.replay([]) == []
+
+
+def test_save_keeps_records_appended_during_write(tmp_path, monkeypatch):
+    root = tmp_path / "audio"
+    root.mkdir()
+    path = tmp_path / "library.json"
+    library = file_management.AudioFileLibrary(str(root), str(path))
+    asyncio.run(library.initialize())
+
+    original_write = utils.atomic_write
+
+    async def main():
+        started = asyncio.Event()
+        loop = asyncio.get_running_loop()
+
+        def slow_write(write_path, content):
+            loop.call_soon_threadsafe(started.set)
+            time.sleep(0.05)
+            original_write(write_path, content)
+
+        monkeypatch.setattr(file_management.utils, "atomic_write", slow_write)
+        save_task = asyncio.create_task(library.save())
+        await started.wait()
+        # 写入在工作线程中进行，事件循环可以继续记录新的变动
+        await library._journal_append({"op": "add", "key": "a", "item": make_record("a")})
+        await save_task
+
+    asyncio.run(main())
+    assert len(library._journal) == 1
+    assert [node.key for node in library._journal.replay([])] == ["a"]
@@ -0,0 +1,72 @@
+import asyncio
+
+import utils
+
+from zeta_bot import file_management
+
+
+def make_entry(key: str, path: str) -> dict:
+    return {
+        "item": {
+            "title": key, "uid": key, "source": "bilibili", "source_id": key,
+            "download_type": "BILIBILI_SINGLE", "path": path, "duration": 1
+        },
+        "key": key
+    }
+
+
+def test_initialize_scans_files_and_drops_missing_entries(tmp_path):
+    root = tmp_path / "audio"
+    root.mkdir()
+    (root / "a.mp3").write_bytes(b"123")
+    (root / "b.mp3").write_bytes(b"12345")
+    (root / "invalid.mp3").write_bytes(b"1")
+    # 库目录以外的文件单独检查
+    outside = tmp_path / "outside.mp3"
+    outside.write_bytes(b"12")
+
+    path = tmp_path / "library.json"
+    utils.json_save(str(path), [
+        make_entry("a", str(root / "a.mp3")),
+        make_entry("missing", str(root / "missing.mp3")),
+        make_entry("b", str(root / "b.mp3")),
+        {"item": {"title": "缺少字段", "path": str(root / "invalid.mp3")}, "key": "invalid"},
+        make_entry("outside", str(outside)),
+    ])
+
+    library = file_management.AudioFileLibrary(str(root), str(path))
+    asyncio.run(library.initialize())
+
+    assert len(library) == 3
+    assert library.get_used_storage_size() == 3 + 5 + 2
+    assert [node["key"] for node in utils.json_load(str(path))] == ["a", "b", "outside"]
+    # 不符合格式的记录被跳过，但对应的文件不会被删除
+    assert (root / "invalid.mp3").exists()
+
+
+def test_initialize_creates_empty_library(tmp_path):
+    root = tmp_path / "audio"
+    root.mkdir()
+    path = tmp_path / "library.json"
+
+    library = file_management.AudioFileLibrary(str(root), str(path))
+    asyncio.run(library.initialize())
+
+    assert len(library) == 0
+    assert library.get_used_storage_size() == 0
+    assert library.get_startup_time() is not None
+
+
+def test_initialize_removes_partial_downloads(tmp_path):
+    root = tmp_path / "audio"
+    root.mkdir()
+    (root / "a.mp3").write_bytes(b"123")
+    (root / "b.mp3.part").write_bytes(b"12345")
+    path = tmp_path / "library.json"
+    utils.json_save(str(path), [make_entry("a", str(root / "a.mp3"))])
+
+    library = file_management.AudioFileLibrary(str(root), str(path))
+    asyncio.run(library.initialize())
+
+    assert library.get_used_storage_size() == 3
+    assert not (root / "b.mp3.part").exists()
@@ -0,0 +1,60 @@
+import asyncio
+
+from zeta_bot import member
+
+
+def make_library(monkeypatch, tmp_path) -> member.MemberLibrary:
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "configs").mkdir()
+    # 绕过单例，每个测试使用独立的用户库
+    return member.MemberLibrary.cls()
+
+
+def add_member(library: member.MemberLibrary, user_id: int) -> None:
+    library._member_dict[user_id] = {"id": user_id, "name": str(user_id), "group": "standard", "guilds": {}}
+    library.hashtag_file[user_id] = str(user_id)
+    library._hashtag_file_dirty = True
+    library._dirty_members.add(user_id)
+
+
+def test_failed_flush_keeps_changes_and_retries(monkeypatch, tmp_path):
+    library = make_library(monkeypatch, tmp_path)
+
+    def failed_write(snapshot):
+        raise OSError("磁盘已满")
+
+    async def main():
+        add_member(library, 1)
+        monkeypatch.setattr(library, "_write_snapshot", failed_write)
+        await library.flush()
+        assert library._dirty_members == {1}
+        assert library._hashtag_file_dirty
+        assert library._flush_handle is not None
+
+        monkeypatch.undo()
+        monkeypatch.chdir(tmp_path)
+        await library.flush()
+        assert library._dirty_members == set()
+        assert not library._hashtag_file_dirty
+
+    asyncio.run(main())
+    assert (tmp_path / "data" / "members" / "1.json").exists()
+
+
+def test_evicts_idle_saved_members(monkeypatch, tmp_path):
+    library = make_library(monkeypatch, tmp_path)
+    monkeypatch.setattr(member, "MEMBER_CACHE_LIMIT", 2)
+    for user_id in (1, 2, 3):
+        add_member(library, user_id)
+    library.save_all()
+    library._dirty_members.add(3)
+
+    # 只移出已保存的用户，数量超出上限时从最久未使用的开始
+    assert library.evict_idle_members() == 1
+    assert list(library._member_dict) == [2, 3]
+
+    monkeypatch.setattr(member, "MEMBER_IDLE_TIMEOUT", 0)
+    assert library.evict_idle_members() == 1
+    assert list(library._member_dict) == [3]
+    # 被移出的用户在下次使用时重新读取
+    assert library.get_group(1) == "standard"
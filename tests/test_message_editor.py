@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+import discord
+
+from zeta_bot import message_editor
+
+
+class DummyMessage:
+    def __init__(self, message_id):
+        self.id = message_id
+
+
+def test_message_key():
+    assert message_editor.message_key(DummyMessage(1)) == 1
+    target = object()
+    assert message_editor.message_key(target) == id(target)
+
+
+def test_submit_coalesces_edits_and_keeps_interval():
+    async def main():
+        scheduler = message_editor.MessageEditScheduler(interval=0.05)
+        edit_list = []
+
+        def make_edit(value):
+            async def edit():
+                edit_list.append((value, time.monotonic()))
+            return edit
+
+        for value in range(5):
+            scheduler.submit("a", make_edit(value))
+        await asyncio.sleep(0)
+        for value in range(5, 10):
+            scheduler.submit("a", make_edit(value))
+        await scheduler.wait("a")
+        return scheduler, edit_list
+
+    scheduler, edit_list = asyncio.run(main())
+    # 第一次编辑立即执行，之后只执行最后一次提交的编辑
+    assert [value for value, edit_time in edit_list] == [4, 9]
+    assert edit_list[1][1] - edit_list[0][1] >= 0.05 * 0.9
+    assert scheduler.get_metrics() == {"submitted": 10, "edited": 2, "pending": 0, "background": 0}
+
+
+def test_submit_stops_when_message_is_deleted():
+    class DummyResponse:
+        status = 404
+        reason = "Not Found"
+
+    async def main():
+        scheduler = message_editor.MessageEditScheduler(interval=0.01)
+
+        async def deleted():
+            raise discord.NotFound(DummyResponse(), "Unknown Message")
+
+        scheduler.submit("a", deleted)
+        scheduler.submit("a", deleted)
+        await scheduler.wait("a")
+        await asyncio.sleep(0)
+        return scheduler.get_metrics()
+
+    assert asyncio.run(main()) == {"submitted": 2, "edited": 0, "pending": 0, "background": 0}
+
+
+def test_run_keeps_reference_until_done():
+    async def main():
+        scheduler = message_editor.MessageEditScheduler()
+        event = asyncio.Event()
+        sent = []
+
+        async def send():
+            await event.wait()
+            sent.append(True)
+
+        scheduler.run(send)
+        assert scheduler.get_metrics()["background"] == 1
+        event.set()
+        while scheduler.get_metrics()["background"] > 0:
+            await asyncio.sleep(0)
+        return sent
+
+    assert asyncio.run(main()) == [True]
+
+
+def test_wait_all_flushes_pending_edits():
+    async def main():
+        scheduler = message_editor.MessageEditScheduler(interval=0.05)
+        edit_list = []
+
+        def make_edit(value):
+            async def edit():
+                edit_list.append(value)
+            return edit
+
+        for key in ("a", "b"):
+            scheduler.submit(key, make_edit(f"{key}1"))
+        await asyncio.sleep(0)
+        for key in ("a", "b"):
+            scheduler.submit(key, make_edit(f"{key}2"))
+        scheduler.run(make_edit("new"))
+        await scheduler.wait_all(timeout=1)
+        return scheduler, edit_list
+
+    scheduler, edit_list = asyncio.run(main())
+    assert sorted(edit_list) == ["a1", "a2", "b1", "b2", "new"]
+    assert scheduler.get_metrics()["pending"] == 0
@@ -0,0 +1,101 @@
+import asyncio
+
+from utils import success_result, failed_result
+
+from zeta_bot import metadata_cache
+
+
+class Fetcher:
+    """
+    记录调用次数的获取函数，每次返回递增的结果
+    """
+    def __init__(self, success: bool = True):
+        self.call_num = 0
+        self.success = success
+
+    async def __call__(self):
+        self.call_num += 1
+        await asyncio.sleep(0)
+        if not self.success:
+            return failed_result(exception=None, message="网络错误", retryable=True)
+        return success_result(result={"version": self.call_num})
+
+
+def make_cache(tmp_path) -> metadata_cache.MetadataCache:
+    # 绕过单例，每个测试使用独立的缓存文件
+    return metadata_cache.MetadataCache.cls(path=str(tmp_path / "metadata_cache.db"))
+
+
+def set_time(monkeypatch, current_time: list) -> None:
+    monkeypatch.setattr(metadata_cache.time, "time", lambda: current_time[0])
+
+
+def test_fresh_stale_and_expired_entries(tmp_path, monkeypatch):
+    current_time = [10000.0]
+    set_time(monkeypatch, current_time)
+    monkeypatch.setitem(metadata_cache.METADATA_CACHE_TTL, "test", (100, 50))
+    cache = make_cache(tmp_path)
+    fetcher = Fetcher()
+
+    async def main():
+        assert (await cache.get_or_fetch("a", "test", fetcher)).result == {"version": 1}
+        # 新鲜时间内直接使用缓存
+        current_time[0] += 99
+        assert (await cache.get_or_fetch("a", "test", fetcher)).result == {"version": 1}
+        assert fetcher.call_num == 1
+
+        # 过期但仍在可用时间内：先返回旧结果，同时在后台更新
+        current_time[0] += 2
+        assert (await cache.get_or_fetch("a", "test", fetcher)).result == {"version": 1}
+        for _ in range(5):
+            await asyncio.sleep(0)
+        assert fetcher.call_num == 2
+        assert (await cache.get_or_fetch("a", "test", fetcher)).result == {"version": 2}
+
+        # 超过可用时间后重新获取并等待结果
+        current_time[0] += 151
+        assert (await cache.get_or_fetch("a", "test", fetcher)).result == {"version": 3}
+
+    asyncio.run(main())
+    assert cache.get_metrics() == {"memory": 1, "hit": 2, "stale": 1, "miss": 2}
+    cache.close()
+
+
+def test_concurrent_requests_share_one_fetch_and_failures_are_not_cached(tmp_path):
+    cache = make_cache(tmp_path)
+    fetcher = Fetcher()
+    failed_fetcher = Fetcher(success=False)
+
+    async def main():
+        result_list = await asyncio.gather(*[cache.get_or_fetch("a", "bilibili", fetcher) for _ in range(5)])
+        assert [result.result for result in result_list] == [{"version": 1}] * 5
+
+        # 返回的是副本，修改结果不影响缓存
+        result_list[0].result["version"] = 100
+        assert (await cache.get_or_fetch("a", "bilibili", fetcher)).result == {"version": 1}
+
+        assert not (await cache.get_or_fetch("b", "bilibili", failed_fetcher)).success
+        assert not (await cache.get_or_fetch("b", "bilibili", failed_fetcher)).success
+
+    asyncio.run(main())
+    assert fetcher.call_num == 1
+    assert failed_fetcher.call_num == 2
+    cache.close()
+
+
+def test_disk_cache_and_invalidate(tmp_path):
+    fetcher = Fetcher()
+    cache = make_cache(tmp_path)
+    asyncio.run(cache.get_or_fetch("a", "bilibili", fetcher))
+    cache.close()
+
+    # 重新启动后从磁盘读取
+    cache = make_cache(tmp_path)
+    assert asyncio.run(cache.get_or_fetch("a", "bilibili", fetcher)).result == {"version": 1}
+    assert fetcher.call_num == 1
+
+    cache.invalidate("a")
+    cache.close()
+    cache = make_cache(tmp_path)
+    assert asyncio.run(cache.get_or_fetch("a", "bilibili", fetcher)).result == {"version": 2}
+    cache.close()
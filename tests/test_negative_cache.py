@@ -0,0 +1,65 @@
+from utils import success_result, failed_result
+
+from zeta_bot import negative_cache
+
+
+class DownloadError(Exception):
+    pass
+
+
+class GeoRestrictedError(DownloadError):
+    pass
+
+
+def make_cache(capacity: int = negative_cache.NEGATIVE_CACHE_CAPACITY) -> negative_cache.NegativeCache:
+    # 绕过单例，每个测试使用独立的缓存
+    return negative_cache.NegativeCache.cls(capacity=capacity)
+
+
+def test_records_only_non_retryable_known_failures():
+    cache = make_cache()
+    assert not cache.record("a", None)
+    assert not cache.record("a", success_result("音频"))
+    assert not cache.record("a", failed_result(DownloadError(), "网络错误", retryable=True))
+    assert not cache.record("a", failed_result(ValueError(), "未知错误", retryable=False))
+    assert cache.lookup("a") is None
+
+    # 按类名匹配，包括子类
+    assert cache.record("b", failed_result(GeoRestrictedError(), "区域限制", retryable=False))
+    result = cache.lookup("b")
+    assert not result.success
+    assert not result.retryable
+    assert result.message == "区域限制"
+    assert cache.get_metrics() == {"entries": 1, "hit": 1}
+
+    cache.forget("b")
+    assert cache.lookup("b") is None
+
+
+def test_success_clears_recorded_failure():
+    cache = make_cache()
+    cache.record("a", failed_result(DownloadError(), "区域限制", retryable=False))
+    assert not cache.record("a", success_result("音频"))
+    assert cache.lookup("a") is None
+
+
+def test_entries_expire(monkeypatch):
+    cache = make_cache()
+    current_time = [1000.0]
+    monkeypatch.setattr(negative_cache.time, "time", lambda: current_time[0])
+
+    cache.record("a", failed_result(DownloadError(), "视频失效", retryable=False))
+    current_time[0] += negative_cache.NEGATIVE_CACHE_TTL["DownloadError"] - 1
+    assert cache.lookup("a") is not None
+    current_time[0] += 1
+    assert cache.lookup("a") is None
+    assert cache.get_metrics()["entries"] == 0
+
+
+def test_capacity_drops_oldest_entry():
+    cache = make_cache(capacity=2)
+    for key in ("a", "b", "c"):
+        cache.record(key, failed_result(DownloadError(), key, retryable=False))
+    assert cache.lookup("a") is None
+    assert cache.lookup("b") is not None
+    assert cache.lookup("c") is not None
@@ -0,0 +1,85 @@
+import asyncio
+
+import msgspec
+import utils
+
+from zeta_bot import audio, download_scheduler, go_music, ytdlp
+from zeta_bot.download_scheduler import DownloadPriority
+from zeta_bot.resource import DownloadType
+
+
+def test_ytdlp_placeholder_matches_downloaded_uid():
+    entry = {"id": "abc", "title": "标题", "duration": None}
+    placeholder = ytdlp.get_placeholder_audio(entry)
+    assert placeholder.is_placeholder()
+    assert placeholder.get_uid() == ytdlp.construct_uid("abc", DownloadType.YOUTUBE_PLAYLIST)
+    assert placeholder.get_source() == "youtube"
+    assert placeholder.get_duration() == 0
+    assert placeholder.get_path() == ""
+
+
+def test_go_music_placeholder_keeps_source_info():
+    song = {"id": "1", "name": "歌曲", "artist": "歌手", "source": "netease", "duration": 90, "cover": "https://example.com/c.jpg",
+            "extra": {"key": "value"}}
+    placeholder = go_music.get_placeholder_audio(song, DownloadType.NETEASE_PLAYLIST)
+    assert placeholder.get_title() == "歌手 - 歌曲"
+    assert placeholder.get_uid() == go_music.construct_uid("netease", "1")
+    assert placeholder.get_duration() == 90
+    assert placeholder.get_cover_url() == "https://example.com/c.jpg"
+    assert placeholder.get_source_info()["extra"] == {"key": "value"}
+
+
+def test_record_without_path_decodes_as_placeholder():
+    placeholder = ytdlp.get_placeholder_audio({"id": "abc", "title": "标题", "duration": 30})
+    decoded = audio.audio_decoder(msgspec.to_builtins(placeholder.encode()))
+    assert decoded.is_placeholder()
+    assert decoded.get_uid() == placeholder.get_uid()
+    assert decoded.get_download_type() is DownloadType.YOUTUBE_PLAYLIST
+
+    # 串流音频没有文件路径，重启后同样需要重新获取
+    stream_audio = audio.Audio("a", "a", "youtube", "a", DownloadType.YOUTUBE_SINGLE, "", 10)
+    stream_audio.set_stream("https://example.com/a")
+    assert audio.audio_decoder(stream_audio.encode()).is_placeholder()
+
+    file_audio = audio.Audio("b", "b", "youtube", "b", DownloadType.YOUTUBE_SINGLE, "b.m4a", 10)
+    assert not audio.audio_decoder(file_audio.encode()).is_placeholder()
+
+
+def test_refetch_resolves_placeholders(monkeypatch):
+    scheduler = download_scheduler.DownloadScheduler(audio_library=None)
+    calls = []
+
+    async def get_info(url):
+        return utils.success_result({"id": url})
+
+    async def download_ytdlp(url, info_dict, download_type, priority):
+        calls.append((url, download_type, priority))
+        return utils.success_result("youtube")
+
+    async def download_go_music(info_dict, download_type, priority):
+        calls.append((info_dict["id"], download_type, priority))
+        return utils.success_result("go_music")
+
+    monkeypatch.setattr(download_scheduler.ytdlp, "get_info", get_info)
+    monkeypatch.setattr(scheduler, "download_ytdlp", download_ytdlp)
+    monkeypatch.setattr(scheduler, "download_go_music", download_go_music)
+
+    youtube_placeholder = ytdlp.get_placeholder_audio({"id": "abc", "title": "标题", "duration": 30})
+    song = {"id": "1", "name": "歌曲", "artist": "歌手", "source": "netease"}
+    go_music_placeholder = go_music.get_placeholder_audio(song, DownloadType.NETEASE_PLAYLIST)
+
+    async def main():
+        assert (await scheduler.refetch(youtube_placeholder, DownloadPriority.NOW_PLAYING)).result == "youtube"
+        assert (await scheduler.refetch(go_music_placeholder)).result == "go_music"
+
+        # 其他来源的yt-dlp音频无法重新获取
+        unknown_placeholder = audio.PlaceholderAudio("x", "x", "unknown", "x", DownloadType.YOUTUBE_SINGLE, 1)
+        result = await scheduler.refetch(unknown_placeholder)
+        assert result.result is None
+        assert not result.retryable
+
+    asyncio.run(main())
+    assert calls == [
+        ("https://www.youtube.com/watch?v=abc", DownloadType.YOUTUBE_PLAYLIST, DownloadPriority.NOW_PLAYING),
+        ("1", DownloadType.NETEASE_PLAYLIST, DownloadPriority.PREFETCH),
+    ]
@@ -0,0 +1,51 @@
+import utils
+
+from zeta_bot import audio, playlist
+from zeta_bot.resource import DownloadType
+
+STARTS_WITH = {None: ">       ", 0: "> ▶  **"}
+ENDS_WITH = {0: "**"}
+
+
+def make_playlist(num: int) -> playlist.Playlist:
+    test_playlist = playlist.Playlist("test")
+    for index in range(num):
+        title = f"*音频*_{index}"
+        test_playlist.append_audio(audio.Audio(title, str(index), "bilibili", str(index), DownloadType.BILIBILI_SINGLE, f"{index}.mp3", 61 * index))
+    return test_playlist
+
+
+def test_single_page_matches_full_render():
+    test_playlist = make_playlist(23)
+    full_pages = utils.make_playlist_page(
+        test_playlist.get_list_info(), 10, STARTS_WITH, ENDS_WITH, title_markdown_bold=False, escape_markdown=True
+    )
+    assert len(full_pages) == 3
+
+    for page_num, full_page in enumerate(full_pages):
+        page_start = page_num * 10
+        page = utils.make_page_from_lines(test_playlist.get_page_lines(page_start, page_start + 10), page_start, STARTS_WITH, ENDS_WITH)
+        assert page == full_page
+
+    assert utils.make_page_from_lines(test_playlist.get_page_lines(30, 40), 30, STARTS_WITH, ENDS_WITH) == ""
+
+
+def test_page_lines_are_escaped_once():
+    test_playlist = make_playlist(2)
+    first_audio = test_playlist.get_audio(0)
+    line = first_audio.get_escaped_line()
+    assert line == r"\*音频\*\_0 [00:00:00]"
+    assert first_audio.get_escaped_line() is line
+
+
+def test_duration_str_follows_playlist_changes():
+    test_playlist = make_playlist(3)
+    assert test_playlist.get_duration_str() == utils.convert_duration_to_str(183)
+
+    test_playlist.pop_audio(2)
+    assert test_playlist.get_duration_str() == utils.convert_duration_to_str(61)
+
+    old_audio = test_playlist.get_audio(1)
+    new_audio = audio.Audio("new", "new", "bilibili", "new", DownloadType.BILIBILI_SINGLE, "new.mp3", 3600)
+    assert test_playlist.replace_audio(old_audio, new_audio)
+    assert test_playlist.get_duration_str() == utils.convert_duration_to_str(3600)
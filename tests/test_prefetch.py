@@ -0,0 +1,128 @@
+import asyncio
+
+import utils
+
+from zeta_bot import audio, playlist, prefetch
+from zeta_bot.download_scheduler import DownloadPriority
+from zeta_bot.resource import DownloadType
+
+
+def make_audio(key: str, duration: int = 10) -> audio.Audio:
+    return audio.Audio(key, key, "bilibili", key, DownloadType.BILIBILI_SINGLE, f"{key}.mp3", duration)
+
+
+def make_placeholder(key: str, duration: int = 10) -> audio.PlaceholderAudio:
+    return audio.PlaceholderAudio(key, key, "bilibili", key, DownloadType.BILIBILI_SINGLE, duration)
+
+
+class FakeGuild:
+    def get_id(self) -> int:
+        return 1
+
+
+class FakeGuildPlaylist(playlist.Playlist):
+    def get_guild(self) -> FakeGuild:
+        return FakeGuild()
+
+
+class FakeLibrary:
+    def __init__(self, valid_keys):
+        self.valid_keys = set(valid_keys)
+
+    def verify_audio(self, target_audio: audio.Audio) -> bool:
+        return target_audio.get_uid() in self.valid_keys
+
+
+class FakeScheduler:
+    def __init__(self, failed_keys=()):
+        self.failed_keys = set(failed_keys)
+        self.calls = []
+
+    async def refetch(self, target_audio: audio.Audio, priority: DownloadPriority) -> utils.Result:
+        self.calls.append((target_audio.get_uid(), priority))
+        await asyncio.sleep(0)
+        if target_audio.get_uid() in self.failed_keys:
+            return utils.failed_result(exception=None, message="资源失效", retryable=False)
+        return utils.success_result(make_audio(target_audio.get_uid(), duration=20))
+
+
+def make_playlist(*items) -> FakeGuildPlaylist:
+    guild_playlist = FakeGuildPlaylist("test")
+    for item in items:
+        guild_playlist.append_audio(item)
+    return guild_playlist
+
+
+def test_prefetch_repairs_lookahead_only():
+    scheduler = FakeScheduler()
+    prefetcher = prefetch.Prefetcher(scheduler, FakeLibrary({"a", "c"}), lookahead=2)
+    items = [make_audio("a"), make_placeholder("b"), make_audio("c"), make_placeholder("d")]
+    guild_playlist = make_playlist(*items)
+
+    async def main():
+        prefetcher.schedule(guild_playlist)
+        await prefetcher._tasks[1]
+
+    asyncio.run(main())
+    # 正在播放的音频与预取范围之外的占位条目不会被获取
+    assert scheduler.calls == [("b", DownloadPriority.PREFETCH)]
+    assert guild_playlist.get_audio(0) is items[0]
+    assert guild_playlist.get_audio(1) is not items[1]
+    assert not guild_playlist.get_audio(1).is_placeholder()
+    assert guild_playlist.get_audio(3) is items[3]
+    assert guild_playlist.get_duration() == 50
+
+
+def test_schedule_during_run_checks_again():
+    scheduler = FakeScheduler()
+    prefetcher = prefetch.Prefetcher(scheduler, FakeLibrary({"a"}), lookahead=1)
+    guild_playlist = make_playlist(make_audio("a"), make_placeholder("b"))
+
+    async def main():
+        prefetcher.schedule(guild_playlist)
+        task = prefetcher._tasks[1]
+        while len(scheduler.calls) == 0:
+            await asyncio.sleep(0)
+        # 检查期间播放列表发生变化
+        guild_playlist.pop_audio(0)
+        guild_playlist.append_audio(make_placeholder("c"))
+        prefetcher.schedule(guild_playlist)
+        assert prefetcher._tasks[1] is task
+        await task
+        assert 1 not in prefetcher._tasks
+
+    asyncio.run(main())
+    assert [key for key, _ in scheduler.calls] == ["b", "c"]
+
+
+def test_ensure_playable_uses_highest_priority():
+    scheduler = FakeScheduler(failed_keys={"b"})
+    prefetcher = prefetch.Prefetcher(scheduler, FakeLibrary(set()))
+    placeholder = make_placeholder("a")
+    guild_playlist = make_playlist(placeholder)
+
+    assert asyncio.run(prefetcher.ensure_playable(guild_playlist))
+    assert scheduler.calls == [("a", DownloadPriority.NOW_PLAYING)]
+    assert guild_playlist.get_audio(0) is not placeholder
+
+    # 获取失败时保留原条目
+    failed_placeholder = make_placeholder("b")
+    guild_playlist = make_playlist(failed_placeholder)
+    assert not asyncio.run(prefetcher.ensure_playable(guild_playlist))
+    assert guild_playlist.get_audio(0) is failed_placeholder
+    assert not asyncio.run(prefetcher.ensure_playable(make_playlist()))
+
+
+def test_expired_stream_is_refetched(monkeypatch):
+    scheduler = FakeScheduler()
+    prefetcher = prefetch.Prefetcher(scheduler, FakeLibrary(set()))
+    stream_audio = make_audio("a")
+    stream_audio.set_stream("https://example.com/a")
+    guild_playlist = make_playlist(stream_audio)
+
+    assert asyncio.run(prefetcher.ensure_playable(guild_playlist))
+    assert scheduler.calls == []
+
+    monkeypatch.setattr(prefetch, "STREAM_URL_TTL", -1)
+    assert asyncio.run(prefetcher.ensure_playable(guild_playlist))
+    assert scheduler.calls == [("a", DownloadPriority.NOW_PLAYING)]
@@ -0,0 +1,91 @@
+import threading
+
+from zeta_bot import progressive
+
+
+def make_buffer(tmp_path, start_bytes: int = 4):
+    path = tmp_path / "a.mp3.part"
+    path.write_bytes(b"")
+    buffer = progressive.ProgressiveBuffer(start_bytes=start_bytes)
+    buffer.set_file(str(path))
+    return buffer, path
+
+
+def write(buffer: progressive.ProgressiveBuffer, path, data: bytes) -> None:
+    with open(path, "ab") as file:
+        file.write(data)
+    buffer.feed(len(data))
+
+
+def read_in_thread(buffer: progressive.ProgressiveBuffer, size: int = -1):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(buffer.read(size)))
+    thread.start()
+    return thread, result
+
+
+def test_read_until_end_of_download(tmp_path):
+    buffer, path = make_buffer(tmp_path)
+    write(buffer, path, b"ab")
+    assert not buffer.ready.is_set()
+    write(buffer, path, b"cdef")
+    assert buffer.ready.is_set()
+
+    assert buffer.read(4) == b"abcd"
+    assert buffer.read() == b"ef"
+
+    # 没有新数据时阻塞，直到下载器写入
+    thread, result = read_in_thread(buffer)
+    thread.join(0.1)
+    assert thread.is_alive()
+    write(buffer, path, b"gh")
+    thread.join(1)
+    assert result == [b"gh"]
+
+    # 下载结束后读完剩余数据，之后返回空字节串
+    write(buffer, path, b"ij")
+    buffer.replace_file(str(tmp_path / "a.mp3"))
+    buffer.finish(True)
+    assert buffer.is_success()
+    assert buffer.read() == b"ij"
+    assert buffer.read() == b""
+    assert not path.exists()
+
+
+def test_failed_download_wakes_reader(tmp_path):
+    buffer, path = make_buffer(tmp_path)
+    write(buffer, path, b"ab")
+    assert buffer.read() == b"ab"
+
+    thread, result = read_in_thread(buffer)
+    thread.join(0.1)
+    assert thread.is_alive()
+    buffer.finish(False)
+    thread.join(1)
+    assert result == [b""]
+    assert buffer.ready.is_set()
+    assert not buffer.is_success()
+
+    # 重复调用只有第一次生效
+    buffer.finish(True)
+    assert not buffer.is_success()
+
+
+def test_failed_download_discards_unread_data(tmp_path):
+    buffer, path = make_buffer(tmp_path)
+    write(buffer, path, b"abcd")
+    buffer.finish(False)
+    assert buffer.read() == b""
+
+
+def test_close_stops_reader(tmp_path):
+    buffer, path = make_buffer(tmp_path)
+    thread, result = read_in_thread(buffer)
+    thread.join(0.1)
+    buffer.close()
+    thread.join(1)
+    assert result == [b""]
+
+    write(buffer, path, b"ab")
+    assert buffer.get_received() == 0
+    assert buffer.read() == b""
@@ -0,0 +1,64 @@
+from typing import *
+
+import msgspec
+import pytest
+
+import errors
+import utils
+
+from zeta_bot import audio, schema
+
+AUDIO_DICT = {
+    "title": "标题", "uid": "uid", "source": "bilibili", "source_id": "BV1",
+    "download_type": "BILIBILI_SINGLE", "path": "a.mp3", "duration": 10
+}
+
+
+@pytest.mark.parametrize("duration, expected", [(10, 10), (12.7, 12), (None, 0), ("15", 15)])
+def test_audio_record_accepts_lenient_durations(duration, expected):
+    record = schema.audio_record_decoder.decode(msgspec.json.encode({**AUDIO_DICT, "duration": duration}))
+    assert audio.audio_decoder(record).get_duration() == expected
+
+
+def test_audio_round_trip_keeps_source_info():
+    record = msgspec.convert({**AUDIO_DICT, "source_info": {"id": "1", "source": "netease"}}, schema.AudioRecord)
+    restored = audio.audio_decoder(msgspec.json.decode(msgspec.json.encode(audio.audio_decoder(record).encode())))
+    assert restored.get_source_info() == {"id": "1", "source": "netease"}
+
+
+def test_json_load_distinguishes_schema_error_from_corruption(tmp_path):
+    path = tmp_path / "library.json"
+    path.write_text('[{"item": {"title": "缺少字段"}, "key": "a"}]', encoding="utf-8")
+    with pytest.raises(errors.JSONSchemaError) as exception_info:
+        utils.json_load(str(path), List[schema.LibraryNodeRecord])
+    assert exception_info.value.raw == [{"item": {"title": "缺少字段"}, "key": "a"}]
+
+    path.write_text('[{"item": ', encoding="utf-8")
+    with pytest.raises(errors.JSONFileError):
+        utils.json_load(str(path), List[schema.LibraryNodeRecord])
+
+
+def test_convert_list_lenient_skips_invalid_entries():
+    raw_list = [
+        {"item": AUDIO_DICT, "key": "a"},
+        None,
+        {"item": {"title": "缺少字段"}, "key": "b"},
+        {"item": {**AUDIO_DICT, "duration": None}, "key": "c"},
+    ]
+    converted, skipped_num = schema.convert_list_lenient(raw_list, schema.LibraryNodeRecord)
+    assert [node.key for node in converted] == ["a", "c"]
+    assert skipped_num == 1
+    assert schema.convert_list_lenient({"not": "a list"}, schema.LibraryNodeRecord) == ([], 0)
+
+
+def test_convert_guild_record_lenient_keeps_valid_audio():
+    raw = {
+        "id": "not an id",
+        "playlist": {"name": "主播放列表", "playlist": [AUDIO_DICT, {"title": 1}]},
+        "playedlist": "损坏的数据",
+    }
+    record, skipped_num = schema.convert_guild_record_lenient(raw, 1, "服务器")
+    assert (record.id, record.name) == (1, "服务器")
+    assert [item.uid for item in record.playlist.playlist] == ["uid"]
+    assert record.playedlist.playlist == []
+    assert skipped_num == 1
@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from zeta_bot import search
+
+
+def make_item(site: str, index: int) -> dict:
+    return {"title": f"{site}_{index}", "duration": 60, "id": f"{site}_id_{index}"}
+
+
+@pytest.fixture
+def sites(monkeypatch):
+    """
+    用可控的搜索函数替换各平台的搜索，并跳过信息缓存
+    """
+    state = {"哔哩哔哩": asyncio.Event(), "YouTube": asyncio.Event(), "cancelled": [], "keys": []}
+
+    async def passthrough(key, platform, fetch_function):
+        state["keys"].append(key)
+        return await fetch_function()
+
+    def make_search(site):
+        async def site_search(query, query_num=5):
+            try:
+                await state[site].wait()
+            except asyncio.CancelledError:
+                state["cancelled"].append(site)
+                raise
+            if state.get(f"{site}_error"):
+                raise RuntimeError("接口错误")
+            return [make_item(site, index) for index in range(query_num)]
+        return site_search
+
+    monkeypatch.setattr(search.metadata_cache, "get_or_fetch", passthrough)
+    monkeypatch.setattr(search.bilibili, "search", make_search("哔哩哔哩"))
+    monkeypatch.setattr(search.ytdlp, "youtube_search", make_search("YouTube"))
+    return state
+
+
+def test_results_rendered_in_arrival_order(sites):
+    async def main():
+        rendered = []
+        searching = search.search_sites(["哔哩哔哩", "YouTube"], " Query ", query_num=2)
+        sites["YouTube"].set()
+        async for search_result, pending_site_list in searching:
+            rendered.append(search.render_search_result(search_result, pending_site_list))
+            sites["哔哩哔哩"].set()
+        return rendered
+
+    rendered = asyncio.run(main())
+    assert len(rendered) == 2
+    assert sites["keys"] == ["search:哔哩哔哩:2:query", "search:YouTube:2:query"]
+
+    # 先完成的平台先显示，另一个平台显示为搜索中
+    title_str, address_str, resource_list = rendered[0]
+    assert [item["id"] for item in resource_list] == ["YouTube_id_0", "YouTube_id_1"]
+    assert title_str.index("YouTube") < title_str.index("哔哩哔哩\n> 搜索中...")
+
+    # 之后完成的平台接在后面，已显示的序号不变
+    title_str, address_str, resource_list = rendered[1]
+    assert [item["id"] for item in resource_list] == ["YouTube_id_0", "YouTube_id_1", "哔哩哔哩_id_0", "哔哩哔哩_id_1"]
+    assert "搜索中" not in title_str
+    assert r"> [3] **哔哩哔哩\_0**" in title_str
+    assert "> 哔哩哔哩_id_1" in address_str
+
+
+def test_slow_or_failed_site_does_not_block_others(sites, monkeypatch):
+    monkeypatch.setitem(search.SEARCH_SITE_TIMEOUT, "哔哩哔哩", 0.05)
+    sites["YouTube_error"] = True
+
+    async def main():
+        sites["YouTube"].set()
+        final = None
+        async for search_result, pending_site_list in search.search_sites(["哔哩哔哩", "YouTube"], "query"):
+            final = search_result, pending_site_list
+        return final
+
+    search_result, pending_site_list = asyncio.run(main())
+    assert pending_site_list == []
+    assert list(search_result) == ["YouTube", "哔哩哔哩"]
+    assert search_result["YouTube"].message == "搜索失败"
+    assert search_result["哔哩哔哩"].message == "搜索超时"
+    assert search_result["哔哩哔哩"].retryable
+
+    title_str, address_str, resource_list = search.render_search_result(search_result, pending_site_list)
+    assert resource_list == []
+    assert "YouTube\n> 搜索失败\n哔哩哔哩\n> 搜索超时\n" in title_str
+
+
+def test_stopping_early_cancels_pending_search(sites):
+    async def main():
+        sites["YouTube"].set()
+        searching = search.search_sites(["哔哩哔哩", "YouTube"], "query")
+        search_result, pending_site_list = await searching.__anext__()
+        assert pending_site_list == ["哔哩哔哩"]
+        await searching.aclose()
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert sites["cancelled"] == ["哔哩哔哩"]
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+import utils
+
+from zeta_bot import file_management
+
+
+def make_library(tmp_path) -> file_management.AudioFileLibrary:
+    root = tmp_path / "audio"
+    root.mkdir()
+    library = file_management.AudioFileLibrary(str(root), str(tmp_path / "library.json"))
+    asyncio.run(library.initialize())
+    return library
+
+
+def test_concurrent_downloads_share_one_call(tmp_path):
+    library = make_library(tmp_path)
+    calls = []
+
+    async def main():
+        release = asyncio.Event()
+
+        async def download():
+            calls.append(1)
+            await release.wait()
+            return utils.success_result("a.mp3")
+
+        tasks = [asyncio.create_task(library._single_flight("a", download)) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert library.downloading("a")
+        assert not library.downloading("b")
+
+        release.set()
+        results = await asyncio.gather(*tasks)
+        assert [result.result for result in results] == ["a.mp3"] * 3
+        assert not library.downloading("a")
+
+    asyncio.run(main())
+    assert len(calls) == 1
+
+
+def test_cancelled_download_gives_waiters_retryable_failure(tmp_path):
+    library = make_library(tmp_path)
+
+    async def main():
+        async def download():
+            await asyncio.sleep(10)
+            return utils.success_result("a.mp3")
+
+        downloader = asyncio.create_task(library._single_flight("a", download))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(library._single_flight("a", download))
+        await asyncio.sleep(0)
+
+        downloader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await downloader
+        result = await waiter
+        assert not result.success
+        assert result.retryable
+        assert not library.downloading("a")
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_does_not_stop_download(tmp_path):
+    library = make_library(tmp_path)
+
+    async def main():
+        release = asyncio.Event()
+
+        async def download():
+            await release.wait()
+            return utils.success_result("a.mp3")
+
+        downloader = asyncio.create_task(library._single_flight("a", download))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(library._single_flight("a", download))
+        await asyncio.sleep(0)
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        release.set()
+        assert (await downloader).result == "a.mp3"
+
+    asyncio.run(main())
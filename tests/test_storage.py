@@ -0,0 +1,99 @@
+import json
+
+import utils
+
+from zeta_bot import file_management, storage
+
+
+def make_storage(tmp_path) -> storage.SQLiteStorage:
+    return storage.SQLiteStorage(str(tmp_path / "data.db"))
+
+
+def history_titles(db: storage.SQLiteStorage, guild_id: int) -> list:
+    return [item["title"] for item in db.load_guild(guild_id)["playedlist"]["playlist"]]
+
+
+def test_save_guild_appends_history_and_trims_oldest(tmp_path):
+    db = make_storage(tmp_path)
+    playlist = {"name": "主播放列表", "playlist": []}
+    meta = {"name": "历史播放列表", "limitation": 4}
+
+    db.save_guild(1, "服务器", playlist, meta, [{"title": "1"}, {"title": "2"}], 4)
+    db.save_guild(1, "服务器", playlist, meta, [{"title": "3"}], 4)
+    assert history_titles(db, 1) == ["1", "2", "3"]
+
+    db.save_guild(1, "服务器", playlist, meta, [{"title": "4"}, {"title": "5"}], 4)
+    assert history_titles(db, 1) == ["2", "3", "4", "5"]
+
+    # 没有新增记录时只更新服务器数据
+    db.save_guild(1, "新名称", playlist, meta, [], 4)
+    loaded = db.load_guild(1)
+    assert loaded["name"] == "新名称"
+    assert loaded["playedlist"]["limitation"] == 4
+    assert history_titles(db, 1) == ["2", "3", "4", "5"]
+    db.close()
+
+
+def test_save_guild_replace_history(tmp_path):
+    db = make_storage(tmp_path)
+    playlist = {"name": "主播放列表", "playlist": []}
+    db.save_guild(1, "服务器", playlist, {}, [{"title": "1"}, {"title": "2"}], 10)
+    db.save_guild(2, "其他服务器", playlist, {}, [{"title": "x"}], 10)
+
+    db.save_guild(1, "服务器", playlist, {}, [{"title": "a"}, {"title": "b"}, {"title": "c"}], 2, replace_history=True)
+    assert history_titles(db, 1) == ["b", "c"]
+    # 其他服务器的记录不受影响
+    assert history_titles(db, 2) == ["x"]
+    assert db.load_guild(3) is None
+    db.close()
+
+
+def test_library_entries_order_and_skip_malformed(tmp_path):
+    db = make_storage(tmp_path)
+    record = {
+        "title": "标题", "uid": "uid", "source": "bilibili", "source_id": "BV1",
+        "download_type": "BILIBILI_SINGLE", "path": "a.mp3", "duration": 10
+    }
+    db.save_library([
+        {"key": "a", "item": record},
+        {"key": "b", "item": {**record, "path": "b.mp3"}},
+    ])
+    db.touch_library_entry("a", {**record, "duration": 12.5})
+    db._connection.execute(
+        "INSERT INTO library_entries (key, position, item) VALUES (?, ?, ?)", ("bad", 100, json.dumps({"title": 1}))
+    )
+
+    loaded, skipped_num = db.load_library()
+    assert [node.key for node in loaded] == ["b", "a"]
+    assert loaded[1].item.duration == 12.5
+    assert skipped_num == 1
+
+    db.remove_library_entries(["a", "bad"])
+    assert [node.key for node in db.load_library()[0]] == ["b"]
+    db.close()
+
+
+def test_migrate_applies_uncompacted_journal(tmp_path):
+    record = {
+        "title": "标题", "uid": "uid", "source": "bilibili", "source_id": "BV1",
+        "download_type": "BILIBILI_SINGLE", "path": "a.mp3", "duration": 10
+    }
+    library_path = tmp_path / "audio_lib_main.json"
+    utils.json_save(str(library_path), [
+        {"key": "a", "item": record},
+        {"key": "b", "item": {**record, "path": "b.mp3"}},
+    ])
+    journal = file_management.LibraryJournal(str(tmp_path / "audio_lib_main.journal"))
+    journal.append({"op": "add", "key": "c", "item": {**record, "path": "c.mp3"}})
+    journal.append({"op": "remove", "key": "b"})
+    journal.append({"op": "touch", "key": "a"})
+
+    db = make_storage(tmp_path)
+    counter = db.migrate_from_json(str(tmp_path / "members"), str(tmp_path / "guilds"), str(library_path))
+    loaded, skipped_num = db.load_library()
+    assert counter["library_entries"] == 2
+    assert [node.key for node in loaded] == ["c", "a"]
+    assert loaded[0].item.path == "c.mp3"
+    assert skipped_num == 0
+    assert db.is_migrated()
+    db.close()
@@ -0,0 +1,34 @@
+import asyncio
+import time
+
+import pytest
+import yt_dlp
+
+from zeta_bot import ytdlp
+
+
+def test_timed_out_extraction_releases_worker():
+    pool = ytdlp.YtdlpWorkerPool(worker_num=1)
+    cancelled = []
+
+    def hung_extraction(ydl):
+        # 模拟不断发起网络请求的提取过程，每次请求前检查任务是否已被取消
+        try:
+            while True:
+                time.sleep(0.01)
+                ydl._cancel_check()
+        except yt_dlp.utils.DownloadCancelled:
+            cancelled.append(True)
+            raise
+
+    async def main():
+        # 等待工作线程启动（预先创建YoutubeDL实例）
+        await pool.run(lambda ydl: None, ytdlp.INFO_OPTIONS, timeout=30)
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.run(hung_extraction, ytdlp.INFO_OPTIONS, timeout=0.05)
+        # 唯一的工作线程被释放后，之后的任务可以正常运行
+        return await pool.run(lambda ydl: ydl.params["socket_timeout"], ytdlp.INFO_OPTIONS, timeout=5)
+
+    assert asyncio.run(main()) == ytdlp.YTDLP_SOCKET_TIMEOUT
+    assert cancelled == [True]
+    pool.shutdown()
@@ -5,12 +5,13 @@ import os
 import time
 import datetime
 from enum import Enum
-import json
 import re
+import msgspec
 import requests
 from pathlib import Path
 import getpass
 import shutil
+import tempfile
 import platform
 import importlib.metadata
 import packaging.requirements
@@ -34,33 +35,89 @@ def ctime_datetime() -> datetime.datetime:
     return datetime.datetime.now()
 
 
-def json_save(json_path: str, saving_item) -> None:
+# 对象通过其encode()方法转换，encode()可以返回基础类型或者msgspec.Struct
+_json_encoder = msgspec.json.Encoder(enc_hook=lambda x: x.encode())
+
+
+def json_dumps(saving_item, indent: Optional[int] = 4) -> str:
+    """
+    将<saving_item>转换为json格式的字符串，对象通过其encode()方法转换
+    **注意**：枚举类会被直接转换为其值，需要保存枚举类时应在encode()中手动转换
+
+    :param saving_item: 要转换的对象
+    :param indent: 缩进空格数，为None时生成紧凑格式
+    """
+    content = _json_encoder.encode(saving_item)
+    if indent is not None:
+        content = msgspec.json.format(content, indent=indent)
+    return content.decode("utf-8")
+
+
+def atomic_write(file_path: str, content: str) -> None:
+    """
+    以原子方式将字符串<content>写入<file_path>：先写入同目录下的临时文件，刷新到磁盘后再替换目标文件
+    写入过程中程序中断不会留下写了一半的文件，每次写入使用不同的临时文件，同时进行的多次写入不会互相干扰
+    """
+    file_descriptor, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(file_path) or ".", prefix=f"{os.path.basename(file_path)}.", suffix=".tmp"
+    )
+    try:
+        # mkstemp创建的文件权限为0600，保持与原文件（或普通新建文件）相同的权限
+        try:
+            os.chmod(temp_path, os.stat(file_path).st_mode & 0o777)
+        except FileNotFoundError:
+            os.chmod(temp_path, 0o644)
+        with os.fdopen(file_descriptor, "w", encoding="utf-8") as file:
+            file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def json_save(json_path: str, saving_item, atomic: bool = False, indent: Optional[int] = 4) -> None:
     """
     将<saving_item>以json格式保存到<json_path>
     **警告**：json格式的键值必须为字符串，否则会被转换为字符串
+
+    :param json_path: 保存路径
+    :param saving_item: 要保存的对象
+    :param atomic: 是否使用临时文件+替换的方式原子写入
+    :param indent: 缩进空格数，为None时生成紧凑格式
     """
-    with open(json_path, "w", encoding="utf-8") as file:
-        file.write(
-            json.dumps(
-                saving_item,
-                default=lambda x: x.encode(),
-                sort_keys=False,
-                indent=4,
-                ensure_ascii=False
-            )
-        )
-
-
-def json_load(json_path: str):
+    content = json_dumps(saving_item, indent)
+    if atomic:
+        atomic_write(json_path, content)
+    else:
+        with open(json_path, "w", encoding="utf-8") as file:
+            file.write(content)
+
+
+def json_load(json_path: str, schema_type: Any = None):
     """
     读取<json_path>的json文件
     **警告**：json格式的键值必须为字符串，否则会被转换为字符串
+
+    :param json_path: 文件路径
+    :param schema_type: 可选的目标类型（例如msgspec.Struct），提供时直接解码为该类型并检查格式
+    :raise errors.JSONFileError: 文件不是有效的json（文件损坏）
+    :raise errors.JSONSchemaError: 文件是有效的json，但内容不符合<schema_type>，异常中包含按普通json解析的内容
     """
+    with open(json_path, "rb") as file:
+        content = file.read()
     try:
-        with open(json_path, "r", encoding="utf-8") as file:
-            loaded_dict = json.loads(file.read())
-        return loaded_dict
-    except json.decoder.JSONDecodeError:
+        if schema_type is None:
+            return msgspec.json.decode(content)
+        return msgspec.json.decode(content, type=schema_type, strict=False)
+    # ValidationError是DecodeError的子类，需要先处理
+    except msgspec.ValidationError as e:
+        raise errors.JSONSchemaError(json_path, msgspec.json.decode(content), str(e))
+    except msgspec.DecodeError:
         raise errors.JSONFileError(json_path)
 
 
@@ -897,9 +954,9 @@ def get_url_from_str(input_str, url_type) -> Union[str, None]:
 
 def get_legal_netease_url(input_str) -> Union[str, None]:
     if "song?id=" in input_str:
-        id_position = re.search("song\?id=\d+", input_str).span()
+        id_position = re.search(r"song\?id=\d+", input_str).span()
     elif "playlist?id=" in input_str:
-        id_position = re.search("playlist\?id=\d+", input_str).span()
+        id_position = re.search(r"playlist\?id=\d+", input_str).span()
     else:
         return None
     return "https://music.163.com/#/" + input_str[id_position[0]:id_position[1]]
@@ -927,7 +984,7 @@ def get_bvid_from_url(url):
     :param url: 目标地址
     :return:
     """
-    re_result = re.search("BV(\d|[a-zA-Z]){10}", url)
+    re_result = re.search(r"BV(\d|[a-zA-Z]){10}", url)
 
     if re_result is None:
         return None
@@ -953,27 +1010,12 @@ def make_playlist_page(info_list: list, num_per_page: int, starts_with: dict, en
     result = []
     counter = 0
     while counter < len(info_list):
-        current_page = ""
+        line_list = []
         for i in range(num_per_page):
             if counter >= len(info_list):
                 break
             current_tuple = info_list[counter]
 
-            # 从字典<starts_with>中查找此行是否存在
-            if counter in starts_with:
-                current_starts_with = starts_with[counter]
-            elif None in starts_with:
-                current_starts_with = starts_with[None]
-            else:
-                current_starts_with = ""
-            # 从字典<ends_with>中查找此行是否存在
-            if counter in ends_with:
-                current_ends_with = ends_with[counter]
-            elif None in ends_with:
-                current_ends_with = ends_with[None]
-            else:
-                current_ends_with = ""
-
             title = str(current_tuple[0])
             if escape_markdown:
                 title = markdown_escape(title)
@@ -981,15 +1023,15 @@ def make_playlist_page(info_list: list, num_per_page: int, starts_with: dict, en
                 title = f"**{title}**"
 
             if len(current_tuple) <= 1:
-                current_page += f"{current_starts_with}[{counter + 1}] {title}{current_ends_with}\n"
+                line_list.append(title)
             else:
                 duration = str(current_tuple[1])
                 if escape_markdown:
                     duration = markdown_escape(duration)
-                current_page += f"{current_starts_with}[{counter + 1}] {title} [{duration}]{current_ends_with}\n"
+                line_list.append(f"{title} [{duration}]")
 
             counter += 1
-        result.append(current_page)
+        result.append(make_page_from_lines(line_list, counter - len(line_list), starts_with, ends_with))
 
     if fill_lines:
         while counter % num_per_page != 0:
@@ -999,6 +1041,26 @@ def make_playlist_page(info_list: list, num_per_page: int, starts_with: dict, en
     return result
 
 
+def make_page_from_lines(line_list: List[str], start_index: int, starts_with: dict, ends_with: dict) -> str:
+    """
+    将已格式化的<line_list>组成一页文本，每行前添加序号，第一行的序号为<start_index> + 1
+    用于只生成列表中的一页，而不需要处理整个列表
+
+    :param line_list: 该页每行的内容（不包括序号）
+    :param start_index: 该页第一行在整个列表中的索引（从0开始）
+    :param starts_with: 每行开头添加的字符串，键为在整个列表中的行数，格式同make_playlist_page
+    :param ends_with: 每行结尾添加的字符串，键为在整个列表中的行数，格式同make_playlist_page
+    """
+    default_starts_with = starts_with.get(None, "")
+    default_ends_with = ends_with.get(None, "")
+    page_lines = []
+    for index, line in enumerate(line_list, start_index):
+        current_starts_with = starts_with.get(index, default_starts_with)
+        current_ends_with = ends_with.get(index, default_ends_with)
+        page_lines.append(f"{current_starts_with}[{index + 1}] {line}{current_ends_with}\n")
+    return "".join(page_lines)
+
+
 class DoubleLinkedNode:
     """
     有自定义键值的双向连接节点
@@ -1,5 +1,11 @@
+from typing import Union, Optional
+import time
+
+import msgspec
+
 import utils
 from zeta_bot.resource import DownloadType
+from zeta_bot.schema import AudioRecord
 
 
 class Audio:
@@ -10,10 +16,19 @@ class Audio:
         self._source_id = source_id
         self._download_type = download_type
         self._path = path
-        self._duration = duration
-        self._duration_str = utils.convert_duration_to_str(duration)
+        # 部分平台返回的时长为浮点数或None，统一保存为整数
+        self._duration = int(duration or 0)
+        self._duration_str = utils.convert_duration_to_str(self._duration)
         self._cover_path = None
         self._cover_url = None
+        # 直接串流播放（不保存文件）时的音频链接与请求头，不会被保存
+        self._stream_url = None
+        self._stream_headers = None
+        self._stream_time = None
+        # 播放列表菜单中显示的已转义文本，首次使用时生成
+        self._escaped_line = None
+        # 重新获取音频所需的来源原始信息（例如go-music-api的歌曲字段），没有时为None
+        self._source_info: Optional[dict] = None
 
     def __str__(self) -> str:
         return f"{self._title} [{self._duration_str}]"
@@ -45,6 +60,14 @@ class Audio:
     def get_duration_str(self) -> str:
         return self._duration_str
 
+    def get_escaped_line(self) -> str:
+        """
+        返回经过Markdown转义的"标题 [时长]"文本，用于播放列表菜单
+        """
+        if self._escaped_line is None:
+            self._escaped_line = f"{utils.markdown_escape(self._title)} [{utils.markdown_escape(self._duration_str)}]"
+        return self._escaped_line
+
     def get_cover_path(self) -> str:
         return self._cover_path
 
@@ -57,39 +80,109 @@ class Audio:
     def set_cover_url(self, cover_url: str) -> None:
         self._cover_url = cover_url
 
-    def encode(self) -> dict:
-        return {
-            "title": self._title,
-            "uid": self._uid,
-            "source": self._source,
-            "source_id": self._source_id,
-            "download_type": self._download_type,
-            "path": self._path,
-            "duration": self._duration,
-            "duration_str": self._duration_str,
-            "cover_path": self._cover_path,
-            "cover_url": self._cover_url
-        }
-
-
-def audio_decoder(info_dict: dict) -> Audio:
+    def get_source_info(self) -> Optional[dict]:
+        return self._source_info
+
+    def set_source_info(self, source_info: Optional[dict]) -> None:
+        self._source_info = source_info
+
+    def set_stream(self, stream_url: str, stream_headers: Optional[dict] = None) -> None:
+        """
+        将音频设置为直接串流播放，播放时FFmpeg通过HTTP读取<stream_url>
+        """
+        self._stream_url = stream_url
+        self._stream_headers = stream_headers
+        self._stream_time = time.time()
+
+    def is_stream(self) -> bool:
+        return self._stream_url is not None
+
+    def get_stream_url(self) -> Optional[str]:
+        return self._stream_url
+
+    def get_stream_headers(self) -> Optional[dict]:
+        return self._stream_headers
+
+    def get_stream_time(self) -> Optional[float]:
+        """
+        返回获取串流链接的时间（time.time()）
+        """
+        return self._stream_time
+
+    def is_placeholder(self) -> bool:
+        """
+        是否为尚未获取的占位条目（PlaceholderAudio）
+        """
+        return False
+
+    def encode(self) -> AudioRecord:
+        return AudioRecord(
+            title=self._title,
+            uid=self._uid,
+            source=self._source,
+            source_id=self._source_id,
+            download_type=self._download_type.encode(),
+            path=self._path,
+            duration=self._duration,
+            duration_str=self._duration_str,
+            cover_path=self._cover_path,
+            cover_url=self._cover_url,
+            source_info=self._source_info
+        )
+
+
+class PlaceholderAudio(Audio):
+    """
+    播放列表中尚未获取的占位条目：只包含播放列表信息中的标题、时长与来源id，没有音频文件
+    进入预取范围或即将播放时由Prefetcher通过DownloadScheduler.refetch获取，并替换为真正的音频
+    """
+    def __init__(self, title: str, uid: str, source: str, source_id: str, download_type: DownloadType, duration: int) -> None:
+        super().__init__(title, uid, source, source_id, download_type, path="", duration=duration)
+
+    def __repr__(self) -> str:
+        return f"<PlaceholderAudio对象：{self._title}>"
+
+    def is_placeholder(self) -> bool:
+        return True
+
+
+def audio_decoder(info: Union[dict, AudioRecord]) -> Audio:
+    """
+    通过AudioRecord或者读取到的字典重建Audio
+    """
+    if isinstance(info, dict):
+        info = msgspec.convert(info, AudioRecord, strict=False)
+
     try:
-        download_type = DownloadType.decode(info_dict["download_type"])
+        download_type = DownloadType.decode(info.download_type)
     except ValueError:
         download_type = DownloadType.UNKNOWN
 
-    decoded_audio = Audio(
-        title=info_dict["title"],
-        uid=info_dict["uid"],
-        source=info_dict["source"],
-        source_id=info_dict["source_id"],
-        download_type=download_type,
-        path=info_dict["path"],
-        duration=info_dict["duration"],
-    )
-
-    if info_dict["cover_path"] is not None:
-        decoded_audio.set_cover_path(info_dict["cover_path"])
-    if info_dict["cover_url"] is not None:
-        decoded_audio.set_cover_url(info_dict["cover_url"])
+    # 没有文件路径的音频（占位条目或串流音频）重新加载后需要重新获取
+    if info.path == "":
+        decoded_audio = PlaceholderAudio(
+            title=info.title,
+            uid=info.uid,
+            source=info.source,
+            source_id=info.source_id,
+            download_type=download_type,
+            duration=info.duration,
+        )
+    else:
+        decoded_audio = Audio(
+            title=info.title,
+            uid=info.uid,
+            source=info.source,
+            source_id=info.source_id,
+            download_type=download_type,
+            path=info.path,
+            duration=info.duration,
+        )
+
+    if info.cover_path is not None:
+        decoded_audio.set_cover_path(info.cover_path)
+    if info.cover_url is not None:
+        decoded_audio.set_cover_url(info.cover_url)
+    if info.source_info is not None:
+        decoded_audio.set_source_info(info.source_info)
     return decoded_audio
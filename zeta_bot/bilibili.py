@@ -1,4 +1,5 @@
 from typing import *
+import os
 import aiohttp
 import html
 import httpx
@@ -14,7 +15,10 @@ from utils import Result, success_result, failed_result
 
 from zeta_bot import (
     output_console,
-    audio
+    audio,
+    progressive,
+    http_session,
+    metadata_cache,
 )
 from zeta_bot.resource import MediaPlatform, LinkType, DownloadHandler, DownloadType, ResourceClassifier
 
@@ -39,9 +43,27 @@ resource_classifier = ResourceClassifier()
 level = "哔哩哔哩模块"
 SOURCE = "bilibili"
 
+
+def cache_key(bvid) -> str:
+    """
+    返回视频信息在信息缓存中的键
+    """
+    return f"{SOURCE}:{bvid}"
+
+
 async def get_info(bvid) -> Result:
     """
-    返回视频信息
+    返回视频信息，优先使用信息缓存
+
+    :param bvid: 目标视频BV号
+    :return:
+    """
+    return await metadata_cache.get_or_fetch(cache_key(bvid), SOURCE, lambda: fetch_info(bvid))
+
+
+async def fetch_info(bvid) -> Result:
+    """
+    通过哔哩哔哩接口获取视频信息，不使用缓存
 
     :param bvid: 目标视频BV号
     :return:
@@ -132,10 +154,17 @@ async def get_filesize(info_dict: dict, num_p=0) -> Result:
         # 音频轨链接
         audio_url = url["dash"]["audio"][0]['baseUrl']
 
-        async with aiohttp.ClientSession() as sess:
-            # 下载音频流
-            async with sess.get(audio_url, headers=headers) as resp:
+        # 只请求第一个字节，从Content-Range中读取文件大小，连接可以被连接池复用
+        headers["Range"] = "bytes=0-0"
+        async with http_session.get_session().get(audio_url, headers=headers) as resp:
+            if resp.status == 206:
+                # 读取完这1字节后连接才能被连接池复用
+                await resp.read()
+                length = resp.headers.get('content-range', "").rsplit("/", 1)[-1]
+            else:
+                # 服务器忽略Range时返回完整的音频流，只使用响应头并直接关闭连接，不读取响应内容
                 length = resp.headers.get('content-length')
+                resp.close()
 
     except bilibili_api.ResponseCodeException as e:
         await console.rp(
@@ -192,6 +221,54 @@ async def get_filesize(info_dict: dict, num_p=0) -> Result:
             return success_result(result=length)
 
 
+async def get_stream_audio(info_dict: dict, download_type: DownloadType = DownloadType.BILIBILI_SINGLE, num_p=0) -> Result:
+    """
+    获取音频轨（DASH baseUrl）的直链，返回不保存文件、直接串流播放的音频
+    """
+    bvid = info_dict["bvid"]
+    if download_type is DownloadType.BILIBILI_P:
+        title = info_dict["pages"][num_p]["part"]
+    else:
+        title = info_dict["title"]
+
+    try:
+        # 实例化 Credential 类
+        credential = Credential(sessdata=SESSDATA, bili_jct=BILI_JCT, buvid3=BUVID3)
+        # 实例化 Video 类
+        v = video.Video(bvid=bvid, credential=credential)
+
+        # 获取视频下载链接
+        url = await v.get_download_url(num_p)
+        audio_url = url["dash"]["audio"][0]['baseUrl']
+
+    except (bilibili_api.ResponseCodeException, bilibili_api.ArgsException, httpx.ConnectTimeout, httpx.RemoteProtocolError) as e:
+        await console.rp(
+            f"触发异常{type(e).__module__}.{type(e).__name__}，{bvid}串流链接获取失败",
+            f"[{level}]",
+            message_type=utils.PrintType.ERROR,
+            print_head=True
+        )
+        return failed_result(exception=e, message="串流链接获取失败", retryable=isinstance(e, (httpx.ConnectTimeout, httpx.RemoteProtocolError)))
+
+    new_audio = audio.Audio(
+        title=title,
+        uid=construct_uid(bvid=bvid, download_type=download_type, num_p=num_p),
+        source=SOURCE,
+        source_id=bvid,
+        download_type=download_type,
+        path="",
+        duration=int(info_dict["pages"][num_p]["duration"])
+    )
+    new_audio.set_stream(audio_url, {
+        "User-Agent": "Mozilla/5.0",
+        "Referer": "https://www.bilibili.com/"
+    })
+    if "pic" in info_dict.keys():
+        new_audio.set_cover_url(info_dict["pic"])
+
+    return success_result(result=new_audio)
+
+
 def construct_uid(bvid: str, download_type: DownloadType, num_p: int) -> str:
     if resource_classifier.handler(download_type) is not DownloadHandler.BILIBILI_API_PYTHON:
         raise ValueError(f"错误下载类型：{download_type.name}")
@@ -206,9 +283,11 @@ def construct_uid(bvid: str, download_type: DownloadType, num_p: int) -> str:
 #   Not enough data to satisfy content length header.
 # aiohttp.client_exceptions.ClientPayloadError: Response payload is not completed: <ContentLengthError: 400, message='Not enough data to satisfy content length header.'>
 
-async def audio_download(info_dict: dict, download_dir: str, download_type: DownloadType = DownloadType.BILIBILI_SINGLE, num_p=0) -> Result:
+async def audio_download(info_dict: dict, download_dir: str, download_type: DownloadType = DownloadType.BILIBILI_SINGLE, num_p=0,
+                         stream: Optional[progressive.ProgressiveBuffer] = None) -> Result:
     """
     使用bilibili_api，下载来自哔哩哔哩的音频
+    如果提供<stream>，下载的数据会同时送入其中，用于边下载边播放
     """
     if resource_classifier.handler(download_type) is not DownloadHandler.BILIBILI_API_PYTHON:
         raise ValueError(f"错误下载类型：{download_type.name}")
@@ -225,6 +304,22 @@ async def audio_download(info_dict: dict, download_dir: str, download_type: Down
     file_title = utils.legal_name(f"{uid} - {title}")
     download_path = f"{download_dir}/{file_title}.mp3"
 
+    new_audio = audio.Audio(
+        title=title,
+        uid=uid,
+        source=SOURCE,
+        source_id=bvid,
+        download_type=download_type,
+        path=download_path,
+        duration=duration
+    )
+
+    if "pic" in info_dict.keys():
+        new_audio.set_cover_url(info_dict["pic"])
+
+    if stream is not None:
+        stream.set_audio(new_audio)
+
     try:
         # 实例化 Credential 类
         credential = Credential(sessdata=SESSDATA, bili_jct=BILI_JCT, buvid3=BUVID3)
@@ -244,13 +339,18 @@ async def audio_download(info_dict: dict, download_dir: str, download_type: Down
 
         # print(current_time + f"\n    开始下载: {file_title}.mp3\n下载进度:")
 
-        async with aiohttp.ClientSession() as sess:
-            # 下载音频流
-            async with sess.get(audio_url, headers=headers) as resp:
-                length = resp.headers.get('content-length')
-                size = utils.convert_byte(int(length))
-                await console.rp(f"开始下载：{file_title}.mp3 大小：{size[0]} {size[1]}", f"[{level}]")
-                with open(download_path, 'wb') as f:
+        # 下载音频流
+        async with http_session.get_session().get(audio_url, headers=headers) as resp:
+            length = resp.headers.get('content-length')
+            size = utils.convert_byte(int(length))
+            await console.rp(f"开始下载：{file_title}.mp3 大小：{size[0]} {size[1]}", f"[{level}]")
+            # 先写入临时文件，下载完成后再替换为目标文件，防止中断的下载留下不完整的音频文件
+            part_path = f"{download_path}.part"
+            completed = False
+            try:
+                with open(part_path, 'wb') as f:
+                    if stream is not None:
+                        stream.set_file(part_path)
                     process = 0
                     while True:
                         chunk = await resp.content.read(1024)
@@ -259,25 +359,26 @@ async def audio_download(info_dict: dict, download_dir: str, download_type: Down
 
                         process += len(chunk)
                         f.write(chunk)
+                        if stream is not None:
+                            # 数据需要落到文件中才能被读取者读到
+                            f.flush()
+                            stream.feed(len(chunk))
                         # TODO 待定 可以添加聊天界面进度显示
                         # 旧版进度显示
                         # print(f'\r    {process} / {length}', end="")
+                if stream is not None:
+                    stream.replace_file(download_path)
+                else:
+                    os.replace(part_path, download_path)
+                completed = True
+            finally:
+                if stream is not None:
+                    stream.finish(completed)
+                if os.path.exists(part_path):
+                    os.remove(part_path)
 
         # print("\n\n" + current_time + f"\n    下载完成\n")
 
-        new_audio = audio.Audio(
-            title=title,
-            uid=uid,
-            source=SOURCE,
-            source_id=bvid,
-            download_type=download_type,
-            path=download_path,
-            duration=duration
-        )
-
-        if "pic" in info_dict.keys():
-            new_audio.set_cover_url(info_dict["pic"])
-
         if download_type is DownloadType.BILIBILI_P:
             logger_prompt = (
                 f"下载完成\n"
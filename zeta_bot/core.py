@@ -7,6 +7,7 @@ import httpx
 import requests
 import platform
 import random
+import shlex
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
@@ -45,6 +46,12 @@ yt_dlp_version = yt_dlp_version.__version__
 update_time = "2026.08.16"
 
 supported_search_sites = ["哔哩哔哩", "YouTube"]
+# 批量添加时同时获取的音频数量（实际下载仍受下载调度器各下载器的并发上限限制）
+BULK_ENQUEUE_CONCURRENCY = 4
+# 批量添加YouTube播放列表或go-music-api歌单/专辑时，超过该数量则以占位条目加入，在即将播放时才获取
+LAZY_ENQUEUE_THRESHOLD = 10
+# 重启或关闭前等待未完成的信息编辑的最长时间（秒）
+MESSAGE_EDIT_FLUSH_TIMEOUT = 5
 
 logo = (
     "________  _______  _________  ________               ________  ________  _________   \n"
@@ -97,7 +104,17 @@ from zeta_bot import (
     guild,
     audio,
     playlist,
+    storage,
+    download_scheduler,
+    prefetch,
+    progressive,
+    http_session,
+    metadata_cache,
+    negative_cache,
+    message_editor,
+    search,
 )
+from zeta_bot.download_scheduler import DownloadPriority
 from zeta_bot.help import HelpMenu
 
 print(f"\nZeta-Bot程序启动\n{logo}\n\n{version_header}\n")
@@ -112,10 +129,15 @@ else:
 intents = discord.Intents.all()
 bot = discord.Bot(help_command=None, case_insensitive=True, intents=intents)
 
-# 设置用户和Discord服务器管理
+# 设置数据存储后端
 os.makedirs("./data", exist_ok=True)
-member_lib = member.MemberLibrary()
-guild_lib = guild.GuildLibrary()
+storage_engine = None
+if system_setting.value("storage_backend") == "sqlite":
+    storage_engine = storage.SQLiteStorage("./data/zeta_bot.db")
+
+# 设置用户和Discord服务器管理
+member_lib = member.MemberLibrary(storage_engine)
+guild_lib = guild.GuildLibrary(storage_engine)
 
 # 设置下载文件管理
 os.makedirs("./downloads", exist_ok=True)
@@ -123,8 +145,19 @@ audio_lib_main = file_management.AudioFileLibrary(
     "./downloads",
     "./data/audio_lib_main.json",
     "主音频文件库",
-    system_setting.value("audio_library_storage_capacity") * 1024 * 1024  # 要求用户输入的单位为MB，转换为字节Byte
+    system_setting.value("audio_library_storage_capacity") * 1024 * 1024,  # 要求用户输入的单位为MB，转换为字节Byte
+    storage_engine,
+    system_setting.value("audio_library_eviction_policy")
 )
+# 下载模块共享的HTTP连接池
+http_session_manager = http_session.HTTPSessionManager()
+
+# 下载调度器，所有下载都需要经过调度器
+dl_scheduler = download_scheduler.DownloadScheduler(audio_lib_main)
+# 播放列表预取，提前检查并修复即将播放的音频文件
+prefetcher = prefetch.Prefetcher(dl_scheduler, audio_lib_main)
+# 信息编辑调度器，合并同一信息的连续编辑
+edit_scheduler = message_editor.MessageEditScheduler()
 
 # 加载资源分类器
 resource_classifier = ResourceClassifier()
@@ -267,9 +300,23 @@ async def on_ready():
             "[系统]"
         )
 
+    # 首次使用SQLite存储后端时导入现有的json数据，需要在初始化主音频库之前完成
+    if storage_engine is not None and not storage_engine.is_migrated():
+        migrate_counter = storage_engine.migrate_from_json("./data/members", "./data/guilds", "./data/audio_lib_main.json")
+        await console.rp(
+            f"已将json数据导入SQLite数据库：用户 {migrate_counter['members']} 个，"
+            f"服务器 {migrate_counter['guilds']} 个，音频库索引 {migrate_counter['library_entries']} 条",
+            "[系统]"
+        )
+
     # 初始化主音频库
     await audio_lib_main.initialize()
 
+    # 上传图标并使用CDN链接引用
+    icon_channel_id = system_setting.value("icon_asset_channel")
+    if icon_channel_id not in (None, "", "0"):
+        await icon_lib.setup_delivery(bot, int(icon_channel_id))
+
     # 设置机器人状态
     bot_activity_type = discord.ActivityType.playing
     await bot.change_presence(
@@ -359,7 +406,11 @@ async def auto_reboot():
     current_time = utils.ctime_str()
     await console.rp(f"执行自动定时重启", "[系统]")
     await guild_lib.save_all()
-    # user_library.save()
+    member_lib.save_all()
+    await edit_scheduler.wait_all(timeout=MESSAGE_EDIT_FLUSH_TIMEOUT)
+    await http_session_manager.close()
+    ytdlp.worker_pool.shutdown()
+    metadata_cache.MetadataCache().close()
     if system_setting.value("ar_announcement"):
         for current_guild in bot.guilds:
             voice_client = current_guild.voice_client
@@ -565,6 +616,34 @@ async def embed_eos(
         return await ctx.send(content=None, embed=embed, files=files, view=view, silent=silent), embed
 
 
+def eos_later(
+        ctx: discord.ApplicationContext,
+        response: Union[discord.Interaction, discord.InteractionMessage, discord.Message],
+        content: Optional[str] = None,
+        embed: Optional[discord.Embed] = None,
+        view: Optional[discord.ui.View] = None,
+        icon_filename: Optional[str] = None
+) -> None:
+    """
+    [Edit Or Send，不等待]
+    通过信息编辑调度器编辑<response>，同一信息短时间内的多次编辑只会执行最后一次，<embed>的内容在实际编辑时读取
+    <icon_filename>为<embed>的作者图标，其链接与附件在实际编辑时一起生成，<response>无法被编辑时直接在后台发送新信息
+    """
+    async def edit():
+        files = None
+        if icon_filename is not None:
+            icon_url, files = icon_lib.resolve(icon_filename)
+            # 图标可能在提交后完成上传，按编辑时的图标状态重新设置链接，与附件保持一致
+            if embed is not None and embed.author is not None:
+                embed.set_author(name=embed.author.name, url=embed.author.url, icon_url=icon_url)
+        await eos(ctx, response, content=content, embed=embed, view=view, files=files)
+
+    if isinstance(response, (discord.Interaction, discord.InteractionMessage, discord.Message)):
+        edit_scheduler.submit(message_editor.message_key(response), edit)
+    else:
+        edit_scheduler.run(edit)
+
+
 async def append_content(target, content: str, embed=None, view=None) -> Optional[discord.Message]:
     """
     如果修改次数大于一次，请确保传入本方法第一次返回的Message对象，因为Interaction只能获取最初的信息
@@ -739,6 +818,10 @@ async def debug3(ctx):
         return
 
     audio_lib_main.print_info()
+    dl_scheduler.print_info()
+    metadata_cache.MetadataCache().print_info()
+    negative_cache.NegativeCache().print_info()
+    edit_scheduler.print_info()
 
     await ctx.respond("测试结果已打印")
 
@@ -1141,8 +1224,6 @@ async def search_audio_callback(
     await guild_lib.check(ctx, audio_lib_main)
     current_guild = guild_lib.get_guild(ctx)
 
-    search_result: Dict[str, Optional[List]] = {key: None for key in supported_search_sites}
-
     icon_loading_filename = "hourglass_hover_rotation_animated_1000ms_infinite_30px.gif"
     icon_error_filename = "error_cross_hover_pinch_orange_animated_0ms_100px.gif"
 
@@ -1154,32 +1235,18 @@ async def search_audio_callback(
     if site is not None and site not in supported_search_sites:
         await embed_eos(ctx, response, author_name="不支持该平台搜索", colour=orange, author_icon_url=icon.url(icon_error_filename), files=icon_lib.files(icon_error_filename), silent=True)
         return
-    if site == "哔哩哔哩" or site is None:
-        search_result["哔哩哔哩"] = await bilibili.search(query, query_num=query_num)
-    if site == "YouTube" or site is None:
-        search_result["YouTube"] = await ytdlp.youtube_search(query, query_num=query_num)
-
-    title_str = f""
-    address_str = f""
-    resource_list = []
-    counter = 1
-    for key in search_result:
-        if search_result[key] is not None:
-            title_str += f"{key}\n"
-            address_str += f"{key}\n"
-            for item in search_result[key]:
-                title_str += f"> [{counter}] **{utils.markdown_escape(item['title'])}** [{utils.convert_duration_to_str(item['duration'])}]\n"
-                address_str += (
-                    f"> [{counter}] **{utils.markdown_escape(item['title'])}** [{utils.convert_duration_to_str(item['duration'])}]\n"
-                    f"> {item['id']}\n"
-                )
-                resource_list.append(item)
-                counter += 1
+    site_list = supported_search_sites if site is None else [site]
+
+    # 各平台同时搜索，每个平台完成时更新一次菜单，较慢的平台不会阻塞已完成的结果
+    menu = None
+    async for search_result, pending_site_list in search.search_sites(site_list, query, query_num):
+        title_str, address_str, resource_list = search.render_search_result(search_result, pending_site_list)
+        if menu is None:
+            menu = SearchedAudioSelectionMenu(ctx, query, title_str, address_str, resource_list)
+            await menu.init_eos(loading_msg, silent=True)
+        elif not menu.finish:
+            await menu.update_result(title_str, address_str, resource_list)
 
-    title_str += "\n**请选择要播放的音频序号**"
-    address_str += "\n**请选择要播放的音频序号**"
-    menu = SearchedAudioSelectionMenu(ctx, query, title_str, address_str, resource_list)
-    await menu.init_eos(loading_msg, silent=True)
     await current_guild.refresh_list_view()
 
 
@@ -1270,7 +1337,24 @@ async def play_callback(ctx: discord.ApplicationContext, link, response: Union[d
     await current_guild.refresh_list_view()
 
 
-async def play_audio(ctx: discord.ApplicationContext, target_audio: audio.Audio, response: Union[discord.Interaction, discord.InteractionMessage, None] = None, function_call: bool = False) -> None:
+def download_priority(voice_client, current_playlist, bulk: bool = False) -> DownloadPriority:
+    """
+    根据服务器当前的播放状态决定下载优先级：没有正在播放的音频时下载的音频将立即播放，优先级最高
+
+    :param voice_client: 服务器的语音客户端
+    :param current_playlist: 服务器的主播放列表
+    :param bulk: 是否为批量添加
+    """
+    if current_playlist.is_empty() and (voice_client is None or not voice_client.is_playing()):
+        return DownloadPriority.NOW_PLAYING
+    elif bulk:
+        return DownloadPriority.BULK
+    else:
+        return DownloadPriority.NEXT_UP
+
+
+async def play_audio(ctx: discord.ApplicationContext, target_audio: audio.Audio, response: Union[discord.Interaction, discord.InteractionMessage, None] = None, function_call: bool = False,
+                     stream: Optional[progressive.ProgressiveBuffer] = None) -> None:
     """
     在<ctx>中的音频端播放音频<target_audio>，如果<single>为True则发送单曲加入成功通知
     <response>为用来编辑的加载信息，如果为None则发送新的通知
@@ -1279,18 +1363,33 @@ async def play_audio(ctx: discord.ApplicationContext, target_audio: audio.Audio,
     :param target_audio: 需要播放的音频
     :param response: 用于编辑的加载信息
     :param function_call 该指令是否是由其他函数调用
+    :param stream: 如果不为None，则从该管道中边下载边播放，而不是读取<target_audio>的文件
     """
     voice_client = ctx.guild.voice_client
     current_guild = guild_lib.get_guild(ctx)
     audio_lib_main.lock_audio(f"{ctx.guild.id}_NOW_PLAYING", target_audio)
 
+    if stream is not None:
+        audio_source = discord.FFmpegPCMAudio(executable=ffmpeg_path, source=stream, pipe=True)
+    elif target_audio.is_stream():
+        # 直接串流播放的音频由FFmpeg通过HTTP读取，断线时自动重连
+        before_options = "-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5"
+        stream_headers = target_audio.get_stream_headers()
+        if stream_headers:
+            header_str = "".join(f"{key}: {value}\r\n" for key, value in stream_headers.items())
+            before_options += f" -headers {shlex.quote(header_str)}"
+        audio_source = discord.FFmpegPCMAudio(executable=ffmpeg_path, source=target_audio.get_stream_url(), before_options=before_options)
+    else:
+        audio_source = discord.FFmpegPCMAudio(executable=ffmpeg_path, source=target_audio.get_path())
+
+    def after_playing(error):
+        if stream is not None:
+            stream.close()
+        asyncio.run_coroutine_threadsafe(play_next(ctx), bot.loop)
+
     voice_client.play(
-        discord.PCMVolumeTransformer(
-            discord.FFmpegPCMAudio(
-                executable=ffmpeg_path, source=target_audio.get_path()
-            )
-        ),
-        after=lambda e: asyncio.run_coroutine_threadsafe(play_next(ctx), bot.loop)
+        discord.PCMVolumeTransformer(audio_source),
+        after=after_playing
     )
     voice_client.source.volume = current_guild.get_voice_volume() / 100.0
 
@@ -1304,6 +1403,55 @@ async def play_audio(ctx: discord.ApplicationContext, target_audio: audio.Audio,
     await current_guild.refresh_playing_message(message, embed)
     await current_guild.refresh_list_view()
 
+    # 在后台检查接下来的音频
+    prefetcher.schedule(current_guild.get_playlist())
+
+
+async def download_bilibili_progressive(ctx: discord.ApplicationContext, info_dict, response=None) -> Tuple[Result, bool]:
+    """
+    下载哔哩哔哩单一视频的音频，缓冲足够的数据后立即开始边下载边播放，下载完成后音频照常加入音频库
+    只在服务器当前没有正在播放的音频时使用
+
+    :param ctx: 指令原句
+    :param info_dict: 视频信息
+    :param response: 用于编辑的加载信息
+    :return: 下载结果，以及是否已经开始边下载边播放（已开始播放的音频已加入播放列表，下载失败时停止播放并返回False）
+    """
+    voice_client = ctx.guild.voice_client
+    current_guild = guild_lib.get_guild(ctx)
+    current_playlist = current_guild.get_playlist()
+
+    stream = progressive.ProgressiveBuffer()
+    download_task = asyncio.create_task(
+        dl_scheduler.download_bilibili(info_dict, DownloadType.BILIBILI_SINGLE, 0, priority=DownloadPriority.NOW_PLAYING, stream=stream)
+    )
+    ready_task = asyncio.create_task(stream.ready.wait())
+    await asyncio.wait([download_task, ready_task], return_when=asyncio.FIRST_COMPLETED)
+    ready_task.cancel()
+
+    started = False
+    # 下载仍在进行且已缓冲足够的数据，同时服务器仍然没有正在播放的音频
+    if not stream.is_finished() and stream.audio is not None and current_playlist.is_empty() and not voice_client.is_playing():
+        await play_audio(ctx, stream.audio, response=response, stream=stream)
+        current_playlist.append_audio(stream.audio)
+        await console.rp(f"音频 {stream.audio.get_title()} [{stream.audio.get_duration_str()}] 已加入播放列表（边下载边播放）", ctx.guild)
+        await current_guild.refresh_list_view()
+        started = True
+    else:
+        stream.close()
+
+    new_result = await result_check(await download_task)
+    stream.finish(new_result.result is not None)
+
+    # 边下载边播放的音频下载失败，停止播放（after_playing触发的play_next会将其从播放列表中移除），交由调用者按未开始播放处理
+    if started and new_result.result is None:
+        if current_playlist.get_audio(0) is stream.audio and (voice_client.is_playing() or voice_client.is_paused()):
+            voice_client.stop()
+        await console.rp(f"音频 {stream.audio.get_title()} 边下载边播放时下载失败，已停止播放", ctx.guild, message_type=utils.PrintType.WARNING, print_head=True)
+        started = False
+
+    return new_result, started
+
 
 async def play_next(ctx: discord.ApplicationContext) -> None:
     """
@@ -1322,8 +1470,7 @@ async def play_next(ctx: discord.ApplicationContext) -> None:
     # 解锁上一个音频
     audio_lib_main.unlock_audio(f"{ctx.guild.id}_NOW_PLAYING", finished_audio)
 
-    # TODO 制作文件丢失处理方法，当前流程为文件丢失会触发播放Invalid argument，直接触发play_next进入下一个音频
-    if len(current_playlist) > 0:
+    if await ensure_head_playable(ctx):
         # 获取下一个音频
         next_audio = current_playlist.get_audio(0)
         await play_audio(ctx, next_audio, response=None)
@@ -1337,6 +1484,26 @@ async def play_next(ctx: discord.ApplicationContext) -> None:
     await current_guild.refresh_list_view()
 
 
+async def ensure_head_playable(ctx: discord.ApplicationContext) -> bool:
+    """
+    确保播放列表的第一个音频可以播放（获取占位条目，修复丢失的文件），无法获取时跳过该音频
+
+    :param ctx: 指令原句
+    :return: 播放列表中是否还有可以播放的音频
+    """
+    current_playlist = guild_lib.get_guild(ctx).get_playlist()
+    while len(current_playlist) > 0:
+        next_audio = current_playlist.get_audio(0)
+        if await prefetcher.ensure_playable(current_playlist):
+            return True
+        if current_playlist.get_audio(0) is next_audio:
+            current_playlist.pop_audio(0)
+        await console.rp(f"音频 {next_audio.get_title()} 文件丢失且重新获取失败，已跳过", ctx.guild, message_type=utils.PrintType.WARNING)
+        error_icon_filename = "error_cross_hover_pinch_orange_animated_0ms_100px.gif"
+        await embed_send(ctx, description=f"**{next_audio.get_title()}**", author_name="音频文件丢失且重新获取失败，已跳过", colour=orange, author_icon_url=icon.url(error_icon_filename), files=icon_lib.files(error_icon_filename))
+    return False
+
+
 async def play_bilibili(ctx: discord.ApplicationContext, link_type: LinkType, url, response = None, maximum_retry: int = 4):
     """
     下载并播放来自Bilibili的视频的音频
@@ -1377,11 +1544,17 @@ async def play_bilibili(ctx: discord.ApplicationContext, link_type: LinkType, ur
 
     # 单一视频 bilibili_single 与 合集视频 bilibili_collection
     if info_dict["videos"] == 1:
-        new_result = await result_check(await audio_lib_main.download_bilibili(info_dict, DownloadType.BILIBILI_SINGLE, 0))
+        priority = download_priority(voice_client, current_playlist)
+        # 没有正在播放的音频时边下载边播放
+        if priority is DownloadPriority.NOW_PLAYING:
+            new_result, streaming = await download_bilibili_progressive(ctx, info_dict, response=response)
+        else:
+            new_result = await result_check(await dl_scheduler.download_bilibili(info_dict, DownloadType.BILIBILI_SINGLE, 0, priority=priority))
+            streaming = False
         new_audio = new_result.result
 
-        # 如果音频获取成功
-        if new_audio is not None:
+        # 如果音频获取成功（边下载边播放的音频在开始播放时已经加入播放列表）
+        if new_audio is not None and not streaming:
 
             # 如果当前播放列表为空
             if current_playlist.is_empty() and not voice_client.is_playing():
@@ -1396,7 +1569,7 @@ async def play_bilibili(ctx: discord.ApplicationContext, link_type: LinkType, ur
 
             await current_guild.refresh_list_view()
 
-        else:
+        elif new_audio is None:
             if isinstance(new_result.exception, errors.StorageFull):
                 await embed_eos(ctx, response, author_name=f"机器人当前处理音频过多，请稍后再试", author_icon_url=icon.url(icon_error_filename), files=icon_lib.files(icon_error_filename))
             elif new_result.retryable:
@@ -1411,9 +1584,13 @@ async def play_bilibili(ctx: discord.ApplicationContext, link_type: LinkType, ur
 
                         await embed_eos(ctx, response, author_name=f"错误：音频获取失败 " + new_result.message + f"：第 {retry_counter} 次重试中", colour=orange, author_icon_url=icon.url(icon_loading_filename), files=icon_lib.files(icon_loading_filename))
 
-                        new_result = await result_check(await audio_lib_main.download_bilibili(info_dict, DownloadType.BILIBILI_SINGLE, 0))
+                        new_result = await result_check(await dl_scheduler.download_bilibili(info_dict, DownloadType.BILIBILI_SINGLE, 0, priority=download_priority(voice_client, current_playlist)))
                         new_audio = new_result.result
 
+                        # 资源已确认失效或受限时不再重试
+                        if new_audio is None and not new_result.retryable:
+                            break
+
                         # 如果音频加载成功
                         if new_audio is not None:
 
@@ -1493,7 +1670,7 @@ async def play_go_music(ctx: discord.ApplicationContext, link_type: LinkType, ur
         except KeyError as e:
             await embed_eos(ctx, response, author_name="不支持此下载类型", colour=orange, author_icon_url=icon.url(icon_error_filename), files=icon_lib.files(icon_error_filename), silent=True)
             return
-        new_result = await result_check(await audio_lib_main.download_go_music(info_dict["songs"][0], download_type))
+        new_result = await result_check(await dl_scheduler.download_go_music(info_dict["songs"][0], download_type, priority=download_priority(voice_client, current_playlist)))
         new_audio = new_result.result
 
         if new_audio is not None:
@@ -1525,9 +1702,13 @@ async def play_go_music(ctx: discord.ApplicationContext, link_type: LinkType, ur
 
                         await embed_eos(ctx, response, author_name=f"错误：音频获取失败 " + new_result.message + f"：第 {retry_counter} 次重试中", colour=orange, author_icon_url=icon.url(icon_loading_filename), files=icon_lib.files(icon_loading_filename))
 
-                        new_result = await result_check(await audio_lib_main.download_ytdlp(url, info_dict["songs"][0], DownloadType.YOUTUBE_SINGLE))
+                        new_result = await result_check(await dl_scheduler.download_go_music(info_dict["songs"][0], download_type, priority=download_priority(voice_client, current_playlist)))
                         new_audio = new_result.result
 
+                        # 资源已确认失效或受限时不再重试
+                        if new_audio is None and not new_result.retryable:
+                            break
+
                         # 如果音频加载成功
                         if new_audio is not None:
                             # 如果当前播放列表为空
@@ -1647,7 +1828,7 @@ async def play_ytdlp(ctx: discord.ApplicationContext, url, response=None, maximu
 
     # 独立视频 youtube_single
     if link_type is DownloadType.YOUTUBE_SINGLE:
-        new_result = await result_check(await audio_lib_main.download_ytdlp(url, info_dict, DownloadType.YOUTUBE_SINGLE))
+        new_result = await result_check(await dl_scheduler.download_ytdlp(url, info_dict, DownloadType.YOUTUBE_SINGLE, priority=download_priority(voice_client, current_playlist)))
         new_audio = new_result.result
 
         if new_audio is not None:
@@ -1679,9 +1860,13 @@ async def play_ytdlp(ctx: discord.ApplicationContext, url, response=None, maximu
 
                         await embed_eos(ctx, response, author_name=f"错误：音频获取失败 " + new_result.message + f"：第 {retry_counter} 次重试中", colour=orange, author_icon_url=icon.url(icon_loading_filename), files=icon_lib.files(icon_loading_filename))
 
-                        new_result = await result_check(await audio_lib_main.download_ytdlp(url, info_dict, DownloadType.YOUTUBE_SINGLE))
+                        new_result = await result_check(await dl_scheduler.download_ytdlp(url, info_dict, DownloadType.YOUTUBE_SINGLE, priority=download_priority(voice_client, current_playlist)))
                         new_audio = new_result.result
 
+                        # 资源已确认失效或受限时不再重试
+                        if new_audio is None and not new_result.retryable:
+                            break
+
                         # 如果音频加载成功
                         if new_audio is not None:
 
@@ -1918,6 +2103,9 @@ async def resume_callback(ctx: discord.ApplicationContext, command_call: bool =
 
     # 没有被暂停，没有正在播放，并且播放列表中存在歌曲的情况
     elif not current_playlist.is_empty():
+        # 第一个音频可能为占位条目或文件已丢失
+        if not await ensure_head_playable(ctx):
+            return
         current_audio = current_playlist.get_audio(0)
 
         await play_audio(ctx, current_audio, function_call=True)
@@ -2058,8 +2246,7 @@ async def skip_callback(ctx, first_index: Union[int, str, None] = None, second_i
 
             # 如果需要跳过正在播放的歌，则需要先移除除第一首歌以外的歌曲，第一首由stop()触发play_next移除
             if first_index == 1:
-                for i in range(second_index, first_index, -1):
-                    current_playlist.remove_audio(i - 1)
+                current_playlist.remove_range(1, second_index)
 
                 if voice_client is not None:
                     voice_client.stop()
@@ -2084,8 +2271,7 @@ async def skip_callback(ctx, first_index: Union[int, str, None] = None, second_i
 
             # 不需要跳过正在播放的歌
             else:
-                for i in range(second_index, first_index - 1, -1):
-                    current_playlist.remove_audio(i - 1)
+                current_playlist.remove_range(first_index - 1, second_index)
 
                 await console.rp(f"第{first_index}到第{second_index}个音频被用户 {ctx.author} 移出播放列表", ctx.guild)
                 if command_call:
@@ -2183,12 +2369,12 @@ async def clear_callback(ctx):
 
     # voice_client存在，且是正在播放或者是暂停的状态（为了排除重启后已连接voice_client但未播放的状态）
     if voice_client is not None and (voice_client.is_playing() or voice_client.is_paused()):
-        # remove_all跳过正在播放的歌曲
-        current_playlist.remove_all(skip_first=True)
+        # clear跳过正在播放的歌曲
+        current_playlist.clear(skip_first=True)
         # stop触发play_next删除正在播放的歌曲
         voice_client.stop()
     else:
-        current_playlist.remove_all()
+        current_playlist.clear()
 
     await console.rp(f"用户 {ctx.author} 已清空所在服务器的播放列表", ctx.guild)
     clear_icon_filename = "bin_hover_empty_animated_0ms_100px.gif"
@@ -2266,6 +2452,11 @@ async def reboot_callback(ctx):
     重启程序
     """
     await guild_lib.save_all()
+    member_lib.save_all()
+    await edit_scheduler.wait_all(timeout=MESSAGE_EDIT_FLUSH_TIMEOUT)
+    await http_session_manager.close()
+    ytdlp.worker_pool.shutdown()
+    metadata_cache.MetadataCache().close()
 
     icon_filename = "spin_in_reveal_0ms_100px.gif"
     await embed_respond(ctx, author_name="正在重启", colour=red, author_icon_url=icon.url(icon_filename), files=icon_lib.files(icon_filename))
@@ -2278,6 +2469,11 @@ async def shutdown_callback(ctx):
     退出程序
     """
     await guild_lib.save_all()
+    member_lib.save_all()
+    await edit_scheduler.wait_all(timeout=MESSAGE_EDIT_FLUSH_TIMEOUT)
+    await http_session_manager.close()
+    ytdlp.worker_pool.shutdown()
+    metadata_cache.MetadataCache().close()
 
     icon_filename = "logout_hover_pinch_red_animated_0ms_100px.gif"
     await embed_respond(ctx, author_name="正在关闭", colour=red, author_icon_url=icon.url(icon_filename), files=icon_lib.files(icon_filename))
@@ -2300,7 +2496,10 @@ class PlaylistMenu(View):
         self.page_num = 0
         self.occur_time = utils.ctime_str()
 
-        self.playlist_pages = None
+        # 每页显示的音频数量
+        self.page_size = 10
+        self.page_count = 1
+        self.playlist_page = None
         self.voice_client = None
         self.voice_client_status = None
         self.voice_client_status_str = None
@@ -2334,9 +2533,19 @@ class PlaylistMenu(View):
         await self.set_original_msg(original_msg)
 
     async def refresh_menu(self):
-        self.refresh_pages()
-        files = icon_lib.files(self.icon_filename)
-        await eos(self.ctx, response=self.original_msg, content=None, embed=self.embed, view=self, files=files)
+        """
+        通过信息编辑调度器刷新菜单，连续的播放列表变化只会产生一次编辑，页面内容在实际编辑时生成
+        """
+        async def edit():
+            # 等待期间菜单已被覆盖或超时
+            if self.overrode or self.time_outed:
+                return
+            self.refresh_pages()
+            files = icon_lib.files(self.icon_filename)
+            await eos(self.ctx, response=self.original_msg, content=None, embed=self.embed, view=self, files=files)
+
+        if self.original_msg is not None:
+            edit_scheduler.submit(message_editor.message_key(self.original_msg), edit)
 
     async def _refresh_menu(self, interaction):
         """
@@ -2358,37 +2567,39 @@ class PlaylistMenu(View):
         await interaction.message.edit(content=None, embed=self.embed, view=self, files=files)
 
     def refresh_pages(self):
-        # 生成播放列表主体文本
-        self.playlist_pages = utils.make_playlist_page(
-            self.playlist.get_list_info(),
-            10,
-            {None: ">       ", 0: "> ▶  **"},
-            {0: "**"},
-            title_markdown_bold=False,
-            escape_markdown=True,
-        )
-
         # 先启用所有可变状态的按钮，稍后根据状态禁用
         variable_states_buttons = {"button_next_audio", "button_previous_page", "button_next_page"}
         for button in self.children:
             if isinstance(button, discord.ui.Button) and button.custom_id in variable_states_buttons:
                 button.disabled = False
 
-        # 如果self.playlist_pages长度为0，则插入一个当前播放列表为空，此时长度为1
-        if len(self.playlist_pages) == 0:
-            self.playlist_pages.append("> **当前播放列表为空**\n")
-            # 如果播放列表为空则禁用下一首按钮
-            for button in self.children:
-                if isinstance(button, discord.ui.Button) and button.custom_id == "button_next_audio":
-                    button.disabled = True
-                    break
+        # 播放列表为空时仍显示1页
+        playlist_length = len(self.playlist)
+        self.page_count = max((playlist_length + self.page_size - 1) // self.page_size, 1)
 
         # 如果当前页码小于范围则跳转至第一页
         if self.page_num < 0:
             self.page_num = 0
         # 如果当前页码大于范围则跳转至最后一页
-        if self.page_num > len(self.playlist_pages) - 1:
-            self.page_num = len(self.playlist_pages) - 1
+        if self.page_num > self.page_count - 1:
+            self.page_num = self.page_count - 1
+
+        # 只生成当前页的播放列表主体文本，每个音频的转义文本缓存在音频中
+        if playlist_length == 0:
+            self.playlist_page = "> **当前播放列表为空**\n"
+            # 如果播放列表为空则禁用下一首按钮
+            for button in self.children:
+                if isinstance(button, discord.ui.Button) and button.custom_id == "button_next_audio":
+                    button.disabled = True
+                    break
+        else:
+            page_start = self.page_num * self.page_size
+            self.playlist_page = utils.make_page_from_lines(
+                self.playlist.get_page_lines(page_start, page_start + self.page_size),
+                page_start,
+                {None: ">       ", 0: "> ▶  **"},
+                {0: "**"},
+            )
 
         # 更新播放状态文本
         self.voice_client = self.ctx.guild.voice_client
@@ -2442,7 +2653,7 @@ class PlaylistMenu(View):
                     break
 
         # 如果在最后1页则禁用下一页按钮
-        if self.page_num == len(self.playlist_pages) - 1:
+        if self.page_num == self.page_count - 1:
             for button in self.children:
                 if isinstance(button, discord.ui.Button) and button.custom_id == "button_next_page":
                     button.disabled = True
@@ -2450,18 +2661,18 @@ class PlaylistMenu(View):
 
         self.playlist_duration = self.playlist.get_duration_str()
 
-        embed_playlist_length_str = f"列表长度：{len(self.playlist)}"
-        embed_playlist_duration_str = f"总时长：{self.playlist.get_duration_str()}"
+        embed_playlist_length_str = f"列表长度：{playlist_length}"
+        embed_playlist_duration_str = f"总时长：{self.playlist_duration}"
         embed_voice_client_status_str = f"状态：{self.voice_client_status_str}"
 
         # 设置嵌套元素
         # 使用\u2003全角空格加宽间距
         self.embed.description = (
             f"{embed_playlist_length_str}\u2003\u2003{embed_playlist_duration_str}\u2003\u2003{embed_voice_client_status_str}\n\n"
-            f"{self.playlist_pages[self.page_num]}"
+            f"{self.playlist_page}"
         )
         self.embed.timestamp = utils.ctime_datetime()
-        self.embed.set_footer(text=f"第[{self.page_num + 1}]页，共[{len(self.playlist_pages)}]页")
+        self.embed.set_footer(text=f"第[{self.page_num + 1}]页，共[{self.page_count}]页")
 
     @discord.ui.button(label="▍◀", style=discord.ButtonStyle.grey, custom_id="button_previous_audio", row=1)
     async def button_previous_audio_callback(self, button, interaction):
@@ -2531,8 +2742,8 @@ class PlaylistMenu(View):
         msg = interaction.response
         self.refresh_pages()
         # 翻页
-        if self.page_num >= len(self.playlist_pages) - 1:
-            self.page_num = len(self.playlist_pages) - 1
+        if self.page_num >= self.page_count - 1:
+            self.page_num = self.page_count - 1
         else:
             self.page_num += 1
 
@@ -3089,7 +3300,10 @@ class EpisodeSelectMenu(View):
         self.icon_filename = icon_loading_filename
         self.embed.set_author(name=f"{self.list_type}：正在添加", icon_url=icon.url(self.icon_filename))
         embed_append_description(self.embed, f"正在将 {total_num} 个音频添加入播放列表：")
-        await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
+        eos_later(self.ctx, self.original_msg, embed=self.embed, view=self, icon_filename=self.icon_filename)
+
+        # 只有YouTube播放列表与go-music-api歌单/专辑支持以占位条目加入
+        placeholder_function = None
 
         # 如果为Bilibili分p音频
         if self.download_type is DownloadType.BILIBILI_P:
@@ -3098,79 +3312,11 @@ class EpisodeSelectMenu(View):
                 if counter in final_result:
                     total_duration += item["duration"]
                 counter += 1
-            total_duration = utils.convert_duration_to_str(total_duration)
-            self.embed.set_footer(text=f"总时长 -> [{total_duration}]")
-            await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
-
-            for num_p in final_result:
-                new_result = await result_check(await audio_lib_main.download_bilibili(self.info_dict, DownloadType.BILIBILI_P, num_p - 1))
-                new_audio = new_result.result
-
-                # 如果音频加载成功
-                if new_audio is not None:
-
-                    # 如果当前播放列表为空
-                    if current_playlist.is_empty() and not voice_client.is_playing():
-                        await play_audio(self.ctx, new_audio, response=self.original_msg)
-
-                    current_playlist.append_audio(new_audio)
-                    await console.rp(f"音频 {new_audio.get_title()} [{new_audio.get_duration_str()}] 已加入播放列表", self.ctx.guild)
-
-                    await current_guild.refresh_list_view()
-
-                    embed_append_description(self.embed, f"> [{num_p}] **{new_audio.get_title()}** [{new_audio.get_duration_str()}]")
-                    await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
-                    success_num += 1
-
-                else:
-                    if isinstance(new_result.exception, errors.StorageFull):
-                        embed_append_description(self.embed, f"**机器人当前处理音频过多，请稍后再试**")
-                        await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
-                        return
-                    # 如果错误类型可以重试
-                    elif new_result.retryable:
-                        # 如果不重试则直接发送错误与稍后再试
-                        if maximum_retry < 1:
-                            embed_append_description(self.embed, f"**错误：[{num_p}] 获取失败** " + new_result.message + "，请稍后再试")
-                            await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
-
-                        # 如果重试
-                        else:
-                            retry_counter = 0
-                            while retry_counter < maximum_retry:
-                                retry_counter += 1
-
-                                embed_replace_description_last_line(self.embed, f"**错误：[{num_p}] 获取失败** " + new_result.message + f"：第 {retry_counter} 次重试中")
-                                await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
-
-                                new_result = await result_check(await audio_lib_main.download_bilibili(self.info_dict, DownloadType.BILIBILI_P, num_p - 1))
-                                new_audio = new_result.result
-
-                                # 如果音频加载成功
-                                if new_audio is not None:
 
-                                    # 如果当前播放列表为空
-                                    if current_playlist.is_empty() and not voice_client.is_playing():
-                                        await play_audio(self.ctx, new_audio, response=self.original_msg)
+            item_list = [(num_p, self.info_dict["pages"][num_p - 1]["part"]) for num_p in final_result]
 
-                                    current_playlist.append_audio(new_audio)
-                                    await console.rp(f"音频 {new_audio.get_title()} [{new_audio.get_duration_str()}] 已加入播放列表", self.ctx.guild)
-
-                                    await current_guild.refresh_list_view()
-
-                                    embed_replace_description_last_line(self.embed, f"> [{num_p}] **{new_audio.get_title()}** [{new_audio.get_duration_str()}]")
-                                    await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
-                                    success_num += 1
-                                    break
-
-                            # 如果重试最终没有成功
-                            if new_audio is None:
-                                embed_replace_description_last_line(self.embed, f"**错误：[{num_p}] 获取失败** " + new_result.message + "，请稍后再试")
-                                await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
-
-                    else:
-                        embed_append_description(self.embed, f"**错误：[{num_p}] 获取失败** " + new_result.message)
-                        await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
+            async def download_function(num_p, priority) -> Result:
+                return await dl_scheduler.download_bilibili(self.info_dict, DownloadType.BILIBILI_P, num_p - 1, priority=priority)
 
         # 如果为Bilibili合集音频
         elif self.download_type is DownloadType.BILIBILI_COLLECTION:
@@ -3179,276 +3325,69 @@ class EpisodeSelectMenu(View):
                 if counter in final_result:
                     total_duration += item["arc"]["duration"]
                 counter += 1
-            total_duration = utils.convert_duration_to_str(total_duration)
-            self.embed.set_footer(text=f"总时长 -> [{total_duration}]")
-            await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
-
-            for num in final_result:
-                title = self.info_dict["ugc_season"]["sections"][0]["episodes"][num - 1]["title"]
-                new_result = await result_check(await audio_lib_main.download_bilibili(self.info_dict, DownloadType.BILIBILI_COLLECTION, num_option=num - 1))
-                new_audio = new_result.result
-
-                # 如果音频加载成功
-                if new_audio is not None:
-
-                    # 如果当前播放列表为空
-                    if current_playlist.is_empty() and not voice_client.is_playing():
-                        await play_audio(self.ctx, new_audio, response=self.original_msg)
-
-                    current_playlist.append_audio(new_audio)
-                    await console.rp(f"音频 {new_audio.get_title()} [{new_audio.get_duration_str()}] 已加入播放列表", self.ctx.guild)
-
-                    await current_guild.refresh_list_view()
 
-                    embed_append_description(self.embed, f"> [{num}] **{new_audio.get_title()}** [{new_audio.get_duration_str()}]")
-                    await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
-                    success_num += 1
+            item_list = [(num, self.info_dict["ugc_season"]["sections"][0]["episodes"][num - 1]["title"]) for num in final_result]
 
-                else:
-                    if isinstance(new_result.exception, errors.StorageFull):
-                        embed_append_description(self.embed, f"**机器人当前处理音频过多，请稍后再试**")
-                        await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
-                        return
-                    # 如果错误类型可以重试
-                    elif new_result.retryable:
-                        # 如果不重试直接发送错误与稍后再试
-                        if maximum_retry < 1:
-                            embed_append_description(self.embed, f"**错误：[{num}] {title} 获取失败** " + new_result.message + "，请稍后再试")
-                            await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
-
-                        # 如果重试
-                        else:
-                            retry_counter = 0
-                            while retry_counter < maximum_retry:
-                                retry_counter += 1
-
-                                embed_replace_description_last_line(self.embed, f"**错误：[{num}] {title} 获取失败** " + new_result.message + f"：第 {retry_counter} 次重试中")
-                                await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
-
-                                new_result = await result_check(await audio_lib_main.download_bilibili(self.info_dict, DownloadType.BILIBILI_COLLECTION, num_option=num - 1))
-                                new_audio = new_result.result
-
-                                # 如果音频加载成功
-                                if new_audio is not None:
-
-                                    # 如果当前播放列表为空
-                                    if current_playlist.is_empty() and not voice_client.is_playing():
-                                        await play_audio(self.ctx, new_audio, response=self.original_msg)
-
-                                    current_playlist.append_audio(new_audio)
-                                    await console.rp(f"音频 {new_audio.get_title()} [{new_audio.get_duration_str()}] 已加入播放列表", self.ctx.guild)
-
-                                    await current_guild.refresh_list_view()
-
-                                    embed_replace_description_last_line(self.embed, f"> [{num}] **{new_audio.get_title()}** [{new_audio.get_duration_str()}]")
-                                    await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
-                                    success_num += 1
-                                    break
-
-                            # 如果最终最终没有成功
-                            if new_audio is None:
-                                embed_replace_description_last_line(self.embed, f"**错误：[{num}] {title} 获取失败** " + new_result.message + "，请稍后再试")
-                                await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
-
-                    else:
-                        embed_append_description(self.embed, f"**错误：[{num}] {title} 获取失败** " + new_result.message)
-                        await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
+            async def download_function(num, priority) -> Result:
+                return await dl_scheduler.download_bilibili(self.info_dict, DownloadType.BILIBILI_COLLECTION, num_option=num - 1, priority=priority)
 
         elif resource_classifier.handler(self.download_type) is DownloadHandler.GO_MUSIC_API:
-            # 总时长显示
             counter = 1
-            valid_counter = 0
             for item in self.info_dict["songs"]:
                 if counter in final_result:
                     total_duration += item["duration"]
-                    valid_counter += 1
                 counter += 1
-            total_duration = utils.convert_duration_to_str(total_duration)
-            self.embed.set_footer(text=f"总时长 -> [{total_duration}]")
-            await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
 
-            # 循环添加
-            for num in final_result:
-                title = self.info_dict['songs'][num - 1]['name']
-
-                # 每个音频单独添加
-                new_result = await result_check(await audio_lib_main.download_go_music(self.info_dict["songs"][num - 1], self.download_type))
-                new_audio = new_result.result
-
-                if new_audio is not None:
-                    if current_playlist.is_empty() and not voice_client.is_playing():
-                        await play_audio(self.ctx, new_audio, response=self.original_msg)
-
-                    # 添加至服务器播放列表
-                    current_playlist.append_audio(new_audio)
-                    await console.rp(f"音频 {new_audio.get_title()} [{new_audio.get_duration_str()}] 已加入播放列表", self.ctx.guild)
-
-                    await current_guild.refresh_list_view()
-
-                    embed_append_description(self.embed, f"> [{num}] **{new_audio.get_title()}** [{new_audio.get_duration_str()}]")
-                    await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
-                    success_num += 1
-
-                else:
-                    if isinstance(new_result.exception, errors.StorageFull):
-                        embed_append_description(self.embed, f"**机器人当前处理音频过多，无法完成播放列表添加**")
-                        await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
-                        return
-                    elif new_result.retryable:
-                        # 如果不重试直接发送错误与稍后再试
-                        if maximum_retry < 1:
-                            embed_append_description(self.embed, f"**错误：[{num}] {title} 获取失败** " + new_result.message + "，请稍后再试")
-                            await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
-                        # 如果重试
-                        else:
-                            retry_counter = 0
-                            while retry_counter < maximum_retry:
-                                retry_counter += 1
-
-                                embed_replace_description_last_line(self.embed, f"**错误：[{num}] {title} 获取失败** " + new_result.message + f"：第 {retry_counter} 次重试中")
-                                await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
-
-                                new_result = await result_check(await audio_lib_main.download_go_music(self.info_dict["songs"][num - 1], self.download_type))
-                                new_audio = new_result.result
-
-                                # 如果音频加载成功
-                                if new_audio is not None:
-
-                                    # 如果当前播放列表为空
-                                    if current_playlist.is_empty() and not voice_client.is_playing():
-                                        await play_audio(self.ctx, new_audio, response=self.original_msg)
-
-                                    current_playlist.append_audio(new_audio)
-                                    await console.rp(f"音频 {new_audio.get_title()} [{new_audio.get_duration_str()}] 已加入播放列表", self.ctx.guild)
-
-                                    await current_guild.refresh_list_view()
-                                    embed_replace_description_last_line(self.embed, f"> [{num}] **{new_audio.get_title()}** [{new_audio.get_duration_str()}]")
-                                    await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
-                                    success_num += 1
-                                    break
-
-                            # 如果重试最终没有成功
-                            if new_audio is None:
-                                embed_replace_description_last_line(self.embed, f"**错误：[{num}] {title} 获取失败** " + new_result.message + "，请稍后再试")
-                                await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
-
-                    else:
-                        embed_append_description(self.embed, f"**错误：[{num}] {title} 获取失败** " + new_result.message)
-                        await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
+            item_list = [(num, self.info_dict["songs"][num - 1]["name"]) for num in final_result]
 
-        # 如果为YT-DLP类型播放列表（YouTube，网易云）
-        elif self.download_type is DownloadType.YOUTUBE_PLAYLIST or self.download_type is DownloadType.NETEASE_PLAYLIST:
-            if self.download_type is DownloadType.YOUTUBE_PLAYLIST:
-
-                # 总时长显示
-                # 仅限YouTube，yt-dlp下载的网易云播放列表不提供单曲时长信息
-                counter = 1
-                valid_counter = 0
-                for item in self.info_dict["entries"]:
-                    # item["duration"] is not None 检测如果列表中含有已被删除的视频
-                    if counter in final_result and item["duration"] is not None:
-                        total_duration += item["duration"]
-                        valid_counter += 1
-                    counter += 1
-                total_duration = utils.convert_duration_to_str(total_duration)
-                self.embed.set_footer(text=f"总时长 -> [{total_duration}]")
-                await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
+            async def download_function(num, priority) -> Result:
+                return await dl_scheduler.download_go_music(self.info_dict["songs"][num - 1], self.download_type, priority=priority)
 
-            else:
-                return
+            def placeholder_function(num) -> audio.PlaceholderAudio:
+                return go_music.get_placeholder_audio(self.info_dict["songs"][num - 1], self.download_type)
 
-            # 循环添加
-            for num in final_result:
-                title = self.info_dict['entries'][num - 1]['title']
+        # 如果为YT-DLP类型播放列表（YouTube）
+        # yt-dlp下载的网易云播放列表不提供单曲时长信息，暂不支持
+        elif self.download_type is DownloadType.YOUTUBE_PLAYLIST:
+            counter = 1
+            for item in self.info_dict["entries"]:
+                # item["duration"] is not None 检测如果列表中含有已被删除的视频
+                if counter in final_result and item["duration"] is not None:
+                    total_duration += item["duration"]
+                counter += 1
 
-                if self.download_type is DownloadType.YOUTUBE_PLAYLIST:
-                    # 跳过已被删除或失效的视频
-                    if self.info_dict['entries'][num - 1]['duration'] is None:
-                        continue
-                    url = f"https://www.youtube.com/watch?v={self.info_dict['entries'][num - 1]['id']}"
-                elif self.download_type is DownloadType.NETEASE_PLAYLIST:
-                    url = self.info_dict['entries'][num - 1]['url']
-                else:
-                    return
+            # 跳过已被删除或失效的视频
+            item_list = [
+                (num, self.info_dict["entries"][num - 1]["title"]) for num in final_result
+                if self.info_dict["entries"][num - 1]["duration"] is not None
+            ]
 
+            async def download_function(num, priority) -> Result:
+                url = f"https://www.youtube.com/watch?v={self.info_dict['entries'][num - 1]['id']}"
                 # 单独提取信息
-                current_info_result = await result_check(await ytdlp.get_info(url))
-                current_info_dict = current_info_result.result
-                if current_info_dict is None:
-                    warning_description = f"信息获取失败：{current_info_result.message}"
-                    if current_info_result.retryable:
-                        warning_description += "，请稍后再试"
-                    embed_append_description(self.embed, warning_description)
-                    await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
-                    continue
-
-                # 每个音频单独添加
-                new_result = await result_check(await audio_lib_main.download_ytdlp(url, current_info_dict, self.download_type))
-                new_audio = new_result.result
-
-                if new_audio is not None:
-                    if current_playlist.is_empty() and not voice_client.is_playing():
-                        await play_audio(self.ctx, new_audio, response=self.original_msg)
+                current_info_result = await ytdlp.get_info(url)
+                if current_info_result.result is None:
+                    return failed_result(exception=current_info_result.exception, message=f"信息获取失败：{current_info_result.message}", retryable=current_info_result.retryable)
+                return await dl_scheduler.download_ytdlp(url, current_info_result.result, self.download_type, priority=priority)
 
-                    # 添加至服务器播放列表
-                    current_playlist.append_audio(new_audio)
-                    await console.rp(f"音频 {new_audio.get_title()} [{new_audio.get_duration_str()}] 已加入播放列表", self.ctx.guild)
+            def placeholder_function(num) -> audio.PlaceholderAudio:
+                return ytdlp.get_placeholder_audio(self.info_dict["entries"][num - 1], self.download_type)
 
-                    await current_guild.refresh_list_view()
-
-                    embed_append_description(self.embed, f"> [{num}] **{new_audio.get_title()}** [{new_audio.get_duration_str()}]")
-                    await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
-                    success_num += 1
-
-                else:
-                    if isinstance(new_result.exception, errors.StorageFull):
-                        embed_append_description(self.embed, f"**机器人当前处理音频过多，无法完成播放列表添加**")
-                        await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
-                        return
-                    elif new_result.retryable:
-                        # 如果不重试直接发送错误与稍后再试
-                        if maximum_retry < 1:
-                            embed_append_description(self.embed, f"**错误：[{num}] {title} 获取失败** " + new_result.message + "，请稍后再试")
-                            await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
-                        # 如果重试
-                        else:
-                            retry_counter = 0
-                            while retry_counter < maximum_retry:
-                                retry_counter += 1
-
-                                embed_replace_description_last_line(self.embed, f"**错误：[{num}] {title} 获取失败** " + new_result.message + f"：第 {retry_counter} 次重试中")
-                                await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
-
-                                new_result = await result_check(await audio_lib_main.download_ytdlp(url, current_info_dict, self.download_type))
-                                new_audio = new_result.result
-
-                                # 如果音频加载成功
-                                if new_audio is not None:
-
-                                    # 如果当前播放列表为空
-                                    if current_playlist.is_empty() and not voice_client.is_playing():
-                                        await play_audio(self.ctx, new_audio, response=self.original_msg)
-
-                                    current_playlist.append_audio(new_audio)
-                                    await console.rp(f"音频 {new_audio.get_title()} [{new_audio.get_duration_str()}] 已加入播放列表", self.ctx.guild)
-
-                                    await current_guild.refresh_list_view()
-                                    embed_replace_description_last_line(self.embed, f"> [{num}] **{new_audio.get_title()}** [{new_audio.get_duration_str()}]")
-                                    await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
-                                    success_num += 1
-                                    break
-
-                            # 如果重试最终没有成功
-                            if new_audio is None:
-                                embed_replace_description_last_line(self.embed, f"**错误：[{num}] {title} 获取失败** " + new_result.message + "，请稍后再试")
-                                await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
-
-                    else:
-                        embed_append_description(self.embed, f"**错误：[{num}] {title} 获取失败** " + new_result.message)
-                        await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
+        elif self.download_type is DownloadType.NETEASE_PLAYLIST:
+            return
 
         else:
             await console.rp("未知的播放源", self.ctx.guild)
+            item_list = []
+            download_function = None
+
+        if download_function is not None:
+            self.embed.set_footer(text=f"总时长 -> [{utils.convert_duration_to_str(total_duration)}]")
+            eos_later(self.ctx, self.original_msg, embed=self.embed, view=self, icon_filename=self.icon_filename)
+            if placeholder_function is not None and len(item_list) > LAZY_ENQUEUE_THRESHOLD:
+                success_num = await self.lazy_enqueue(item_list, placeholder_function)
+            else:
+                success_num = await self.bulk_enqueue(item_list, download_function, maximum_retry)
 
         # 去掉最开始的 已选择和正在加入 的两行
         if self.embed.description:
@@ -3463,13 +3402,155 @@ class EpisodeSelectMenu(View):
             self.embed.set_author(name=f"{self.list_type}：添加失败", icon_url=icon.url(self.icon_filename))
             self.embed.add_field(name="", value="添加失败", inline=False)
             self.embed.timestamp = utils.ctime_datetime()
-            await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
+            eos_later(self.ctx, self.original_msg, embed=self.embed, view=self, icon_filename=self.icon_filename)
         else:
             self.icon_filename = icon_finish_filename
             self.embed.set_author(name=f"{self.list_type}：添加完成", icon_url=icon.url(self.icon_filename))
             self.embed.add_field(name="", value=f"添加完成：已将 {success_num} 个音频加入播放列表", inline=False)
             self.embed.timestamp = utils.ctime_datetime()
-            await eos(self.ctx, self.original_msg, content=None, embed=self.embed, view=self, files=icon_lib.files(self.icon_filename))
+            eos_later(self.ctx, self.original_msg, embed=self.embed, view=self, icon_filename=self.icon_filename)
+
+    async def lazy_enqueue(self, item_list: List[Tuple[int, str]], placeholder_function: Callable[[int], audio.PlaceholderAudio]) -> int:
+        """
+        将选择的音频全部以占位条目立即加入播放列表，由播放列表预取在即将播放时获取
+        如果没有正在播放的音频则立即获取并播放第一个音频
+
+        :param item_list: 按选择顺序排列的 (序号, 标题)
+        :param placeholder_function: 通过序号生成占位条目的函数
+        :return: 成功加入播放列表的音频数量
+        """
+        voice_client = self.ctx.guild.voice_client
+        current_guild = guild_lib.get_guild(self.ctx)
+        current_playlist = current_guild.get_playlist()
+
+        idle = current_playlist.is_empty() and not voice_client.is_playing()
+        added_num = current_playlist.extend_audio([placeholder_function(num) for num, title in item_list])
+        await console.rp(f"{added_num} 个音频已以占位条目加入播放列表", self.ctx.guild)
+
+        # 数量较多，不逐条显示
+        embed_append_description(self.embed, f"> 已将 {added_num} 个音频加入播放列表，将在即将播放时获取")
+        if added_num < len(item_list):
+            embed_append_description(self.embed, f"**播放列表已满，{len(item_list) - added_num} 个音频未能加入**")
+        eos_later(self.ctx, self.original_msg, embed=self.embed, view=self, icon_filename=self.icon_filename)
+
+        if idle and added_num > 0:
+            if await ensure_head_playable(self.ctx):
+                await play_audio(self.ctx, current_playlist.get_audio(0), response=self.original_msg)
+        else:
+            prefetcher.schedule(current_playlist)
+
+        await current_guild.refresh_list_view()
+        return added_num
+
+    async def bulk_enqueue(self, item_list: List[Tuple[int, str]], download_function: Callable[[int, DownloadPriority], Awaitable[Result]],
+                           maximum_retry: int = 4) -> int:
+        """
+        同时获取最多BULK_ENQUEUE_CONCURRENCY个音频，并按用户选择的顺序加入播放列表
+        每当排在最前面的未加入音频完成时，将其与之后已连续完成的音频一起加入播放列表，菜单、播放列表显示和服务器数据每批只更新一次
+        第一个音频完成时如果没有正在播放的音频则立即开始播放
+        每个音频获取完成后立即被锁定，直到加入播放列表（由播放列表锁定）或被放弃后解锁，防止等待期间被音频库清理
+
+        :param item_list: 按选择顺序排列的 (序号, 标题)
+        :param download_function: 通过序号与下载优先级获取音频的函数
+        :param maximum_retry: 可重试的失败的最大重试次数
+        :return: 成功加入播放列表的音频数量
+        """
+        voice_client = self.ctx.guild.voice_client
+        current_guild = guild_lib.get_guild(self.ctx)
+        current_playlist = current_guild.get_playlist()
+        semaphore = asyncio.Semaphore(BULK_ENQUEUE_CONCURRENCY)
+        bulk_key = f"{self.ctx.guild.id}_BULK_{id(self)}"
+
+        async def fetch(position: int, num: int) -> Result:
+            async with semaphore:
+                # 只有第一个音频可能需要立即播放，其余音频均为批量添加
+                if position == 0:
+                    priority = download_priority(voice_client, current_playlist, bulk=True)
+                else:
+                    priority = DownloadPriority.BULK
+
+                new_result = await result_check(await download_function(num, priority))
+                retry_counter = 0
+                while new_result.result is None and new_result.retryable and retry_counter < maximum_retry and \
+                        not isinstance(new_result.exception, errors.StorageFull):
+                    retry_counter += 1
+                    await console.rp(f"[{num}] 获取失败：{new_result.message}，第 {retry_counter} 次重试中", self.ctx.guild)
+                    new_result = await result_check(await download_function(num, priority))
+                if new_result.result is not None:
+                    audio_lib_main.lock_audio(bulk_key, new_result.result)
+                return new_result
+
+        task_list = [asyncio.create_task(fetch(position, num)) for position, (num, title) in enumerate(item_list)]
+        success_num = 0
+        index = 0
+        try:
+            while index < len(task_list):
+                await asyncio.wait([task_list[index]])
+                batch_end = index + 1
+                while batch_end < len(task_list) and task_list[batch_end].done():
+                    batch_end += 1
+
+                new_audio_list = []
+                storage_full = False
+                dropped_list = []
+                position = index
+                while position < batch_end:
+                    num, title = item_list[position]
+                    task = task_list[position]
+                    position += 1
+                    # 空间不足后不再等待未完成的音频，已获取完成的音频仍按顺序加入
+                    if not task.done():
+                        task.cancel()
+                        dropped_list.append(f"[{num}] {title}")
+                        continue
+                    new_result = task.result()
+                    new_audio = new_result.result
+                    if new_audio is not None:
+                        new_audio_list.append(new_audio)
+                        embed_append_description(self.embed, f"> [{num}] **{new_audio.get_title()}** [{new_audio.get_duration_str()}]")
+                    elif isinstance(new_result.exception, errors.StorageFull):
+                        if not storage_full:
+                            embed_append_description(self.embed, f"**机器人当前处理音频过多，无法完成播放列表添加**")
+                            storage_full = True
+                            batch_end = len(task_list)
+                        dropped_list.append(f"[{num}] {title}")
+                    elif new_result.retryable:
+                        embed_append_description(self.embed, f"**错误：[{num}] {title} 获取失败** " + new_result.message + "，请稍后再试")
+                    else:
+                        embed_append_description(self.embed, f"**错误：[{num}] {title} 获取失败** " + new_result.message)
+
+                if len(dropped_list) > 0:
+                    embed_append_description(self.embed, f"**以下音频未加入播放列表：** " + "，".join(dropped_list))
+
+                if len(new_audio_list) > 0:
+                    # 如果当前播放列表为空
+                    if current_playlist.is_empty() and not voice_client.is_playing():
+                        await play_audio(self.ctx, new_audio_list[0], response=self.original_msg)
+
+                    added_num = current_playlist.extend_audio(new_audio_list)
+                    success_num += added_num
+                    await console.rp(f"{added_num} 个音频已加入播放列表", self.ctx.guild)
+                    await current_guild.refresh_list_view()
+
+                # 本批音频已由播放列表锁定（或未能加入），解除批量添加的锁定
+                audio_lib_main.unlock_audio_list(bulk_key, new_audio_list)
+
+                eos_later(self.ctx, self.original_msg, embed=self.embed, view=self, icon_filename=self.icon_filename)
+                index = batch_end
+                if storage_full:
+                    break
+        finally:
+            for task in task_list:
+                if not task.done():
+                    task.cancel()
+            # 解锁已获取完成但没有被处理的音频
+            remaining_list = []
+            for task in task_list[index:]:
+                if task.done() and not task.cancelled() and task.exception() is None and task.result().result is not None:
+                    remaining_list.append(task.result().result)
+            audio_lib_main.unlock_audio_list(bulk_key, remaining_list)
+
+        return success_num
 
     async def on_timeout(self):
         self.clear_items()
@@ -3595,11 +3676,7 @@ class SearchedAudioSelectionMenu(View):
         self.resource_list = resource_list
         self.original_msg = None
 
-        for i in range(10, len(self.resource_list), -1):
-            for item in self.children:
-                if isinstance(item, discord.ui.Button) and item.custom_id == f"button_{i}":
-                    item.disabled = True
-                    break
+        self.update_buttons()
 
         self.icon_filename = "zoom_in_reveal_animated_0ms_100px.gif"
         self.embed = discord.Embed(
@@ -3619,6 +3696,26 @@ class SearchedAudioSelectionMenu(View):
         original_msg = await eos(self.ctx, response, content=None, silent=silent, embed=self.embed, view=self, files=files)
         await self.set_original_msg(original_msg)
 
+    def update_buttons(self):
+        """
+        只启用有对应结果的序号按钮
+        """
+        for item in self.children:
+            if isinstance(item, discord.ui.Button) and item.custom_id is not None and item.custom_id.startswith("button_") \
+                    and item.custom_id[len("button_"):].isdigit():
+                item.disabled = int(item.custom_id[len("button_"):]) > len(self.resource_list)
+
+    async def update_result(self, title_str: str, address_str: str, resource_list: List[dict]):
+        """
+        有平台的搜索完成时更新菜单中的结果，已有结果的序号保持不变
+        """
+        self.title_str = title_str
+        self.address_str = address_str
+        self.resource_list = resource_list
+        self.update_buttons()
+        self.embed.description = self.address_str if self.show_address else self.title_str
+        eos_later(self.ctx, self.original_msg, embed=self.embed, view=self, icon_filename=self.icon_filename)
+
     async def play(self, index: int, msg):
         selected_item = self.resource_list[index]
         link = selected_item["id"]
@@ -0,0 +1,286 @@
+from typing import *
+from enum import Enum
+import asyncio
+import heapq
+import itertools
+import time
+
+from utils import Result, failed_result
+
+from zeta_bot import (
+    output_console,
+    audio,
+    bilibili,
+    ytdlp,
+    go_music,
+    file_management,
+    negative_cache,
+    metadata_cache,
+)
+from zeta_bot.resource import DownloadHandler, DownloadType, ResourceClassifier
+
+# 控制台
+console = output_console.Console()
+
+# 资源分类器
+resource_classifier = ResourceClassifier()
+
+# 各下载器同时进行的下载数量上限
+HANDLER_CONCURRENCY = {
+    DownloadHandler.BILIBILI_API_PYTHON: 3,
+    DownloadHandler.YT_DLP: 2,
+    DownloadHandler.GO_MUSIC_API: 2,
+}
+
+# 各下载器的请求速率限制 (每秒请求数, 突发上限)，不在其中的下载器不限速
+HANDLER_RATE_LIMIT = {
+    DownloadHandler.BILIBILI_API_PYTHON: (2.0, 4),
+    DownloadHandler.GO_MUSIC_API: (2.0, 4),
+}
+
+
+class DownloadPriority(Enum):
+    """
+    下载优先级，值越小越优先
+    """
+    NOW_PLAYING = 0
+    NEXT_UP = 1
+    BULK = 2
+    PREFETCH = 3
+
+    @property
+    def label(self) -> str:
+        return {
+            DownloadPriority.NOW_PLAYING: "即将播放",
+            DownloadPriority.NEXT_UP: "加入列表",
+            DownloadPriority.BULK: "批量添加",
+            DownloadPriority.PREFETCH: "预下载",
+        }[self]
+
+
+class TokenBucket:
+    """
+    令牌桶限速器：以<rate>每秒的速度生成令牌，最多积累<capacity>个
+    """
+    def __init__(self, rate: float, capacity: int):
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = float(capacity)
+        self._last_update = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """
+        获取一个令牌，没有令牌时等待
+        """
+        async with self._lock:
+            while True:
+                current_time = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (current_time - self._last_update) * self._rate)
+                self._last_update = current_time
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+
+
+class PrioritySlots:
+    """
+    带优先级的并发槽位：同时最多<capacity>个持有者，空出槽位时优先分配给优先级最高（同优先级先到先得）的等待者
+    """
+    def __init__(self, capacity: int):
+        self._capacity = capacity
+        self._active = 0
+        self._waiting: List[Tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+
+    async def acquire(self, priority: DownloadPriority) -> None:
+        if self._active < self._capacity and self.waiting_num() == 0:
+            self._active += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (priority.value, next(self._counter), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # 如果取消时已经分配到了槽位，将其交给下一个等待者
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        self._active -= 1
+        while len(self._waiting) > 0:
+            future = heapq.heappop(self._waiting)[2]
+            if not future.done():
+                self._active += 1
+                future.set_result(None)
+                return
+
+    def waiting_num(self, priority: Optional[DownloadPriority] = None) -> int:
+        if priority is None:
+            return len([item for item in self._waiting if not item[2].done()])
+        return len([item for item in self._waiting if item[0] == priority.value and not item[2].done()])
+
+    def active_num(self) -> int:
+        return self._active
+
+
+class DownloadScheduler:
+    """
+    下载调度器，位于AudioFileLibrary的三个下载入口之前：
+    按优先级（即将播放 > 加入列表 > 批量添加 > 预下载）分配各下载器的并发槽位，并对哔哩哔哩和go-music-api的请求进行令牌桶限速
+    """
+    def __init__(self, audio_library: "file_management.AudioFileLibrary", name: str = "下载调度器"):
+        self._audio_library = audio_library
+        self._name = name
+        self._slots = {handler: PrioritySlots(capacity) for handler, capacity in HANDLER_CONCURRENCY.items()}
+        self._buckets = {handler: TokenBucket(rate, capacity) for handler, (rate, capacity) in HANDLER_RATE_LIMIT.items()}
+
+        # 统计数据
+        self._max_waiting = {handler: 0 for handler in HANDLER_CONCURRENCY}
+        self._finished_num = {handler: 0 for handler in HANDLER_CONCURRENCY}
+        self._total_wait_time = {handler: 0.0 for handler in HANDLER_CONCURRENCY}
+
+    async def _schedule(self, handler: DownloadHandler, uid: str, priority: DownloadPriority,
+                        download_function: Callable[[], Awaitable[Result]]) -> Result:
+        """
+        获取<handler>的槽位与令牌后调用<download_function>
+        如果同一音频已经在下载中则直接加入等待，不再占用槽位；近期因资源失效或受限而失败的音频直接返回记录的失败原因
+        """
+        failed = negative_cache.NegativeCache().lookup(uid)
+        if failed is not None:
+            await console.rp(f"{uid}近期下载失败，直接返回记录的原因：{failed.message}", f"[{self._name}]")
+            return failed
+
+        if self._audio_library.downloading(uid):
+            return await download_function()
+
+        slots = self._slots[handler]
+        start_time = time.monotonic()
+        if slots.active_num() >= HANDLER_CONCURRENCY[handler]:
+            self._max_waiting[handler] = max(self._max_waiting[handler], slots.waiting_num() + 1)
+            await console.rp(
+                f"{handler.value}下载繁忙，{uid}进入等待队列（{priority.label}），当前等待数量：{slots.waiting_num() + 1}",
+                f"[{self._name}]"
+            )
+
+        await slots.acquire(priority)
+        try:
+            self._total_wait_time[handler] += time.monotonic() - start_time
+            bucket = self._buckets.get(handler)
+            if bucket is not None:
+                await bucket.acquire()
+            result = await download_function()
+            negative_cache.NegativeCache().record(uid, result)
+            return result
+        finally:
+            slots.release()
+            self._finished_num[handler] += 1
+
+    async def download_bilibili(self, info_dict, download_type: DownloadType, num_option: int = 0,
+                                priority: DownloadPriority = DownloadPriority.NEXT_UP, stream=None) -> Result:
+        if download_type is DownloadType.BILIBILI_COLLECTION:
+            bvid = info_dict["ugc_season"]["sections"][0]["episodes"][num_option]["bvid"]
+            uid = bilibili.construct_uid(bvid=bvid, download_type=download_type, num_p=0)
+        else:
+            uid = bilibili.construct_uid(bvid=info_dict["bvid"], download_type=download_type, num_p=num_option)
+        return await self._schedule(
+            DownloadHandler.BILIBILI_API_PYTHON, uid, priority,
+            lambda: self._audio_library.download_bilibili(info_dict, download_type, num_option, stream=stream)
+        )
+
+    async def download_ytdlp(self, url, info_dict, download_type: DownloadType,
+                             priority: DownloadPriority = DownloadPriority.NEXT_UP) -> Result:
+        uid = ytdlp.construct_uid(video_id=info_dict["id"], download_type=download_type)
+        return await self._schedule(
+            DownloadHandler.YT_DLP, uid, priority,
+            lambda: self._audio_library.download_ytdlp(url, info_dict, download_type)
+        )
+
+    async def download_go_music(self, info_dict: dict, download_type: DownloadType,
+                                priority: DownloadPriority = DownloadPriority.NEXT_UP) -> Result:
+        uid = go_music.construct_uid(source=info_dict["source"], song_id=info_dict["id"])
+        return await self._schedule(
+            DownloadHandler.GO_MUSIC_API, uid, priority,
+            lambda: self._audio_library.download_go_music(info_dict, download_type)
+        )
+
+    async def refetch(self, target_audio: audio.Audio, priority: DownloadPriority = DownloadPriority.PREFETCH) -> Result:
+        """
+        根据<target_audio>记录的来源重新获取信息并下载该音频，用于修复文件丢失或损坏的音频
+        音频库会在下载前检查已有文件，文件完好时直接复用
+        下载失败时删除该音频的缓存信息（缓存的信息可能已过时，例如其中的音频链接已失效），下次重新获取时使用新的信息
+
+        :param target_audio: 需要重新获取的音频
+        :param priority: 下载优先级
+        :return: 包含新音频的Result
+        """
+        download_type = target_audio.get_download_type()
+        handler = resource_classifier.handler(download_type)
+        source_id = target_audio.get_source_id()
+
+        if handler is DownloadHandler.BILIBILI_API_PYTHON:
+            info_result = await bilibili.get_info(source_id)
+            if info_result.result is None:
+                return failed_result(exception=info_result.exception, message=info_result.message, retryable=info_result.retryable)
+            num_p = 0
+            if download_type is DownloadType.BILIBILI_P:
+                num_p = int(target_audio.get_uid().rsplit("_p", 1)[-1]) - 1
+            elif download_type is DownloadType.BILIBILI_COLLECTION:
+                # 合集中的视频是独立的，按单一视频重新获取（uid相同）
+                download_type = DownloadType.BILIBILI_SINGLE
+            result = await self.download_bilibili(info_result.result, download_type, num_p, priority=priority)
+            if result.result is None:
+                metadata_cache.invalidate(bilibili.cache_key(source_id))
+            return result
+
+        elif handler is DownloadHandler.YT_DLP:
+            if target_audio.get_source() != "youtube":
+                return failed_result(exception=None, message="该来源的音频不支持重新获取", retryable=False)
+            url = f"https://www.youtube.com/watch?v={source_id}"
+            info_result = await ytdlp.get_info(url)
+            if info_result.result is None:
+                return failed_result(exception=info_result.exception, message=info_result.message, retryable=info_result.retryable)
+            result = await self.download_ytdlp(url, info_result.result, download_type, priority=priority)
+            if result.result is None:
+                metadata_cache.invalidate(ytdlp.cache_key(url)[0])
+            return result
+
+        elif handler is DownloadHandler.GO_MUSIC_API:
+            # 使用音频中保存的歌曲字段（包括extra），旧版本保存的音频没有这些信息，无法重新获取
+            source_info = target_audio.get_source_info()
+            if source_info is None:
+                return failed_result(exception=None, message="音频缺少来源信息，无法重新获取，请重新添加", retryable=False)
+            return await self.download_go_music(dict(source_info), download_type, priority=priority)
+
+        else:
+            return failed_result(exception=None, message="未知下载器", retryable=False)
+
+    def get_metrics(self) -> Dict[str, dict]:
+        """
+        返回各下载器的队列统计：正在下载数量，各优先级等待数量，历史最大等待数量，已完成数量以及平均等待时间（秒）
+        """
+        metrics = {}
+        for handler, slots in self._slots.items():
+            finished_num = self._finished_num[handler]
+            metrics[handler.name] = {
+                "active": slots.active_num(),
+                "waiting": {priority.name: slots.waiting_num(priority) for priority in DownloadPriority},
+                "max_waiting": self._max_waiting[handler],
+                "finished": finished_num,
+                "average_wait": round(self._total_wait_time[handler] / finished_num, 3) if finished_num > 0 else 0.0,
+            }
+        return metrics
+
+    def print_info(self):
+        message = f"{self._name} 当前状态：\n"
+        for handler_name, item in self.get_metrics().items():
+            waiting_str = "，".join(f"{DownloadPriority[key].label} {value}" for key, value in item["waiting"].items())
+            message += (
+                f"{handler_name}：下载中 {item['active']} / {HANDLER_CONCURRENCY[DownloadHandler[handler_name]]}，"
+                f"等待中（{waiting_str}），"
+                f"最大等待数量 {item['max_waiting']}，已完成 {item['finished']}，平均等待 {item['average_wait']} 秒\n"
+            )
+        print(message)
@@ -0,0 +1,113 @@
+from typing import *
+
+
+class EvictionPolicy:
+    """
+    音频库淘汰策略的基类，决定空间不足时删除文件的先后顺序
+    策略只记录每个音频（以uid区分）的使用情况，实际的锁定检查和删除由AudioFileLibrary完成
+    """
+    name = ""
+    label = ""
+
+    def on_access(self, key: str, size: int) -> None:
+        """
+        音频被添加或被复用时调用
+
+        :param key: 音频的uid
+        :param size: 音频文件的大小（字节）
+        """
+        pass
+
+    def on_remove(self, key: str) -> None:
+        """
+        音频被移出库时调用
+        """
+        pass
+
+    def order(self, lru_keys: List[str]) -> List[str]:
+        """
+        返回淘汰顺序，排在前面的最先被淘汰
+
+        :param lru_keys: 库中所有音频的uid，按从最久未使用到最近使用的顺序排列
+        """
+        return lru_keys
+
+    def on_evict(self, keys: List[str]) -> None:
+        """
+        一批音频被淘汰后调用
+        """
+        for key in keys:
+            self.on_remove(key)
+
+
+class LRUPolicy(EvictionPolicy):
+    """
+    最近最少使用：从最久没有使用的音频开始删除
+    """
+    name = "lru"
+    label = "最近最少使用（LRU）"
+
+
+class LFUPolicy(EvictionPolicy):
+    """
+    最不经常使用：从使用次数最少的音频开始删除，次数相同时先删除最久没有使用的音频
+    """
+    name = "lfu"
+    label = "最不经常使用（LFU）"
+
+    def __init__(self):
+        self._frequency: Dict[str, int] = {}
+
+    def on_access(self, key: str, size: int) -> None:
+        self._frequency[key] = self._frequency.get(key, 0) + 1
+
+    def on_remove(self, key: str) -> None:
+        self._frequency.pop(key, None)
+
+    def order(self, lru_keys: List[str]) -> List[str]:
+        # sorted为稳定排序，次数相同时保持LRU顺序
+        return sorted(lru_keys, key=lambda key: self._frequency.get(key, 0))
+
+
+class GDSFPolicy(EvictionPolicy):
+    """
+    Greedy-Dual-Size-Frequency：优先级 = 膨胀值 + 使用次数 / 文件大小，优先删除优先级最低的音频
+    体积大且很少使用的音频会被优先删除，膨胀值随淘汰上升，使长期未使用的高频音频也会逐渐老化
+    """
+    name = "gdsf"
+    label = "大小与频率感知（GDSF）"
+
+    def __init__(self):
+        self._inflation = 0.0
+        self._frequency: Dict[str, int] = {}
+        self._priority: Dict[str, float] = {}
+
+    def on_access(self, key: str, size: int) -> None:
+        self._frequency[key] = self._frequency.get(key, 0) + 1
+        self._priority[key] = self._inflation + self._frequency[key] / max(size, 1)
+
+    def on_remove(self, key: str) -> None:
+        self._frequency.pop(key, None)
+        self._priority.pop(key, None)
+
+    def order(self, lru_keys: List[str]) -> List[str]:
+        return sorted(lru_keys, key=lambda key: self._priority.get(key, self._inflation))
+
+    def on_evict(self, keys: List[str]) -> None:
+        for key in keys:
+            self._inflation = max(self._inflation, self._priority.get(key, self._inflation))
+        super().on_evict(keys)
+
+
+EVICTION_POLICIES: Dict[str, Type[EvictionPolicy]] = {
+    LRUPolicy.name: LRUPolicy,
+    LFUPolicy.name: LFUPolicy,
+    GDSFPolicy.name: GDSFPolicy,
+}
+
+
+def get_policy(name: str) -> EvictionPolicy:
+    """
+    通过名称生成淘汰策略，未知名称返回LRU
+    """
+    return EVICTION_POLICIES.get(str(name).lower(), LRUPolicy)()
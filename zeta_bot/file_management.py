@@ -1,5 +1,9 @@
 from typing import *
 import os
+import time
+import asyncio
+import collections
+import msgspec
 
 import errors
 import utils
@@ -12,6 +16,8 @@ from zeta_bot import (
     bilibili,
     ytdlp,
     go_music,
+    schema,
+    eviction,
 )
 from zeta_bot.resource import MediaPlatform, LinkType, DownloadHandler, DownloadType, ResourceClassifier
 
@@ -22,11 +28,102 @@ console = output_console.Console()
 resource_classifier = ResourceClassifier()
 
 
+# 音频库操作日志中的记录数量达到此值时，将日志合并进快照文件
+JOURNAL_COMPACT_THRESHOLD = 2000
+
+# 下载中的临时文件后缀（见bilibili.audio_download），程序中断时留下的临时文件在初始化时删除
+PARTIAL_FILE_SUFFIX = ".part"
+
+# 单个文件超过音频库容量的该比例时不再缓存，改为直接串流播放，防止一次性淘汰大量常用音频
+STREAM_ONLY_RATIO = 0.25
+
+
+class LibraryJournal:
+    """
+    音频库索引的追加式操作日志，每行一条json记录：
+    {"op": "add", "key": ..., "item": ...} 添加或替换一条索引，并将其移至最近使用
+    {"op": "touch", "key": ...} 将一条索引移至最近使用
+    {"op": "remove", "key": ...} 移除一条索引
+    合并进快照时，当前日志先被转移到<path>.compacting，之后的记录写入新的日志，快照写入完成后再删除被转移的日志
+    """
+    def __init__(self, path: str):
+        self._path = path
+        self._compacting_path = f"{path}.compacting"
+        self._record_num = 0
+
+    def __len__(self):
+        return self._record_num
+
+    def append(self, record: dict) -> None:
+        """
+        向日志末尾追加一条记录
+        """
+        with open(self._path, "a", encoding="utf-8") as file:
+            file.write(utils.json_dumps(record, indent=None) + "\n")
+        self._record_num += 1
+
+    def replay(self, node_list: List[schema.LibraryNodeRecord]) -> List[schema.LibraryNodeRecord]:
+        """
+        将日志中的记录按顺序应用到快照<node_list>上并返回结果
+        因写入中断而不完整的记录会被忽略
+        """
+        self._record_num = 0
+        path_list = [path for path in (self._compacting_path, self._path) if os.path.exists(path)]
+        if len(path_list) == 0:
+            return node_list
+
+        # 合并中断时被转移的日志可能已在快照中，记录均为幂等操作，重复应用结果不变
+        node_dict = {node_item.key: node_item for node_item in node_list}
+        for path in path_list:
+            with open(path, "rb") as file:
+                for line in file:
+                    try:
+                        record = schema.journal_record_decoder.decode(line)
+                    except msgspec.DecodeError:
+                        continue
+
+                    if record.op == "add" and record.item is not None:
+                        node_dict.pop(record.key, None)
+                        node_dict[record.key] = schema.LibraryNodeRecord(item=record.item, key=record.key)
+                    elif record.op == "touch":
+                        if record.key in node_dict:
+                            node_dict[record.key] = node_dict.pop(record.key)
+                    elif record.op == "remove":
+                        node_dict.pop(record.key, None)
+                    self._record_num += 1
+
+        return list(node_dict.values())
+
+    def rotate(self) -> None:
+        """
+        将当前日志转移到.compacting文件，之后的记录写入新的日志，应在生成快照的同时调用
+        上一次合并未完成时，当前日志被追加到已存在的.compacting文件末尾
+        """
+        if os.path.exists(self._path):
+            if os.path.exists(self._compacting_path):
+                with open(self._path, "rb") as source, open(self._compacting_path, "ab") as target:
+                    target.write(source.read())
+                os.remove(self._path)
+            else:
+                os.replace(self._path, self._compacting_path)
+        self._record_num = 0
+
+    def discard_rotated(self) -> None:
+        """
+        删除被转移的日志，应在包含其内容的快照写入完成后调用
+        """
+        if os.path.exists(self._compacting_path):
+            os.remove(self._compacting_path)
+
+
 class AudioFileLibrary:
-    def __init__(self, root: str, path: str, name: str = "音频文件管理模块", storage_capacity: int = 2097152):
+    def __init__(self, root: str, path: str, name: str = "音频文件管理模块", storage_capacity: int = 2097152, storage=None,
+                 eviction_policy: str = "lru"):
         """
         使用前必须进行初始化（调用initialize）
         _storage_size单位为字节（byte）
+        <storage>为可选的存储后端（storage.SQLiteStorage），为None时使用<path>的json文件存储库索引
+        <eviction_policy>为空间不足时的淘汰策略名称（lru，lfu或gdsf）
         """
         self._initialized = False
         self._root = root
@@ -35,9 +132,22 @@ class AudioFileLibrary:
         self._storage_capacity = storage_capacity
         self._name = name
         self._go_music_api_url = None
+        self._storage = storage
+        self._journal = LibraryJournal(f"{os.path.splitext(self._path)[0]}.journal")
+        self._startup_time: Optional[float] = None
+        self._eviction_policy = eviction.get_policy(eviction_policy)
+        # 保证同一时间只有一次完整的库索引写入
+        self._save_lock = asyncio.Lock()
+        # 库中每个音频文件的大小 {uid: 字节}
+        self._file_sizes: Dict[str, int] = {}
+        # 正在下载中的音频 {uid: 下载结果的Future}，同一音频同时只会下载一次
+        self._in_flight: Dict[str, asyncio.Future] = {}
 
     async def initialize(self) -> None:
-        if os.path.exists(self._path):
+        start_time = time.perf_counter()
+        if self._storage is not None:
+            await self._load()
+        elif os.path.exists(self._path):
             try:
                 await self._load()
             except errors.JSONFileError:
@@ -50,7 +160,10 @@ class AudioFileLibrary:
             await self._reset_library()
             await self._load()
         self._initialized = True
-        await console.rp(f"{self._name}初始化完成", f"[{self._name}]")
+        self._startup_time = time.perf_counter() - start_time
+        await console.rp(
+            f"{self._name}初始化完成，共{len(self._dl_list)}个音频，用时{self._startup_time:.3f}秒", f"[{self._name}]"
+        )
 
     # DEBUG ONLY
     def print_info(self):
@@ -78,52 +191,175 @@ class AudioFileLibrary:
         return item in self._dl_list
 
     async def save(self) -> None:
-        utils.json_save(self._path, self)
+        """
+        保存完整的库索引，使用json文件时同时将操作日志合并进快照
+        快照在事件循环中生成，写入在工作线程中进行，写入期间的新变动记录在新的操作日志中
+        """
+        loop = asyncio.get_running_loop()
+        async with self._save_lock:
+            if self._storage is not None:
+                await loop.run_in_executor(None, self._storage.save_library, self._dl_list.encode())
+            else:
+                content = utils.json_dumps(self, indent=None)
+                self._journal.rotate()
+                await loop.run_in_executor(None, utils.atomic_write, self._path, content)
+                self._journal.discard_rotated()
 
-    async def _load(self) -> None:
-        self._used_storage_size = 0
-        loaded_list = utils.json_load(self._path)
-        temp_list = []
+    async def _journal_append(self, record: dict) -> None:
+        """
+        向操作日志追加一条记录，记录数量达到上限时合并进快照
+        """
+        self._journal.append(record)
+        if len(self._journal) >= JOURNAL_COMPACT_THRESHOLD:
+            await self.save()
+
+    async def _save_touch(self, target_audio: audio.Audio, new_entry: bool = True) -> None:
+        """
+        保存一个音频被添加或被使用的变动，只写入这一条记录
+
+        :param target_audio: 被添加或被使用的音频
+        :param new_entry: 是否为新添加的音频，为False时只记录其被移至最近使用
+        """
+        if self._storage is not None:
+            self._storage.touch_library_entry(target_audio.get_uid(), target_audio)
+        elif new_entry:
+            await self._journal_append({"op": "add", "key": target_audio.get_uid(), "item": target_audio})
+        else:
+            await self._journal_append({"op": "touch", "key": target_audio.get_uid()})
 
-        for node_dict in loaded_list:
-            audio_dict = node_dict["item"]
+    async def _save_remove(self, key: str) -> None:
+        """
+        保存一个音频被移出库的变动，只写入这一条记录
+        """
+        if self._storage is not None:
+            self._storage.remove_library_entry(key)
+        else:
+            await self._journal_append({"op": "remove", "key": key})
+
+    def _scan_root(self, remove_partial: bool = False) -> Tuple[Dict[str, int], int]:
+        """
+        扫描一次音频库目录，下载中的临时文件不计入结果
+
+        :param remove_partial: 是否删除下载中的临时文件（没有正在进行的下载时，临时文件均为中断的下载留下的）
+        :return: ({规范化路径: 文件大小}, 被删除的临时文件数量)
+        """
+        size_map = {}
+        removed_num = 0
+        with os.scandir(self._root) as iterator:
+            for entry in iterator:
+                try:
+                    if not entry.is_file():
+                        continue
+                    if entry.name.endswith(PARTIAL_FILE_SUFFIX):
+                        if remove_partial:
+                            os.remove(entry.path)
+                            removed_num += 1
+                        continue
+                    size_map[os.path.normpath(entry.path)] = entry.stat().st_size
+                except OSError:
+                    continue
+        return size_map, removed_num
+
+    def _read_library(self, remove_partial: bool = False) -> Tuple[list, list, int, int, int]:
+        """
+        读取库索引并与目录扫描结果比对，在工作线程中运行
+
+        :param remove_partial: 是否删除中断的下载留下的临时文件
+        :return: (由{"item": Audio, "key": uid}组成的存在的音频列表, 文件丢失的AudioRecord列表, 读取到的记录数量,
+                  不符合格式而被跳过的记录数量, 被删除的临时文件数量)
+        """
+        skipped_num = 0
+        if self._storage is not None:
+            loaded_list, skipped_num = self._storage.load_library()
+        else:
             try:
-                file_size = os.path.getsize(node_dict["item"]["path"])
-            except FileNotFoundError:
-                await console.rp(
-                    f"库中记录的音频文件丢失：\n"
-                    f"标题：{audio_dict['title']}\n"
-                    f"来源：[{audio_dict['source']}] {audio_dict['source_id']}\n"
-                    f"路径：{audio_dict['path']}\n"
-                    f"时长：{audio_dict['duration_str']}",
-                    f"[{self._name}]", message_type=utils.PrintType.WARNING
-                )
-                continue
+                snapshot = utils.json_load(self._path, List[schema.LibraryNodeRecord])
+            # 内容不符合格式不代表文件损坏，逐条读取并跳过无法转换的记录，不能重置音频库
+            except errors.JSONSchemaError as e:
+                snapshot, skipped_num = schema.convert_list_lenient(e.raw, schema.LibraryNodeRecord)
+            loaded_list = self._journal.replay(snapshot)
+        size_map, removed_num = self._scan_root(remove_partial)
+
+        temp_list = []
+        missing_list = []
+        for node_record in loaded_list:
+            audio_record = node_record.item
+            file_size = size_map.get(os.path.normpath(audio_record.path))
+            if file_size is None:
+                # 不在库目录中的文件单独检查
+                try:
+                    file_size = os.path.getsize(audio_record.path)
+                except OSError:
+                    missing_list.append(audio_record)
+                    continue
             self._used_storage_size += file_size
-            key = node_dict["key"]
-            new_audio = audio.audio_decoder(audio_dict)
-            temp_list.append({"item": new_audio, "key": key})
+            self._file_sizes[node_record.key] = file_size
+            self._eviction_policy.on_access(node_record.key, file_size)
+            temp_list.append({"item": audio.audio_decoder(audio_record), "key": node_record.key})
+        return temp_list, missing_list, len(loaded_list), skipped_num, removed_num
+
+    async def _save_remove_list(self, key_list: List[str]) -> None:
+        """
+        保存一批音频被移出库的变动
+        """
+        if self._storage is not None:
+            self._storage.remove_library_entries(key_list)
+        else:
+            for key in key_list:
+                self._journal.append({"op": "remove", "key": key})
+            if len(self._journal) >= JOURNAL_COMPACT_THRESHOLD:
+                await self.save()
+
+    async def _load(self) -> None:
+        self._used_storage_size = 0
+        self._file_sizes = {}
+        temp_list, missing_list, loaded_num, skipped_num, removed_num = await asyncio.get_running_loop().run_in_executor(
+            None, self._read_library, len(self._in_flight) == 0
+        )
+
+        if removed_num > 0:
+            await console.rp(f"已删除{removed_num}个中断的下载留下的临时文件", f"[{self._name}]")
+
+        if skipped_num > 0:
+            await console.rp(
+                f"库索引中有{skipped_num}条记录不符合格式，已跳过这些记录（对应的音频文件不会被删除）",
+                f"[{self._name}]", message_type=utils.PrintType.WARNING, print_head=True
+            )
+
+        # 汇总报告丢失的文件
+        if len(missing_list) > 0:
+            missing_lines = "\n".join(
+                f"[{item.source}] {item.source_id} {item.title} -> {item.path}" for item in missing_list[:10]
+            )
+            if len(missing_list) > 10:
+                missing_lines += f"\n…… 以及其他{len(missing_list) - 10}个文件"
+            await console.rp(
+                f"库中记录的{len(missing_list)}个音频文件丢失，已将其移出库：\n{missing_lines}",
+                f"[{self._name}]", message_type=utils.PrintType.WARNING
+            )
 
         self._dl_list = utils.double_linked_list_dict_decoder(temp_list, force=True)
+        # 移除已丢失文件的记录，并将操作日志合并进快照
+        if len(temp_list) != loaded_num or len(self._journal) > 0:
+            await self.save()
 
-        if self.storage_full():
-            await console.rp(f"{self._name}超出容量限制，从最久不使用的文件开始尝试删除", f"[{self._name}]")
-            while self.storage_full():
-                if not await self._delete_least_used_file():
-                    await console.rp(
-                        f"{self._name}容量超出上限且且无法继续清除文件，初始化失败，请检查设置中的音频库缓存容量上限\n"
-                        f"可通过--setting修改设置中的音频库缓存容量上限，"
-                        f"或者手动修改文件./configs/system_config.json中的audio_library_storage_capacity",
-                        f"[{self._name}]",
-                        message_type=utils.PrintType.ERROR,
-                        print_head=True
-                    )
-                    raise errors.InitializationError(
-                        self._name,
-                        f"{self._name}容量超出上限且且无法继续清除文件，"
-                        f"请检查设置中的音频库缓存容量上限。可通过--setting修改设置中的音频库缓存容量上限，"
-                        f"或者手动修改文件./configs/system_config.json中的audio_library_storage_capacity"
-                    )
+        if self.storage_will_full(0):
+            await console.rp(f"{self._name}超出容量限制，按{self._eviction_policy.label}策略删除文件", f"[{self._name}]")
+            if not await self._make_space(0):
+                await console.rp(
+                    f"{self._name}容量超出上限且且无法继续清除文件，初始化失败，请检查设置中的音频库缓存容量上限\n"
+                    f"可通过--setting修改设置中的音频库缓存容量上限，"
+                    f"或者手动修改文件./configs/system_config.json中的audio_library_storage_capacity",
+                    f"[{self._name}]",
+                    message_type=utils.PrintType.ERROR,
+                    print_head=True
+                )
+                raise errors.InitializationError(
+                    self._name,
+                    f"{self._name}容量超出上限且且无法继续清除文件，"
+                    f"请检查设置中的音频库缓存容量上限。可通过--setting修改设置中的音频库缓存容量上限，"
+                    f"或者手动修改文件./configs/system_config.json中的audio_library_storage_capacity"
+                )
 
         await console.rp(f"成功加载库文件：{self._path}", f"[{self._name}]")
 
@@ -144,6 +380,12 @@ class AudioFileLibrary:
     def get_name(self) -> str:
         return self._name
 
+    def get_startup_time(self) -> Optional[float]:
+        """
+        返回上一次初始化所用的时间（秒），未初始化时返回None
+        """
+        return self._startup_time
+
     def get_storage_capacity(self) -> int:
         return self._storage_capacity
 
@@ -189,6 +431,20 @@ class AudioFileLibrary:
         else:
             return False
 
+    @decorator.check_initialized
+    def verify_audio(self, target_audio: audio.Audio) -> bool:
+        """
+        检查音频是否仍在库中，且其文件存在、大小与库中记录的一致
+        """
+        uid = target_audio.get_uid()
+        if uid not in self._dl_list or self._dl_list.key_get(uid).get_path() != target_audio.get_path():
+            return False
+        try:
+            local_size = os.path.getsize(target_audio.get_path())
+        except OSError:
+            return False
+        return local_size == self._file_sizes.get(uid, local_size)
+
     @decorator.check_initialized
     def now_playing(self, target: Union[str, audio.Audio]) -> bool:
         """
@@ -239,6 +495,37 @@ class AudioFileLibrary:
             if len(self._using[target_path]) == 0:
                 del self._using[target_path]
 
+    @decorator.check_initialized
+    def lock_audio_list(self, key: str, audio_list: List[audio.Audio]) -> None:
+        """
+        批量锁定<audio_list>中的音频，先合并同一文件的次数再一次性写入锁定表
+        :param key: 代表一个部分锁定这些音频，统一使用字符串str防止类型不同造成的无法解锁
+        :param audio_list: 需要被锁定的音频列表
+        """
+        counter = collections.Counter(item.get_path() for item in audio_list)
+        for target_path, count in counter.items():
+            key_dict = self._using.setdefault(target_path, {})
+            key_dict[key] = key_dict.get(key, 0) + count
+
+    @decorator.check_initialized
+    def unlock_audio_list(self, key: str, audio_list: List[audio.Audio]) -> None:
+        """
+        批量解锁<audio_list>中的音频，先合并同一文件的次数再一次性写入锁定表
+        :param key: 代表一个部分解锁这些音频，统一使用字符串str防止类型不同造成的无法解锁
+        :param audio_list: 需要被解锁的音频列表
+        """
+        counter = collections.Counter(item.get_path() for item in audio_list)
+        for target_path, count in counter.items():
+            key_dict = self._using.get(target_path)
+            if key_dict is None:
+                continue
+            if key in key_dict:
+                key_dict[key] -= count
+                if key_dict[key] <= 0:
+                    del key_dict[key]
+            if len(key_dict) == 0:
+                del self._using[target_path]
+
     @decorator.check_initialized
     async def _append_audio(self, new_audio: audio.Audio, repeat_file=False) -> None:
         """
@@ -249,6 +536,7 @@ class AudioFileLibrary:
 
         if not repeat_file:
             filesize = os.path.getsize(new_audio.get_path())
+            self._file_sizes[new_audio.get_uid()] = filesize
             converted_file_size = utils.convert_byte(filesize)
             self._used_storage_size += filesize
             converted_used_size = utils.convert_byte(self._used_storage_size)
@@ -261,12 +549,13 @@ class AudioFileLibrary:
                 f"[{self._name}]"
             )
 
-        await self.save()
+        self._eviction_policy.on_access(new_audio.get_uid(), self._file_sizes.get(new_audio.get_uid(), 0))
+        await self._save_touch(new_audio, not repeat_file)
 
     @decorator.check_initialized
     async def _remove_audio(self, key: str) -> None:
         target_audio = self._dl_list.key_get(key)
-        filesize = os.path.getsize(target_audio.get_path())
+        filesize = self._file_sizes.get(key, 0)
 
         try:
             os.remove(target_audio.get_path())
@@ -274,6 +563,9 @@ class AudioFileLibrary:
             await console.rp(f"尝试删除文件失败：{target_audio.get_path()}，文件已不存在", f"[{self._name}]", message_type=utils.PrintType.CAUTION)
             # 将已不存在的文件移出dl_list
             self._dl_list.key_remove(key)
+            self._used_storage_size -= self._file_sizes.pop(key, 0)
+            self._eviction_policy.on_remove(key)
+            await self._save_remove(key)
             raise FileNotFoundError
         except PermissionError:
             await console.rp(f"尝试删除文件失败：{target_audio.get_path()}，文件正在使用中或程序权限不足",
@@ -281,6 +573,8 @@ class AudioFileLibrary:
             raise PermissionError
         else:
             self._dl_list.key_remove(key)
+            self._file_sizes.pop(key, None)
+            self._eviction_policy.on_remove(key)
             converted_file_size = utils.convert_byte(filesize)
             self._used_storage_size -= filesize
             converted_used_size = utils.convert_byte(self._used_storage_size)
@@ -293,69 +587,144 @@ class AudioFileLibrary:
                 f"[{self._name}]"
             )
 
-        await self.save()
+        await self._save_remove(key)
 
-    @decorator.check_initialized
-    async def _delete_least_used_file(self, depth: int = 0):
+    def _plan_eviction(self, new_file_size: int) -> Optional[List[audio.Audio]]:
         """
-        从最久不使用的文件开始尝试删除
-        由于本方法含有递归调用并且本方法可能会被循环调用，所以将提示语
-         - await console.rp(f"{self._name}超出容量限制，从最久不使用的文件开始尝试删除", f"[{self._name}]")
-        放置在方法外部以减少重复提示
+        按淘汰策略一次性选出需要删除的音频，使删除后可以容纳大小为<new_file_size>的新文件，跳过被锁定的音频
+
+        :param new_file_size: 需要容纳的新文件大小（字节）
+        :return: 需要删除的音频列表，如果删除所有未锁定的音频也无法腾出足够空间则返回None
         """
-        try:
-            target_audio = self._dl_list.index_get(depth)
-        except IndexError:
-            await console.rp(f"{self._name}超出容量限制，尝试删除文件失败，库中已不包含任何可删除的文件", f"[{self._name}]", message_type=utils.PrintType.ERROR)
-            return False
-        if not self.using(target_audio):
-            try:
-                await self._remove_audio(target_audio.get_uid())
-            except FileNotFoundError:
-                # 删除失败，如果仍满则重试
-                if self.storage_full():
-                    result = await self._delete_least_used_file()
-                    return result  # 递归返回
-            # 如果是文件正在使用的话此错误大概率不会出现，作为key失效的兜底处理
-            except PermissionError:
-                # 如果当前尝试删除的文件并不是正在播放的话，继续尝试删除下一最久不使用的文件，
-                # 因为唯一一种较旧文件被锁定而较新文件没被锁定的情况就是较旧文件正在播放的情况
-                if not self.now_playing(target_audio) or depth + 1 >= len(self._dl_list):
-                    return False
+        required_size = self._used_storage_size + new_file_size - self._storage_capacity
+        if required_size <= 0:
+            return []
+
+        lru_audio_dict = {item.get_uid(): item for item in self._dl_list}
+        victim_list = []
+        freed_size = 0
+        for key in self._eviction_policy.order(list(lru_audio_dict.keys())):
+            target_audio = lru_audio_dict[key]
+            if self.using(target_audio):
+                continue
+            victim_list.append(target_audio)
+            freed_size += self._file_sizes.get(key, 0)
+            if freed_size >= required_size:
+                return victim_list
+        return None
+
+    async def _evict(self, victim_list: List[audio.Audio]) -> None:
+        """
+        批量删除<victim_list>中的音频文件并将其移出库，只保存一次
+        正在被使用或无权限删除的文件会被保留
+        """
+        def remove_files() -> List[bool]:
+            result = []
+            for item in victim_list:
+                try:
+                    os.remove(item.get_path())
+                except FileNotFoundError:
+                    result.append(True)
+                except OSError:
+                    result.append(False)
                 else:
-                    result = await self._delete_least_used_file(depth + 1)
-                    return result  # 递归返回
-            else:
-                return True
-        else:
-            await console.rp(f"尝试删除文件失败：{target_audio.get_path()}，文件正在使用中", f"[{self._name}]", message_type=utils.PrintType.ERROR)
-            # 如果当前尝试删除的文件并不是正在播放的话，继续尝试删除下一最久不使用的文件，
-            # 因为唯一一种较旧文件被锁定而较新文件没被锁定的情况就是较旧文件正在播放的情况
-            if not self.now_playing(target_audio) or depth + 1 >= len(self._dl_list):
+                    result.append(True)
+            return result
+
+        removed_result = await asyncio.get_running_loop().run_in_executor(None, remove_files)
+
+        removed_key_list = []
+        freed_size = 0
+        for target_audio, removed in zip(victim_list, removed_result):
+            if not removed:
+                await console.rp(f"尝试删除文件失败：{target_audio.get_path()}，文件正在使用中或程序权限不足",
+                                 f"[{self._name}]", message_type=utils.PrintType.ERROR)
+                continue
+            key = target_audio.get_uid()
+            self._dl_list.key_remove(key)
+            freed_size += self._file_sizes.pop(key, 0)
+            removed_key_list.append(key)
+
+        self._used_storage_size -= freed_size
+        self._eviction_policy.on_evict(removed_key_list)
+        if len(removed_key_list) > 0:
+            await self._save_remove_list(removed_key_list)
+
+        converted_freed_size = utils.convert_byte(freed_size)
+        converted_used_size = utils.convert_byte(self._used_storage_size)
+        converted_capacity = utils.convert_byte(self._storage_capacity)
+        await console.rp(
+            f"删除{len(removed_key_list)}个文件，释放空间：{converted_freed_size[0]} {converted_freed_size[1]}\n"
+            f"已用容量：{converted_used_size[0]} {converted_used_size[1]} / "
+            f"{converted_capacity[0]} {converted_capacity[1]}"
+            f" -> {self.get_used_storage_percentage(2)}%",
+            f"[{self._name}]"
+        )
+
+    async def _make_space(self, new_file_size: int) -> bool:
+        """
+        按淘汰策略删除文件，直到可以容纳大小为<new_file_size>的新文件
+
+        :return: 是否成功腾出足够空间
+        """
+        while self.storage_will_full(new_file_size):
+            victim_list = self._plan_eviction(new_file_size)
+            if victim_list is None or len(victim_list) == 0:
                 return False
-            else:
-                result = await self._delete_least_used_file(depth + 1)
-                return result  # 递归返回
+            used_size = self._used_storage_size
+            await self._evict(victim_list)
+            # 全部删除失败时停止，防止无限循环
+            if self._used_storage_size >= used_size:
+                return False
+        return True
 
     @decorator.check_initialized
     async def _download_space_check(self, new_file_size: int) -> None:
-        # 如果下载此音频库会满，尝试删除最不常使用的文件
+        # 如果下载此音频库会满，按淘汰策略一次性选出并删除文件
         if self.storage_will_full(new_file_size):
-            await console.rp(f"{self._name}超出容量限制，从最久不使用的文件开始尝试删除", f"[{self._name}]")
-            while self.storage_will_full(new_file_size):
-                # 现在是一直删文件直到可以下载或者删不了为止，可以改成先计算能删多少文件，空间够了再删，但是潜在问题太多先不改了
-                if not await self._delete_least_used_file():
-                    converted_file_size = utils.convert_byte(new_file_size)
-                    available_size = self.get_available_storage_size()
-                    converted_available_size = utils.convert_byte(available_size)
-                    await console.rp(
-                        f"下载失败，超出音频库容量上限且无法清理出足够空间，"
-                        f"目标文件大小：{converted_file_size[0]} {converted_file_size[1]}，"
-                        f"音频库可用容量：{converted_available_size[0]}{converted_available_size[1]}",
-                        f"[{self._name}]",
-                        message_type=utils.PrintType.ERROR
-                    )
-                    raise errors.StorageFull(self._name)
+            await console.rp(f"{self._name}超出容量限制，按{self._eviction_policy.label}策略删除文件", f"[{self._name}]")
+            if not await self._make_space(new_file_size):
+                converted_file_size = utils.convert_byte(new_file_size)
+                available_size = self.get_available_storage_size()
+                converted_available_size = utils.convert_byte(available_size)
+                await console.rp(
+                    f"下载失败，超出音频库容量上限且无法清理出足够空间，"
+                    f"目标文件大小：{converted_file_size[0]} {converted_file_size[1]}，"
+                    f"音频库可用容量：{converted_available_size[0]}{converted_available_size[1]}",
+                    f"[{self._name}]",
+                    message_type=utils.PrintType.ERROR
+                )
+                raise errors.StorageFull(self._name)
+
+    async def _space_check_or_stream(self, target_filesize: int, stream_function: Callable[[], Awaitable[Result]]) -> Optional[Result]:
+        """
+        为大小为<target_filesize>的新文件检查并腾出空间
+        文件超过音频库容量的STREAM_ONLY_RATIO或无法腾出足够空间时，改为调用<stream_function>获取不保存文件、直接串流播放的音频
+
+        :param target_filesize: 新文件大小（字节）
+        :param stream_function: 获取串流音频的函数，返回Result
+        :return: 可以下载时返回None，否则返回串流音频的Result
+        """
+        if target_filesize <= self._storage_capacity * STREAM_ONLY_RATIO:
+            try:
+                await self._download_space_check(target_filesize)
+                return None
+            except errors.StorageFull as e:
+                storage_exception = e
+        else:
+            storage_exception = errors.StorageFull(self._name)
+
+        stream_result = await stream_function()
+        stream_audio = stream_result.result
+        if stream_audio is None:
+            return failed_result(exception=storage_exception, message="当前机器人处理音频过多", retryable=False)
+
+        converted_file_size = utils.convert_byte(target_filesize)
+        await console.rp(
+            f"音频超出音频库可缓存的大小，改为直接串流播放：{stream_audio.get_title()} [{converted_file_size[0]} {converted_file_size[1]}]",
+            f"[{self._name}]"
+        )
+        return success_result(result=stream_audio, message="音频超出音频库可缓存的大小，改为直接串流播放")
 
     @decorator.check_initialized
     async def _download_file_exist_check(self, target_file_uid: str, target_file_size: int) -> Optional[audio.Audio]:
@@ -373,7 +742,9 @@ class AudioFileLibrary:
             local_size = os.path.getsize(exists_path)
         except FileNotFoundError:
             self._dl_list.key_remove(target_file_uid)
-            await self.save()
+            self._used_storage_size -= self._file_sizes.pop(target_file_uid, 0)
+            self._eviction_policy.on_remove(target_file_uid)
+            await self._save_remove(target_file_uid)
             return None
 
         # 如果本地存在的文件更小，可能是下载被中断或损坏，删除后重新下载
@@ -411,8 +782,49 @@ class AudioFileLibrary:
             await self._append_audio(exists_audio, repeat_file=True)
             return exists_audio
 
+    async def _single_flight(self, uid: str, download_function: Callable[[], Awaitable[Result]]) -> Result:
+        """
+        同一uid的音频同时只下载一次：如果该音频正在下载中，则等待已有的下载并返回其结果，否则调用<download_function>进行下载
+
+        :param uid: 音频的uid
+        :param download_function: 执行实际下载的函数，返回Result
+        :return: 下载结果
+        """
+        in_flight = self._in_flight.get(uid)
+        if in_flight is not None:
+            await console.rp(f"音频正在下载中，等待已有的下载完成：{uid}", f"[{self._name}]")
+            # 使用shield防止等待者被取消时影响正在进行的下载
+            result = await asyncio.shield(in_flight)
+            if result.success and uid in self._dl_list:
+                await self._append_audio(result.result, repeat_file=True)
+            return result
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[uid] = future
+        try:
+            result = await download_function()
+        except BaseException as e:
+            # 下载者被取消或出错时，等待者得到一个可重试的失败结果
+            future.set_result(failed_result(exception=e, message="下载被中断", retryable=True))
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._in_flight.pop(uid, None)
+
+    def downloading(self, uid: str) -> bool:
+        """
+        uid为<uid>的音频是否正在下载中
+        """
+        return uid in self._in_flight
+
     @decorator.check_initialized
-    async def download_bilibili(self, info_dict, download_type: DownloadType, num_option: int = 0) -> Result:
+    async def download_bilibili(self, info_dict, download_type: DownloadType, num_option: int = 0, stream=None) -> Result:
+        """
+        下载哔哩哔哩音频，如果提供<stream>（progressive.ProgressiveBuffer）则在下载的同时将数据送入其中用于边下载边播放
+        如果该音频已在库中或正在被其他请求下载，<stream>不会收到数据
+        """
         if resource_classifier.handler(download_type) is not DownloadHandler.BILIBILI_API_PYTHON:
             raise ValueError(f"错误下载类型：{download_type.name}")
 
@@ -424,23 +836,27 @@ class AudioFileLibrary:
                 return failed_result(exception=info_result.exception, message=info_result.message, retryable=info_result.retryable)
             num_option = 0  # 在上方完成对应信息提取后，重制num_option为0，因为合集中的视频是独立的，分p序号为0
 
-        bvid = info_dict["bvid"]
+        uid = bilibili.construct_uid(bvid=info_dict["bvid"], download_type=download_type, num_p=num_option)
+        return await self._single_flight(uid, lambda: self._download_bilibili(uid, info_dict, download_type, num_option, stream))
+
+    async def _download_bilibili(self, uid: str, info_dict, download_type: DownloadType, num_option: int, stream=None) -> Result:
         target_filesize_result = await bilibili.get_filesize(info_dict, num_option)
         target_filesize = target_filesize_result.result
         if target_filesize is None:
             return failed_result(exception=target_filesize_result.exception, message=f"{target_filesize_result.message}", retryable=target_filesize_result.retryable)
 
-        exists_audio = await self._download_file_exist_check(bilibili.construct_uid(bvid=bvid, download_type=download_type, num_p=num_option), target_filesize)
+        exists_audio = await self._download_file_exist_check(uid, target_filesize)
         if exists_audio is not None:
             return success_result(result=exists_audio, message="音频已在库中，获取已存在文件成功")
 
-        try:
-            await self._download_space_check(target_filesize)
-        except errors.StorageFull as e:
-            return failed_result(exception=e, message="当前机器人处理音频过多", retryable=False)
+        stream_result = await self._space_check_or_stream(
+            target_filesize, lambda: bilibili.get_stream_audio(info_dict, download_type, num_option)
+        )
+        if stream_result is not None:
+            return stream_result
 
         # 下载
-        new_audio_result = await bilibili.audio_download(info_dict, self._root, download_type, num_option)
+        new_audio_result = await bilibili.audio_download(info_dict, self._root, download_type, num_option, stream=stream)
         new_audio = new_audio_result.result
         if new_audio is None:
             return failed_result(exception=new_audio_result.exception, message=new_audio_result.message, retryable=new_audio_result.retryable)
@@ -453,21 +869,24 @@ class AudioFileLibrary:
         if resource_classifier.handler(download_type) is not DownloadHandler.YT_DLP:
             raise ValueError(f"错误下载类型：{download_type.name}")
 
-        video_id = info_dict["id"]
+        uid = ytdlp.construct_uid(video_id=info_dict["id"], download_type=download_type)
+        return await self._single_flight(uid, lambda: self._download_ytdlp(uid, url, info_dict, download_type))
 
+    async def _download_ytdlp(self, uid: str, url, info_dict, download_type: DownloadType) -> Result:
         target_filesize_result = await ytdlp.get_filesize(info_dict)
         target_filesize = target_filesize_result.result
         if target_filesize is None:
             return failed_result(exception=target_filesize_result.exception, message=f"{target_filesize_result.message}", retryable=target_filesize_result.retryable)
 
-        exists_audio = await self._download_file_exist_check(ytdlp.construct_uid(video_id=video_id, download_type=download_type), target_filesize)
+        exists_audio = await self._download_file_exist_check(uid, target_filesize)
         if exists_audio is not None:
             return success_result(result=exists_audio, message="音频已在库中，获取已存在文件成功")
 
-        try:
-            await self._download_space_check(target_filesize)
-        except errors.StorageFull as e:
-            return failed_result(exception=e, message="当前机器人处理音频过多", retryable=False)
+        stream_result = await self._space_check_or_stream(
+            target_filesize, lambda: ytdlp.get_stream_audio(info_dict, download_type)
+        )
+        if stream_result is not None:
+            return stream_result
 
         new_audio_result = await ytdlp.audio_download(url, info_dict, self._root, download_type)
         new_audio = new_audio_result.result
@@ -482,19 +901,24 @@ class AudioFileLibrary:
         if resource_classifier.handler(download_type) is not DownloadHandler.GO_MUSIC_API:
             raise ValueError(f"错误下载类型：{download_type.name}")
 
+        uid = go_music.construct_uid(source=info_dict["source"], song_id=info_dict["id"])
+        return await self._single_flight(uid, lambda: self._download_go_music(uid, info_dict, download_type))
+
+    async def _download_go_music(self, uid: str, info_dict: dict, download_type: DownloadType) -> Result:
         target_filesize_result = await go_music.get_filesize(api_url=self.get_go_music_api_url(), info_dict=info_dict)
         target_filesize = target_filesize_result.result
         if target_filesize is None:
             return failed_result(exception=target_filesize_result.exception, message=f"{target_filesize_result.message}", retryable=target_filesize_result.retryable)
 
-        exists_audio = await self._download_file_exist_check(go_music.construct_uid(source=info_dict["source"], song_id=info_dict["id"]), target_filesize)
+        exists_audio = await self._download_file_exist_check(uid, target_filesize)
         if exists_audio is not None:
             return success_result(result=exists_audio, message="音频已在库中，获取已存在文件成功")
 
-        try:
-            await self._download_space_check(target_filesize)
-        except errors.StorageFull as e:
-            return failed_result(exception=e, message="当前机器人处理音频过多", retryable=False)
+        stream_result = await self._space_check_or_stream(
+            target_filesize, lambda: go_music.get_stream_audio(self.get_go_music_api_url(), info_dict, download_type)
+        )
+        if stream_result is not None:
+            return stream_result
 
         new_audio_result = await go_music.audio_download(api_url=self.get_go_music_api_url(), info_dict=info_dict, download_dir=self._root, download_type=download_type)
         new_audio = new_audio_result.result
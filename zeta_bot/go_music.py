@@ -4,6 +4,7 @@ import asyncio
 import json
 import os
 import re
+import urllib.parse
 from pathlib import Path
 from enum import Enum
 
@@ -14,6 +15,8 @@ from utils import Result, success_result, failed_result
 from zeta_bot import (
     output_console,
     audio,
+    http_session,
+    metadata_cache,
 )
 from zeta_bot.resource import MediaPlatform, LinkType, DownloadHandler, DownloadType, ResourceClassifier
 
@@ -145,7 +148,8 @@ async def handle_exception(exception: Exception) -> Result:
     return failed_result(exception=exception, message=message, retryable=retryable)
 
 
-async def request_json(api_url: str, session: aiohttp.ClientSession, endpoint: str, params: Optional[dict] = None) -> dict:
+async def request_json(api_url: str, session: aiohttp.ClientSession, endpoint: str, params: Optional[dict] = None,
+                       timeout: Optional[aiohttp.ClientTimeout] = None) -> dict:
     """
     请求go-music-api并解析JSON对象
 
@@ -153,11 +157,12 @@ async def request_json(api_url: str, session: aiohttp.ClientSession, endpoint: s
     :param session: aiohttp 客户端会话
     :param endpoint: API 路径
     :param params: 查询参数
+    :param timeout: 本次请求的超时设置
     :return: API 返回的 JSON 对象
     """
     request_url = f"{api_url_format(api_url)}{endpoint}"
 
-    async with session.get(request_url, params=params) as response:
+    async with session.get(request_url, params=params, timeout=timeout) as response:
         body = await response.text(errors="replace")
 
         try:
@@ -209,7 +214,7 @@ def build_music_params(info_dict: Dict[str, Any]) -> Dict[str, Any]:
         "name": info_dict["name"] or "未知音频",
         "artist": info_dict["artist"] or "未知作者",
         "album": info_dict.get("album", ""),
-        "duration": info_dict.get("duration", 0),
+        "duration": int(info_dict.get("duration") or 0),
         "source": info_dict.get("source") or "未知来源",
         "cover": info_dict.get("cover") or "",
         "extra": extra_json,
@@ -232,8 +237,8 @@ async def is_available(api_url: str, silent: bool = True) -> bool:
             f"测试go-music-api连接：{api_url}",
             f"[{level}]",
         )
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            result = await request_json(api_url, session, "/api/v1/system/qr_login/sources",)
+        session = http_session.get_session()
+        result = await request_json(api_url, session, "/api/v1/system/qr_login/sources", timeout=timeout)
     except Exception as e:
         if not silent: await console.rp(
             f"go-music-api服务连接失败：触发异常{type(e).__module__}.{type(e).__name__}",
@@ -253,7 +258,22 @@ async def is_available(api_url: str, silent: bool = True) -> bool:
 
 async def get_info_album(api_url: str, music_url: str, suppress_errors: bool = False) -> Optional[Result]:
     """
-    通过音乐链接获取专辑信息
+    通过音乐链接获取专辑信息，优先使用信息缓存
+
+    :param api_url: go-music-api 服务根地址
+    :param music_url: 音乐平台的单曲分享链接
+    :param suppress_errors: 出现错误时是否阻止异常抛出
+    :return: 包含歌曲信息或异常的统一结果字典
+    """
+    return await metadata_cache.get_or_fetch(
+        f"go_music:album:{str(music_url).strip()}", "go_music_list",
+        lambda: fetch_info_album(api_url, music_url, suppress_errors)
+    )
+
+
+async def fetch_info_album(api_url: str, music_url: str, suppress_errors: bool = False) -> Optional[Result]:
+    """
+    通过音乐链接获取专辑信息，不使用缓存
 
     :param api_url: go-music-api 服务根地址
     :param music_url: 音乐平台的单曲分享链接
@@ -265,16 +285,17 @@ async def get_info_album(api_url: str, music_url: str, suppress_errors: bool = F
 
         # 请求链接解析接口
         timeout = aiohttp.ClientTimeout(total=20, connect=5)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            result = await request_json(
-                api_url_format(api_url),
-                session,
-                "/api/v1/music/search",
-                {
-                    "q": music_url,
-                    "type": "album",
-                },
-            )
+        session = http_session.get_session()
+        result = await request_json(
+            api_url_format(api_url),
+            session,
+            "/api/v1/music/search",
+            {
+                "q": music_url,
+                "type": "album",
+            },
+            timeout=timeout,
+        )
 
         info_dict = result.get("data")
         if not isinstance(info_dict, dict):
@@ -305,7 +326,22 @@ async def get_info_album(api_url: str, music_url: str, suppress_errors: bool = F
 
 async def get_info_playlist(api_url: str, music_url: str, suppress_errors: bool = False) -> Optional[Result]:
     """
-    通过音乐链接获取歌单信息
+    通过音乐链接获取歌单信息，优先使用信息缓存
+
+    :param api_url: go-music-api 服务根地址
+    :param music_url: 音乐平台的单曲分享链接
+    :param suppress_errors: 出现错误时是否阻止异常抛出
+    :return: 包含歌曲信息或异常的统一结果字典
+    """
+    return await metadata_cache.get_or_fetch(
+        f"go_music:playlist:{str(music_url).strip()}", "go_music_list",
+        lambda: fetch_info_playlist(api_url, music_url, suppress_errors)
+    )
+
+
+async def fetch_info_playlist(api_url: str, music_url: str, suppress_errors: bool = False) -> Optional[Result]:
+    """
+    通过音乐链接获取歌单信息，不使用缓存
 
     :param api_url: go-music-api 服务根地址
     :param music_url: 音乐平台的单曲分享链接
@@ -317,16 +353,17 @@ async def get_info_playlist(api_url: str, music_url: str, suppress_errors: bool
 
         # 请求链接解析接口
         timeout = aiohttp.ClientTimeout(total=20, connect=5)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            result = await request_json(
-                api_url_format(api_url),
-                session,
-                "/api/v1/music/search",
-                {
-                    "q": music_url,
-                    "type": "playlist",
-                },
-            )
+        session = http_session.get_session()
+        result = await request_json(
+            api_url_format(api_url),
+            session,
+            "/api/v1/music/search",
+            {
+                "q": music_url,
+                "type": "playlist",
+            },
+            timeout=timeout,
+        )
 
         info_dict = result.get("data")
         if not isinstance(info_dict, dict):
@@ -357,7 +394,20 @@ async def get_info_playlist(api_url: str, music_url: str, suppress_errors: bool
 
 async def get_info(api_url: str, music_url: str) -> Result:
     """
-    通过音乐链接获取歌曲信息
+    通过音乐链接获取歌曲信息，优先使用信息缓存
+
+    :param api_url: go-music-api 服务根地址
+    :param music_url: 音乐平台的单曲分享链接
+    :return: 包含歌曲信息或异常的统一结果字典
+    """
+    return await metadata_cache.get_or_fetch(
+        f"go_music:song:{str(music_url).strip()}", "go_music", lambda: fetch_info(api_url, music_url)
+    )
+
+
+async def fetch_info(api_url: str, music_url: str) -> Result:
+    """
+    通过音乐链接获取歌曲信息，不使用缓存
 
     :param api_url: go-music-api 服务根地址
     :param music_url: 音乐平台的单曲分享链接
@@ -370,16 +420,17 @@ async def get_info(api_url: str, music_url: str) -> Result:
 
         # 请求链接解析接口
         timeout = aiohttp.ClientTimeout(total=20, connect=5)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            result = await request_json(
-                api_url_format(api_url),
-                session,
-                "/api/v1/music/search",
-                {
-                    "q": music_url,
-                    "type": "song",
-                },
-            )
+        session = http_session.get_session()
+        result = await request_json(
+            api_url_format(api_url),
+            session,
+            "/api/v1/music/search",
+            {
+                "q": music_url,
+                "type": "song",
+            },
+            timeout=timeout,
+        )
 
         info_dict = result.get("data")
         if not isinstance(info_dict, dict):
@@ -432,31 +483,33 @@ async def get_filesize(api_url: str, info_dict: dict) -> Result:
     request_url = f"{api_url_format(api_url)}/api/v1/music/stream"
     try:
         timeout = aiohttp.ClientTimeout(total=10, connect=5)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            async with session.get(request_url, params=build_music_params(info_dict), headers={"Range": "bytes=0-0"}) as response:
-                if response.status == 206:
-                    content_range = response.headers.get("Content-Range", "")
-                    total_size = content_range.rsplit("/", 1)[-1]
-
-                    if total_size and total_size != "*":
-                        return success_result(result=int(total_size))
-
-                # 某些情况可能不支持Range，而直接返回完整响应
-                elif response.status == 200:
-                    content_length = response.headers.get("Content-Length")
-                    if content_length is not None:
-                        return success_result(result=int(content_length))
-
-                # 资源受限，go-music-api返回404 Failed to get URL
-                elif response.status == 404:
-                    body = await response.text(errors="replace")
-                    raise errors.ResourceRestrictedError(f"{info_dict['source']}_{info_dict['id']}: {info_dict['name']} 疑似资源受限，状态码：{response.status}，{body}")
+        session = http_session.get_session()
+        async with session.get(request_url, params=build_music_params(info_dict), headers={"Range": "bytes=0-0"}, timeout=timeout) as response:
+            if response.status == 206:
+                # 读取完这1字节后连接才能被连接池复用
+                await response.read()
+                content_range = response.headers.get("Content-Range", "")
+                total_size = content_range.rsplit("/", 1)[-1]
+
+                if total_size and total_size != "*":
+                    return success_result(result=int(total_size))
+
+            # 某些情况可能不支持Range，而直接返回完整响应
+            elif response.status == 200:
+                content_length = response.headers.get("Content-Length")
+                if content_length is not None:
+                    return success_result(result=int(content_length))
 
-                else:
-                    body = await response.text(errors="replace")
-                    raise RuntimeError(f"状态码：{response.status}，{body}")
+            # 资源受限，go-music-api返回404 Failed to get URL
+            elif response.status == 404:
+                body = await response.text(errors="replace")
+                raise errors.ResourceRestrictedError(f"{info_dict['source']}_{info_dict['id']}: {info_dict['name']} 疑似资源受限，状态码：{response.status}，{body}")
+
+            else:
+                body = await response.text(errors="replace")
+                raise RuntimeError(f"状态码：{response.status}，{body}")
 
-                raise RuntimeError("获取文件大小失败，响应中不存在有效的Content-Range或Content-Length")
+            raise RuntimeError("获取文件大小失败，响应中不存在有效的Content-Range或Content-Length")
     except Exception as e:
         return await handle_exception(e)
 
@@ -465,6 +518,42 @@ def construct_uid(source, song_id) -> str:
     return f"{source}_{song_id}"
 
 
+def get_source_info(info_dict: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    返回需要保存在Audio中的歌曲字段，重新获取（DownloadScheduler.refetch）时直接作为歌曲信息使用
+    其中extra会被原样传给go-music-api，部分来源必须提供
+    """
+    return {
+        "id": info_dict["id"],
+        "name": info_dict.get("name") or "",
+        "artist": info_dict.get("artist") or "",
+        "album": info_dict.get("album") or "",
+        "duration": int(info_dict.get("duration") or 0),
+        "source": info_dict["source"],
+        "cover": info_dict.get("cover") or "",
+        "extra": info_dict.get("extra") or {},
+    }
+
+
+def get_placeholder_audio(info_dict: Dict[str, Any], download_type: DownloadType) -> audio.PlaceholderAudio:
+    """
+    通过歌单或专辑信息中的一首歌曲（songs中的元素）生成占位条目，在即将播放时才会获取
+    标题与下载后的音频相同（作者 - 名称），重新获取所需的歌曲字段保存在来源信息中
+    """
+    placeholder = audio.PlaceholderAudio(
+        title=f"{info_dict['artist']} - {info_dict['name']}",
+        uid=construct_uid(info_dict["source"], info_dict["id"]),
+        source=info_dict["source"],
+        source_id=info_dict["id"],
+        download_type=download_type,
+        duration=int(info_dict.get("duration") or 0)
+    )
+    if info_dict.get("cover"):
+        placeholder.set_cover_url(info_dict["cover"])
+    placeholder.set_source_info(get_source_info(info_dict))
+    return placeholder
+
+
 def extension_format(value: Any) -> str:
     """
     将接口返回的扩展名转换为安全的音频扩展名
@@ -531,7 +620,8 @@ def detect_stream_extension(content_type: Optional[str], first_chunk: bytes, fal
     return extension_format(fallback)
 
 
-async def download_to_file(api_url: str, session: aiohttp.ClientSession, info_dict: Dict[str, Any], download_dir: Union[str, Path]) -> Tuple[Path, int]:
+async def download_to_file(api_url: str, session: aiohttp.ClientSession, info_dict: Dict[str, Any], download_dir: Union[str, Path],
+                           timeout: Optional[aiohttp.ClientTimeout] = None) -> Tuple[Path, int]:
     """
     从音频流接口分块下载音频并原子保存到UID对应的确定路径
 
@@ -539,6 +629,7 @@ async def download_to_file(api_url: str, session: aiohttp.ClientSession, info_di
     :param session: aiohttp客户端会话
     :param info_dict: 标准化后的歌曲信息字典
     :param download_dir: 音频下载目录
+    :param timeout: 本次请求的超时设置
     :return: 最终音频路径和实际下载字节数
     """
     stream_params = build_music_params(info_dict)
@@ -551,7 +642,7 @@ async def download_to_file(api_url: str, session: aiohttp.ClientSession, info_di
 
     try:
         # 请求go-music-api代理音频流
-        async with session.get(stream_url, params=stream_params) as response:
+        async with session.get(stream_url, params=stream_params, timeout=timeout) as response:
             response.raise_for_status()
             # 资源受限，go-music-api返回404 Failed to get URL
             if response.status == 404:
@@ -637,6 +728,38 @@ async def download_to_file(api_url: str, session: aiohttp.ClientSession, info_di
         raise
 
 
+async def get_stream_audio(api_url: str, info_dict: Dict[str, Any], download_type: DownloadType) -> Result:
+    """
+    返回通过音频流接口（/api/v1/music/stream）直接串流播放、不保存文件的音频
+
+    :param api_url: go-music-api服务根地址
+    :param info_dict: get_info返回的歌曲信息字典
+    :param download_type: 写入Audio对象的下载来源类型
+    :return: 包含 Audio 对象或异常的统一结果字典
+    """
+    try:
+        stream_params = build_music_params(info_dict)
+    except RuntimeError as e:
+        return failed_result(exception=e, message="歌曲信息无效", retryable=False)
+    stream_url = f"{api_url_format(api_url)}/api/v1/music/stream?{urllib.parse.urlencode(stream_params)}"
+
+    new_audio = audio.Audio(
+        title=f"{info_dict['artist']} - {info_dict['name']}",
+        uid=construct_uid(info_dict["source"], info_dict["id"]),
+        source=info_dict["source"],
+        source_id=info_dict['id'],
+        download_type=download_type,
+        path="",
+        duration=int(info_dict["duration"] or 0),
+    )
+    new_audio.set_stream(stream_url)
+    if "cover" in info_dict:
+        new_audio.set_cover_url(info_dict["cover"])
+    new_audio.set_source_info(get_source_info(info_dict))
+
+    return success_result(result=new_audio)
+
+
 async def audio_download(api_url: str, info_dict: Dict[str, Any], download_dir: Union[str, Path], download_type: DownloadType) -> Result:
     """
     使用歌曲信息下载音频并创建 Audio 对象
@@ -657,13 +780,14 @@ async def audio_download(api_url: str, info_dict: Dict[str, Any], download_dir:
             sock_connect=10,
             sock_read=60,
         )
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            target_path, downloaded_size = await download_to_file(
-                api_url,
-                session,
-                info_dict,
-                download_dir,
-            )
+        session = http_session.get_session()
+        target_path, downloaded_size = await download_to_file(
+            api_url,
+            session,
+            info_dict,
+            download_dir,
+            timeout=timeout,
+        )
 
         converted_size = utils.convert_byte(downloaded_size)
         await console.rp(
@@ -672,7 +796,7 @@ async def audio_download(api_url: str, info_dict: Dict[str, Any], download_dir:
             f"来源：[{SOURCE_MAP[info_dict['source']]}] {info_dict['id']}\n"
             f"路径：{target_path.parent}\n"
             f"大小：{converted_size[0]} {converted_size[1]}\n"
-            f"时长：{utils.convert_duration_to_str(info_dict['duration'])}",
+            f"时长：{utils.convert_duration_to_str(int(info_dict['duration'] or 0))}",
             f"[{level}]",
         )
 
@@ -683,11 +807,12 @@ async def audio_download(api_url: str, info_dict: Dict[str, Any], download_dir:
             source_id=info_dict['id'],
             download_type=download_type,
             path=str(target_path),
-            duration=info_dict["duration"],
+            duration=int(info_dict["duration"] or 0),
         )
 
         if "cover" in info_dict:
             new_audio.set_cover_url(info_dict["cover"])
+        new_audio.set_source_info(get_source_info(info_dict))
 
     except Exception as exception:
         return await handle_exception(exception)
@@ -1,6 +1,11 @@
 import discord
 import os
-from typing import Union, Optional
+import time
+import asyncio
+import collections
+import sqlite3
+import msgspec
+from typing import Union, Optional, List, Tuple
 
 import errors
 import utils
@@ -12,15 +17,27 @@ from zeta_bot import (
     member,
     audio,
     playlist,
-    icon
+    icon,
+    schema
 )
 
 console = output_console.Console()
 icon_lib = icon.IconLib()
 
+# 服务器数据延迟写入的合并窗口（秒），窗口内的多次修改只会写入一次磁盘
+GUILD_SAVE_DELAY = 2.0
+# 服务器闲置超过此时间（秒）后将被保存并移出内存，下次使用时重新加载
+GUILD_IDLE_TIMEOUT = 1800
+# 内存中保留的服务器数量上限，超出时从最久未使用的闲置服务器开始移出
+GUILD_CACHE_LIMIT = 500
+# 检查闲置服务器的间隔（秒）
+GUILD_EVICT_INTERVAL = 300
+
+
 class Guild:
-    def __init__(self, guild: discord.guild, lib_root: str, audio_file_library: file_management.AudioFileLibrary):
+    def __init__(self, guild: discord.guild, lib_root: str, audio_file_library: file_management.AudioFileLibrary, storage=None):
         self._guild = guild
+        self._storage = storage
         self._id = self._guild.id
         self._name = self._guild.name
         self._lib_root = lib_root
@@ -33,6 +50,15 @@ class Guild:
         self._playing_message = None
         self._playing_embed: Optional[discord.Embed] = None
 
+        # 延迟写入（write-behind）状态
+        self._dirty = False
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_lock = asyncio.Lock()
+        # 加载数据时产生的警告，由GuildLibrary在异步环境中输出
+        self._load_warning: Optional[str] = None
+        # 使用存储后端时，上次写入的最后一条历史播放记录
+        self._saved_history_last: Optional[audio.Audio] = None
+
         if not os.path.exists(self._root):
             os.makedirs(self._root, exist_ok=True)
 
@@ -102,6 +128,18 @@ class Guild:
         self._play_mode = mode_code
         return True
 
+    def is_idle(self) -> bool:
+        """
+        返回服务器当前是否闲置：没有连接语音频道、没有活跃的View、没有正在播放的消息并且播放列表为空
+        闲置的服务器不持有音频库中的任何锁定，可以安全地移出内存
+        """
+        if self._guild.voice_client is not None or self._playing_message is not None:
+            return False
+        for view in self._active_views.values():
+            if view is not None:
+                return False
+        return self.playlist.is_empty()
+
     async def refresh_list_view(self) -> None:
         if "playlist_menu_view" in self._active_views and self._active_views["playlist_menu_view"] is not None:
             await self._active_views["playlist_menu_view"].refresh_menu()
@@ -122,32 +160,194 @@ class Guild:
         self._playing_embed = new_embed
 
     def save(self) -> None:
-        utils.json_save(self._path, self)
+        """
+        将服务器数据标记为待保存，并在GUILD_SAVE_DELAY秒后统一写入磁盘
+        合并窗口内的多次调用只会产生一次写入，如果当前没有运行中的事件循环则立即同步写入
+        """
+        self._dirty = True
+        if self._flush_handle is not None:
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self.save_now()
+            return
+        self._schedule_flush()
 
-    def load(self) -> None:
-        loaded_dict = utils.json_load(self._path)
-        self.playedlist = playlist.playlist_decoder(loaded_dict["playedlist"])
-        self.playlist = GuildPlaylist(self, self._audio_file_library)
-        guild_playlist_loader(self.playlist, loaded_dict["playlist"])
+    def _schedule_flush(self) -> None:
+        """
+        在GUILD_SAVE_DELAY秒后写入服务器数据，已有计划中的写入时不重复安排
+        """
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                GUILD_SAVE_DELAY, lambda: asyncio.ensure_future(self.flush())
+            )
 
-    def encode(self) -> dict:
+    def save_now(self) -> None:
+        """
+        立即以原子方式同步写入服务器数据
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self._dirty = False
+        snapshot = self._snapshot()
+        self._write(snapshot)
+        self._on_written(snapshot)
+
+    def _snapshot(self) -> Union[str, dict]:
+        """
+        在事件循环线程中生成待写入的数据快照
+        未设置存储后端时为完整的json字符串；使用存储后端时为各部分的记录，历史播放记录只包含上次写入后新增的部分
+        """
+        if self._storage is None:
+            return utils.json_dumps(self, indent=None)
+
+        history_length = len(self.playedlist)
+        history_last = self.playedlist.get_audio(history_length - 1) if history_length > 0 else None
+        # 从末尾向前查找上次写入的最后一条历史记录，之后的为新增记录
+        new_start = None
+        if self._saved_history_last is None and history_length == 0:
+            new_start = 0
+        elif self._saved_history_last is not None:
+            for index in range(history_length - 1, -1, -1):
+                if self.playedlist.get_audio(index) is self._saved_history_last:
+                    new_start = index + 1
+                    break
+        # 找不到上次写入的位置（历史记录被重建或首次写入）时替换全部历史记录
+        replace_history = new_start is None
+        if replace_history:
+            new_start = 0
+
+        playedlist_record = self.playedlist.encode()
         return {
-            "id": self._id,
-            "name": self._name,
-            "playlist": self.playlist,
-            "playedlist": self.playedlist
+            "playlist": self.playlist.encode(),
+            "playedlist_meta": {
+                "name": playedlist_record.name,
+                "owner": playedlist_record.owner,
+                "limitation": playedlist_record.limitation,
+                "duration": playedlist_record.duration,
+            },
+            "history": [self.playedlist.get_audio(index).encode() for index in range(new_start, history_length)],
+            "history_length": history_length,
+            "replace_history": replace_history,
+            "history_last": history_last,
         }
 
+    def _write(self, snapshot: Union[str, dict]) -> None:
+        """
+        将数据快照写入存储后端，未设置存储后端时原子写入json文件，在工作线程中运行
+        """
+        if self._storage is not None:
+            self._storage.save_guild(
+                self._id,
+                self._name,
+                snapshot["playlist"],
+                snapshot["playedlist_meta"],
+                snapshot["history"],
+                snapshot["history_length"],
+                snapshot["replace_history"],
+            )
+        else:
+            utils.atomic_write(self._path, snapshot)
+
+    def _on_written(self, snapshot: Union[str, dict]) -> None:
+        """
+        写入成功后记录已写入的最后一条历史记录
+        """
+        if self._storage is not None:
+            self._saved_history_last = snapshot["history_last"]
+
+    async def flush(self) -> None:
+        """
+        如果服务器数据待保存，则在事件循环中生成数据快照，并在工作线程中以原子方式写入磁盘
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        # 持有锁时检查，保证返回时之前已开始的写入也已完成
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            # 快照必须在事件循环线程中生成，防止写入过程中播放列表被修改
+            self._dirty = False
+            snapshot = self._snapshot()
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self._write, snapshot)
+                self._on_written(snapshot)
+            except (OSError, sqlite3.Error) as e:
+                # 写入失败时重新安排写入，防止在没有新修改时数据一直未被保存
+                self._dirty = True
+                self._schedule_flush()
+                await console.rp(
+                    f"服务器数据保存失败，将在{GUILD_SAVE_DELAY}秒后重试：{e}", self._name,
+                    message_type=utils.PrintType.WARNING, print_head=True
+                )
+
+    def load(self) -> None:
+        if self._storage is not None:
+            loaded_dict = self._storage.load_guild(self._id)
+            if loaded_dict is None:
+                raise FileNotFoundError
+            try:
+                guild_record = msgspec.convert(loaded_dict, schema.GuildRecord, strict=False)
+            except msgspec.ValidationError as e:
+                guild_record = self._load_lenient(loaded_dict, str(e))
+        else:
+            try:
+                guild_record = utils.json_load(self._path, schema.GuildRecord)
+            except errors.JSONSchemaError as e:
+                guild_record = self._load_lenient(e.raw, e.description)
+        self.playedlist = playlist.playlist_decoder(guild_record.playedlist)
+        self.playlist = GuildPlaylist(self, self._audio_file_library)
+        guild_playlist_loader(self.playlist, guild_record.playlist)
+        # 存储后端中已有的历史记录，之后只需追加新增的部分；逐条读取时跳过了部分记录，下次写入时替换全部历史记录
+        if self._load_warning is None and not self.playedlist.is_empty():
+            self._saved_history_last = self.playedlist.get_audio(len(self.playedlist) - 1)
+
+    def _load_lenient(self, raw, description: str) -> schema.GuildRecord:
+        """
+        数据内容不符合格式时逐条转换，只跳过无法转换的音频，不会清空播放列表
+        """
+        guild_record, skipped_num = schema.convert_guild_record_lenient(raw, self._id, self._name)
+        self._load_warning = f"服务器数据中有内容不符合格式（{description}），已逐条读取，跳过了{skipped_num}个音频"
+        return guild_record
+
+    def pop_load_warning(self) -> Optional[str]:
+        """
+        返回并清除加载数据时产生的警告，没有警告时返回None
+        """
+        warning = self._load_warning
+        self._load_warning = None
+        return warning
+
+    def encode(self) -> schema.GuildRecord:
+        return schema.GuildRecord(
+            id=self._id,
+            name=self._name,
+            playlist=self.playlist.encode(),
+            playedlist=self.playedlist.encode()
+        )
+
 
 @decorator.Singleton
 class GuildLibrary:
-    def __init__(self):
+    def __init__(self, storage=None):
+        """
+        :param storage: 可选的存储后端（storage.SQLiteStorage），为None时使用json文件存储服务器数据
+        """
         self._root = "./data/guilds"
+        self._storage = storage
         os.makedirs(self._root, exist_ok=True)
-        self._guild_dict = {}
+        # 按最近使用顺序排列，最久未使用的在最前
+        self._guild_dict: collections.OrderedDict[int, Guild] = collections.OrderedDict()
+        self._last_access = {}
+        self._evict_task: Optional[asyncio.Task] = None
+        # 加载服务器时使用的音频库，用于在get_guild中重新加载已被移出内存的服务器
+        self._audio_file_library: Optional[file_management.AudioFileLibrary] = None
         self._hashtag_file_path = f"{self._root}/#Guilds.json"
 
-        # 检查#Guilds文件
+        # 检查#Guilds文件，之后以内存中的内容为准，修改后延迟写入
         if not os.path.exists(self._hashtag_file_path):
             utils.json_save(self._hashtag_file_path, {})
         try:
@@ -155,9 +355,42 @@ class GuildLibrary:
             self.load_hashtag_file()
         except errors.JSONFileError:
             raise errors.JSONFileError
+        self._hashtag_file_dirty = False
+        self._hashtag_flush_handle: Optional[asyncio.TimerHandle] = None
 
     def save_hashtag_file(self):
-        utils.json_save(self._hashtag_file_path, self.hashtag_file)
+        utils.json_save(self._hashtag_file_path, self.hashtag_file, atomic=True)
+
+    def _update_hashtag_file(self, guild_id: int, guild_name: str) -> None:
+        """
+        更新内存中的#Guilds索引，如有变动则在GUILD_SAVE_DELAY秒后统一写入磁盘
+        """
+        if self.hashtag_file.get(guild_id) == guild_name:
+            return
+        self.hashtag_file[guild_id] = guild_name
+        self._hashtag_file_dirty = True
+        if self._hashtag_flush_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._hashtag_file_dirty = False
+            self.save_hashtag_file()
+            return
+        self._hashtag_flush_handle = loop.call_later(GUILD_SAVE_DELAY, lambda: asyncio.ensure_future(self.flush_hashtag_file()))
+
+    async def flush_hashtag_file(self) -> None:
+        """
+        如果#Guilds索引有变动，则在工作线程中以原子方式写入磁盘
+        """
+        if self._hashtag_flush_handle is not None:
+            self._hashtag_flush_handle.cancel()
+            self._hashtag_flush_handle = None
+        if not self._hashtag_file_dirty:
+            return
+        self._hashtag_file_dirty = False
+        content = utils.json_dumps(self.hashtag_file)
+        await asyncio.get_running_loop().run_in_executor(None, utils.atomic_write, self._hashtag_file_path, content)
 
     def load_hashtag_file(self):
         loaded_dict = utils.json_load(self._hashtag_file_path)
@@ -169,65 +402,116 @@ class GuildLibrary:
                 new_key = key
             self.hashtag_file[new_key] = loaded_dict[key]
 
+    def _load_guild(self, guild: discord.Guild, audio_file_library: file_management.AudioFileLibrary) -> Tuple[Guild, bool]:
+        """
+        返回内存中的Guild，如不存在（首次使用或已被移出内存）则从存储中重新加载，同时更新其最近使用时间
+
+        :return: (Guild, 是否为新加载)
+        """
+        guild_id = guild.id
+        loaded = False
+        self._audio_file_library = audio_file_library
+        if guild_id not in self._guild_dict:
+            self._guild_dict[guild_id] = Guild(guild, self._root, audio_file_library, self._storage)
+            loaded = True
+        self._guild_dict.move_to_end(guild_id)
+        self._last_access[guild_id] = time.monotonic()
+        self._start_evict_task()
+        return self._guild_dict[guild_id], loaded
+
     async def check(self, ctx: Union[discord.ApplicationContext, discord.AutocompleteContext],
               audio_file_library: file_management.AudioFileLibrary) -> None:
         if isinstance(ctx, discord.ApplicationContext):
-            guild_id = ctx.guild.id
-            guild_name = ctx.guild.name
+            guild = ctx.guild
         else:
-            guild_id = ctx.interaction.guild.id
-            guild_name = ctx.interaction.guild.name
-
-        # 如果guild_dict中不存在本Discord服务器
-        if guild_id not in self._guild_dict:
-            if isinstance(ctx, discord.ApplicationContext):
-                self._guild_dict[guild_id] = Guild(ctx.guild, self._root, audio_file_library)
-                await console.rp(f"服务器相关信息初始化完成：{ctx.guild.name}", ctx.guild.name)
-            else:
-                self._guild_dict[guild_id] = Guild(ctx.interaction.guild, self._root, audio_file_library)
-                await console.rp(
-                    f"服务器相关信息初始化完成：{ctx.interaction.guild.name}",
-                    ctx.interaction.guild.name
-                )
-
-        # 更新#Guilds文件
-        self.load_hashtag_file()
-        if guild_id not in self.hashtag_file or guild_name != self.hashtag_file[guild_id]:
-            self.hashtag_file[guild_id] = guild_name
-            self.save_hashtag_file()
+            guild = ctx.interaction.guild
+        await self.check_by_guild_obj(guild, audio_file_library)
 
     async def check_by_guild_obj(self, guild: discord.Guild, audio_file_library: file_management.AudioFileLibrary) -> None:
-        guild_id = guild.id
-        guild_name = guild.name
-
         # 如果guild_dict中不存在本Discord服务器
-        if guild_id not in self._guild_dict:
-            self._guild_dict[guild_id] = Guild(guild, self._root, audio_file_library)
+        current_guild, loaded = self._load_guild(guild, audio_file_library)
+        if loaded:
             await console.rp(f"服务器相关信息初始化完成：{guild.name}", guild.name)
+        load_warning = current_guild.pop_load_warning()
+        if load_warning is not None:
+            await console.rp(load_warning, guild.name, message_type=utils.PrintType.WARNING, print_head=True)
 
-        # 更新#Guilds文件
-        self.load_hashtag_file()
-        if guild_id not in self.hashtag_file or guild_name != self.hashtag_file[guild_id]:
-            self.hashtag_file[guild_id] = guild_name
-            self.save_hashtag_file()
+        # 更新#Guilds索引
+        self._update_hashtag_file(guild.id, guild.name)
 
     def get_guild(self, ctx: Union[discord.ApplicationContext, discord.AutocompleteContext]) -> Union[Guild, None]:
+        """
+        返回<ctx>所在的Guild，已被移出内存的服务器会重新加载
+        只有在从未通过check加载过任何服务器（音频库未知）时返回None
+        """
         if isinstance(ctx, discord.ApplicationContext):
-            guild_id = ctx.guild.id
+            guild = ctx.guild
         else:
             # isinstance ctx → discord.AutocompleteContext
-            guild_id = ctx.interaction.guild.id
+            guild = ctx.interaction.guild
 
-        if guild_id in self._guild_dict:
-            return self._guild_dict[guild_id]
-        else:
+        if guild.id not in self._guild_dict and self._audio_file_library is None:
             return None
+        current_guild, loaded = self._load_guild(guild, self._audio_file_library)
+        if loaded:
+            self._update_hashtag_file(guild.id, guild.name)
+        return current_guild
+
+    def _start_evict_task(self) -> None:
+        if self._evict_task is None or self._evict_task.done():
+            self._evict_task = asyncio.create_task(self._evict_loop())
+
+    async def _evict_loop(self) -> None:
+        while True:
+            await asyncio.sleep(GUILD_EVICT_INTERVAL)
+            try:
+                await self.evict_idle_guilds()
+            except Exception as e:
+                await console.on_error(e)
+
+    async def evict_idle_guilds(self) -> int:
+        """
+        保存并移出闲置超过GUILD_IDLE_TIMEOUT秒的服务器，以及超出GUILD_CACHE_LIMIT数量的最久未使用的闲置服务器
+        被移出的服务器会在下次使用时（check或get_guild）重新加载
+
+        :return: 被移出的服务器数量
+        """
+        now = time.monotonic()
+        over_limit = len(self._guild_dict) - GUILD_CACHE_LIMIT
+        candidates = []
+        # 从最久未使用的服务器开始检查
+        for guild_id, current_guild in self._guild_dict.items():
+            expired = now - self._last_access.get(guild_id, now) >= GUILD_IDLE_TIMEOUT
+            if (expired or len(candidates) < over_limit) and current_guild.is_idle():
+                candidates.append(guild_id)
+
+        evicted_num = 0
+        for guild_id in candidates:
+            current_guild = self._guild_dict.get(guild_id)
+            if current_guild is None:
+                continue
+            last_access = self._last_access.get(guild_id)
+            await current_guild.flush()
+            # 保存期间服务器可能被再次使用
+            if self._last_access.get(guild_id) != last_access or not current_guild.is_idle():
+                continue
+            del self._guild_dict[guild_id]
+            self._last_access.pop(guild_id, None)
+            evicted_num += 1
+
+        if evicted_num > 0:
+            await console.rp(
+                f"已将{evicted_num}个闲置服务器的数据保存并移出内存，当前内存中服务器数量：{len(self._guild_dict)}",
+                "[Discord服务器库]"
+            )
+        return evicted_num
 
     async def save_all(self) -> None:
         await console.rp("开始保存各Discord服务器数据", "[Discord服务器库]")
-        for key in self._guild_dict:
-            self._guild_dict[key].save()
+        for key in list(self._guild_dict):
+            await self._guild_dict[key].flush()
             await self._guild_dict[key].refresh_playing_message(None, None)
+        await self.flush_hashtag_file()
         await console.rp("各Discord服务器数据保存完毕", "[Discord服务器库]")
 
 
@@ -277,6 +561,19 @@ class GuildPlaylist(playlist.Playlist):
         else:
             return False
 
+    def extend_audio(self, new_audio_list: List[audio.Audio]) -> int:
+        """
+        向播放列表的末尾批量添加音频，一次性更新播放列表时长以及音频库锁定表，并只保存一次
+
+        :param new_audio_list: 新增的音频列表
+        :return: 实际添加的音频数量
+        """
+        added_num = super().extend_audio(new_audio_list)
+        if added_num > 0:
+            self._file_library.lock_audio_list(str(self._guild.get_id()), new_audio_list[:added_num])
+            self._guild.save()
+        return added_num
+
     def insert_audio(self, new_audio: audio.Audio, index: int) -> bool:
         """
         在播放列表中索引<index>之前插入一个音频，并更新播放列表时长
@@ -294,6 +591,21 @@ class GuildPlaylist(playlist.Playlist):
         else:
             return False
 
+    def replace_audio(self, old_audio: audio.Audio, new_audio: audio.Audio) -> bool:
+        """
+        将播放列表中的音频<old_audio>（以对象本身区分）替换为<new_audio>，并在音频库中改为锁定新的音频
+
+        :param old_audio: 被替换的音频
+        :param new_audio: 新的音频
+        :return: 布尔值，<old_audio>是否仍在播放列表中并被替换
+        """
+        if super().replace_audio(old_audio, new_audio):
+            self._file_library.lock_audio(str(self._guild.get_id()), new_audio)
+            self._file_library.unlock_audio(str(self._guild.get_id()), old_audio)
+            self._guild.save()
+            return True
+        return False
+
     def remove_audio(self, index) -> None:
         """
         将一个音频移出播放列表
@@ -308,14 +620,27 @@ class GuildPlaylist(playlist.Playlist):
             self._file_library.unlock_audio(str(self._guild.get_id()), target_audio)
             self._guild.save()
 
+    def remove_range(self, start: int, end: int) -> List[audio.Audio]:
+        """
+        将索引<start>（包含）到<end>（不包含）之间的音频移出播放列表，一次性更新播放列表时长以及音频库锁定表，并只保存一次
+
+        :param start: 起始索引（包含）
+        :param end: 结束索引（不包含）
+        :return: 被移除的音频列表
+        """
+        removed_list = super().remove_range(start, end)
+        if len(removed_list) > 0:
+            self._file_library.unlock_audio_list(str(self._guild.get_id()), removed_list)
+            self._guild.save()
+        return removed_list
+
 
-def guild_playlist_loader(guild_playlist: GuildPlaylist, info_dict: dict) -> None:
+def guild_playlist_loader(guild_playlist: GuildPlaylist, info: Union[dict, schema.PlaylistRecord]) -> None:
     """
-    GuildPlaylist加载器，传入一个GuildPlaylist以及它的encode()生成的字典，重建并加入字典中的Audio，在AudioFileLibrary锁定这些Audio
+    GuildPlaylist加载器，传入一个GuildPlaylist以及它的encode()生成的PlaylistRecord（或读取到的字典），重建并加入其中的Audio，在AudioFileLibrary锁定这些Audio
     """
-    for item in info_dict["playlist"]:
-        # 防止null被插入到guild json的playlist中
-        if item is None:
-            continue
-        current_audio = audio.audio_decoder(item)
-        guild_playlist.append_audio(current_audio)
+    if isinstance(info, dict):
+        info = msgspec.convert(info, schema.PlaylistRecord, strict=False)
+    # 防止null被插入到guild json的playlist中
+    audio_list = [audio.audio_decoder(item) for item in info.playlist if item is not None]
+    guild_playlist.extend_audio(audio_list)
@@ -0,0 +1,61 @@
+from typing import *
+import aiohttp
+
+from zeta_bot import (
+    decorator,
+)
+
+# 连接池总连接数上限
+HTTP_CONNECTION_LIMIT = 64
+# 同一主机的连接数上限（同一CDN或go-music-api服务）
+HTTP_CONNECTION_LIMIT_PER_HOST = 8
+# DNS解析结果的缓存时间（秒）
+HTTP_DNS_CACHE_TTL = 600
+# 空闲连接的保持时间（秒）
+HTTP_KEEPALIVE_TIMEOUT = 60
+
+
+@decorator.Singleton
+class HTTPSessionManager:
+    """
+    [单例] 进程共享的aiohttp会话：按主机保持连接池（keep-alive），并使用aiodns异步解析和缓存DNS
+    各下载模块通过get_session()获取会话，不要自行关闭，超时在每次请求时单独设置
+    """
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def get_session(self) -> aiohttp.ClientSession:
+        """
+        返回共享会话，首次调用或会话已关闭时创建，需要在事件循环中调用
+        """
+        if self._session is None or self._session.closed:
+            try:
+                resolver = aiohttp.AsyncResolver()
+            # 未安装aiodns时使用默认的线程池解析
+            except RuntimeError:
+                resolver = aiohttp.DefaultResolver()
+
+            connector = aiohttp.TCPConnector(
+                limit=HTTP_CONNECTION_LIMIT,
+                limit_per_host=HTTP_CONNECTION_LIMIT_PER_HOST,
+                ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+                keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+                resolver=resolver,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self) -> None:
+        """
+        关闭共享会话和其中的所有连接，在程序退出或重启前调用
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+def get_session() -> aiohttp.ClientSession:
+    """
+    返回进程共享的aiohttp会话
+    """
+    return HTTPSessionManager().get_session()
@@ -1,38 +1,228 @@
 from typing import *
+import asyncio
+import hashlib
+import io
 import os
+import time
 from pathlib import Path
+from urllib.parse import urlparse, parse_qs
 
 import discord
 
 import utils
 
 from zeta_bot import (
-    decorator
+    decorator,
+    output_console,
 )
 
+# 已上传图标的CDN链接缓存文件路径
+ICON_CACHE_PATH = "./data/icon_cache.json"
+# 每条信息最多包含的附件数量（Discord限制）
+ICON_UPLOAD_BATCH_SIZE = 10
+# CDN链接在过期前多久（秒）视为不可用并刷新，防止发出的信息中的图标在发送后不久失效
+ICON_URL_REFRESH_MARGIN = 3600
+# 检查并刷新即将过期的CDN链接的间隔（秒）
+ICON_URL_REFRESH_INTERVAL = 1800
+
+
+def _url_expires_at(url: str) -> Optional[float]:
+    """
+    返回Discord CDN链接的过期时间（链接参数ex为十六进制的时间戳），没有过期时间时返回None
+    """
+    try:
+        expires = parse_qs(urlparse(url).query).get("ex")
+        return None if not expires else float(int(expires[0], 16))
+    except ValueError:
+        return None
+
+
 @decorator.Singleton
 class IconLib:
+    """
+    [单例] 图标库：图标文件在加载时读入内存，设置了图标频道后每个图标只上传一次，之后通过CDN链接引用
+    url()与files()配合使用：已有可用CDN链接的图标返回该链接且不生成附件，否则返回attachment://链接并从内存生成附件
+    """
     def __init__(self):
         self.icons = {}
+        self._name = "图标库"
+        # 图标内容 {filename: bytes}
+        self._data: Dict[str, bytes] = {}
+        # 图标内容的哈希值，用于判断图标文件是否变更 {filename: sha1}
+        self._digests: Dict[str, str] = {}
+        # 已上传图标的记录 {filename: {"url", "channel_id", "message_id", "digest", "expires_at"}}
+        self._uploaded: Dict[str, dict] = {}
+        self._bot: Optional[discord.Bot] = None
+        self._channel_id: Optional[int] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
 
     def load_icons(self, dir_path: str):
         for filename in os.listdir(dir_path):
             file_path = Path(dir_path) / filename
             if os.path.isfile(file_path) and (filename.endswith(".png") or filename.endswith(".gif")):
                 self.icons[filename] = file_path
+                with open(file_path, "rb") as file:
+                    self._data[filename] = file.read()
+                self._digests[filename] = hashlib.sha1(self._data[filename]).hexdigest()
+
+    def _cdn_url(self, filename: str) -> Optional[str]:
+        """
+        返回<filename>可用的CDN链接，未上传或即将过期时返回None
+        """
+        record = self._uploaded.get(filename)
+        if record is None:
+            return None
+        expires_at = record["expires_at"]
+        if expires_at is not None and expires_at - ICON_URL_REFRESH_MARGIN <= time.time():
+            return None
+        return record["url"]
+
+    def url(self, filename: str) -> str:
+        cdn_url = self._cdn_url(filename)
+        return cdn_url if cdn_url is not None else f"attachment://{filename}"
+
+    def _file(self, filename: str) -> Optional[discord.File]:
+        if filename not in self.icons or self._cdn_url(filename) is not None:
+            return None
+        return discord.File(io.BytesIO(self._data[filename]), filename=filename)
 
     def files(self, filename: Union[str, List[str]]) -> List[discord.File]:
+        """
+        返回需要随信息发送的图标附件，已通过CDN链接引用的图标不会生成附件
+        """
         if isinstance(filename, list):
             result = []
             for name in filename:
-                if name in self.icons:
-                    result.append(discord.File(self.icons[name], filename=name))
+                file = self._file(name)
+                if file is not None:
+                    result.append(file)
             return result
         else:
-            if filename in self.icons:
-                return [discord.File(self.icons[filename], filename=filename)]
-            else:
-                return []
+            file = self._file(filename)
+            return [] if file is None else [file]
+
+    def resolve(self, filename: str) -> Tuple[str, List[discord.File]]:
+        """
+        同时返回<filename>的链接与需要随信息发送的附件，两者基于同一时刻的图标状态，不会因为之间完成了上传而不一致
+        """
+        cdn_url = self._cdn_url(filename)
+        if cdn_url is not None:
+            return cdn_url, []
+        if filename not in self.icons:
+            return f"attachment://{filename}", []
+        return f"attachment://{filename}", [discord.File(io.BytesIO(self._data[filename]), filename=filename)]
+
+    def _load_cache(self) -> None:
+        if not os.path.exists(ICON_CACHE_PATH):
+            return
+        try:
+            loaded = utils.json_load(ICON_CACHE_PATH)
+        except Exception:
+            return
+        for filename, record in loaded.items():
+            # 图标文件已变更、已删除或更换了图标频道时需要重新上传
+            if self._digests.get(filename) != record.get("digest") or record.get("channel_id") != self._channel_id:
+                continue
+            self._uploaded[filename] = record
+
+    def _save_cache(self) -> None:
+        directory = os.path.dirname(ICON_CACHE_PATH)
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+        utils.json_save(ICON_CACHE_PATH, self._uploaded, atomic=True)
+
+    def _record_message(self, message: discord.Message) -> None:
+        for attachment in message.attachments:
+            if attachment.filename not in self._digests:
+                continue
+            self._uploaded[attachment.filename] = {
+                "url": attachment.url,
+                "channel_id": message.channel.id,
+                "message_id": message.id,
+                "digest": self._digests[attachment.filename],
+                "expires_at": _url_expires_at(attachment.url),
+            }
+
+    async def _upload(self, channel: discord.abc.Messageable, filename_list: List[str]) -> None:
+        """
+        将<filename_list>中的图标分批上传到<channel>
+        """
+        for i in range(0, len(filename_list), ICON_UPLOAD_BATCH_SIZE):
+            batch = filename_list[i:i + ICON_UPLOAD_BATCH_SIZE]
+            files = [discord.File(io.BytesIO(self._data[name]), filename=name) for name in batch]
+            message = await channel.send(files=files, silent=True)
+            self._record_message(message)
+
+    async def _refresh(self, channel: discord.abc.Messageable) -> None:
+        """
+        重新获取即将过期的图标所在的信息以获得新的CDN链接，信息已被删除的图标重新上传
+        """
+        message_ids = set()
+        for filename in self._digests:
+            if filename in self._uploaded and self._cdn_url(filename) is None:
+                message_ids.add(self._uploaded[filename]["message_id"])
+
+        for message_id in message_ids:
+            try:
+                message = await channel.fetch_message(message_id)
+            except discord.NotFound:
+                continue
+            self._record_message(message)
+
+        # 未上传的图标以及所在信息已被删除的图标
+        missing = [filename for filename in self._digests if self._cdn_url(filename) is None]
+        if missing:
+            await self._upload(channel, missing)
+
+    async def sync(self) -> None:
+        """
+        刷新或上传图标，并保存CDN链接缓存，失败时图标继续以附件形式发送
+        """
+        if self._bot is None or self._channel_id is None:
+            return
+        console = output_console.Console()
+        async with self._lock:
+            try:
+                channel = self._bot.get_channel(self._channel_id) or await self._bot.fetch_channel(self._channel_id)
+                await self._refresh(channel)
+                self._save_cache()
+            except Exception as e:
+                await console.rp(
+                    f"图标上传或刷新失败，图标将继续以附件形式发送：{e}",
+                    f"[{self._name}]",
+                    message_type=utils.PrintType.WARNING,
+                    print_head=True
+                )
+
+    async def setup_delivery(self, bot: discord.Bot, channel_id: int) -> None:
+        """
+        使用图标频道<channel_id>上传图标并定期刷新CDN链接，可重复调用（例如重新连接后的on_ready）
+
+        :param bot: 机器人
+        :param channel_id: 用于存放图标的文字频道ID，机器人需要有发送信息和附件的权限
+        """
+        if self._channel_id != channel_id:
+            self._uploaded = {}
+        self._bot = bot
+        self._channel_id = channel_id
+        if not self._uploaded:
+            self._load_cache()
+
+        await self.sync()
+        await output_console.Console().rp(
+            f"通过CDN链接引用的图标：{len(self._uploaded)} / {len(self._digests)}",
+            f"[{self._name}]"
+        )
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(ICON_URL_REFRESH_INTERVAL)
+            if any(self._cdn_url(filename) is None for filename in self._digests):
+                await self.sync()
+
 
 def url(filename: str) -> str:
-    return f"attachment://{filename}"
+    return IconLib().url(filename)
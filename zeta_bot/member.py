@@ -1,12 +1,19 @@
 import discord
 import os
+import asyncio
+import collections
+import copy
+import sqlite3
+import time
+from typing import Optional, Tuple
 
 import errors
 import utils
 
 from zeta_bot import (
     language,
-    decorator
+    decorator,
+    output_console,
 )
 
 # 多语言模块
@@ -14,6 +21,13 @@ lang = language.Lang()
 _ = lang.get_string
 printl = lang.printl
 
+# 用户数据延迟写入的合并窗口（秒）
+MEMBER_SAVE_DELAY = 10.0
+# 已保存的用户数据闲置超过此时间（秒）后移出内存，下次使用时重新读取
+MEMBER_IDLE_TIMEOUT = 1800
+# 内存中保留的用户数据数量上限，超出时从最久未使用的已保存用户开始移出
+MEMBER_CACHE_LIMIT = 1000
+
 
 permissions = {
     "info": False,
@@ -195,9 +209,13 @@ class MemberLibrary:
     """
     用于管理本地用户文件以及#Members文件
     """
-    def __init__(self):
+    def __init__(self, storage=None):
+        """
+        :param storage: 可选的存储后端（storage.SQLiteStorage），为None时使用json文件存储用户数据
+        """
         self.root = "./data/members"
         os.makedirs(self.root, exist_ok=True)
+        self._storage = storage
 
         self.group_config_path = "./configs/group_permission_config.json"
         # 如组权限文件不存在则创建默认文件
@@ -232,14 +250,27 @@ class MemberLibrary:
 
         self.hashtag_file_path = f"{self.root}/#Members.json"
         self.group_list = list(self.group_config.keys())
+        # 预先计算每个用户组允许的操作
+        self._group_permissions = {}
+        for user_group in self.group_config:
+            self._group_permissions[user_group] = frozenset(
+                operation for operation, value in self.group_config[user_group].items() if value is True
+            )
 
         if not os.path.exists(self.hashtag_file_path):
             utils.json_save(self.hashtag_file_path, {})
         self.hashtag_file = {}
         self.load_hashtag_file()
 
+        # 用户数据内存缓存（按最近使用顺序排列，最久未使用的在最前），以及等待写入磁盘的用户ID
+        self._member_dict: collections.OrderedDict[int, dict] = collections.OrderedDict()
+        self._last_access = {}
+        self._dirty_members = set()
+        self._hashtag_file_dirty = False
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
     def save_hashtag_file(self):
-        utils.json_save(self.hashtag_file_path, self.hashtag_file)
+        utils.json_save(self.hashtag_file_path, self.hashtag_file, atomic=True)
 
     def load_hashtag_file(self):
         loaded_dict = utils.json_load(self.hashtag_file_path)
@@ -251,79 +282,194 @@ class MemberLibrary:
                 new_key = key
             self.hashtag_file[new_key] = loaded_dict[key]
 
+    def _get_member(self, user_id) -> Optional[dict]:
+        """
+        返回缓存中的用户数据，如果缓存中不存在则从用户文件中读取，用户文件也不存在则返回None
+        """
+        user_id = int(user_id)
+        if user_id not in self._member_dict:
+            if self._storage is not None:
+                user_dict = self._storage.load_member(user_id)
+            else:
+                path = f"{self.root}/{user_id}.json"
+                user_dict = utils.json_load(path) if os.path.exists(path) else None
+            if user_dict is None:
+                return None
+            # 服务器ID统一使用字符串作为键值，与json格式保持一致
+            user_dict["guilds"] = {str(key): value for key, value in user_dict["guilds"].items()}
+            self.evict_idle_members()
+            self._member_dict[user_id] = user_dict
+        self._member_dict.move_to_end(user_id)
+        self._last_access[user_id] = time.monotonic()
+        return self._member_dict[user_id]
+
+    def evict_idle_members(self) -> int:
+        """
+        移出闲置超过MEMBER_IDLE_TIMEOUT秒的用户数据，以及超出MEMBER_CACHE_LIMIT数量的最久未使用的用户数据
+        只移出已保存的用户数据，被移出的用户会在下次使用时重新读取
+
+        :return: 被移出的用户数量
+        """
+        now = time.monotonic()
+        over_limit = len(self._member_dict) - MEMBER_CACHE_LIMIT
+        candidates = []
+        # 从最久未使用的用户开始检查
+        for user_id in self._member_dict:
+            if user_id in self._dirty_members:
+                continue
+            expired = now - self._last_access.get(user_id, now) >= MEMBER_IDLE_TIMEOUT
+            if expired or len(candidates) < over_limit:
+                candidates.append(user_id)
+        for user_id in candidates:
+            del self._member_dict[user_id]
+            self._last_access.pop(user_id, None)
+        return len(candidates)
+
+    def _mark_dirty(self, user_id) -> None:
+        """
+        将用户数据标记为待保存，并在MEMBER_SAVE_DELAY秒后统一写入磁盘
+        """
+        self._dirty_members.add(int(user_id))
+        self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        """
+        在MEMBER_SAVE_DELAY秒后写入待保存的数据，已有计划中的写入时不重复安排，不在事件循环中时立即写入
+        """
+        if self._flush_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.save_all()
+            return
+        self._flush_handle = loop.call_later(MEMBER_SAVE_DELAY, lambda: asyncio.ensure_future(self.flush()))
+
+    def _take_snapshot(self) -> Tuple[list, Optional[dict]]:
+        """
+        取出所有待保存的数据，返回 (用户数据副本列表, #Members文件副本或None)
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        member_list = [copy.deepcopy(self._member_dict[user_id]) for user_id in self._dirty_members]
+        self._dirty_members.clear()
+        hashtag_file = None
+        if self._hashtag_file_dirty:
+            hashtag_file = self.hashtag_file.copy()
+            self._hashtag_file_dirty = False
+        return member_list, hashtag_file
+
+    def _restore_snapshot(self, snapshot: Tuple[list, Optional[dict]]) -> None:
+        """
+        写入失败时将快照中的数据重新标记为待保存
+        """
+        member_list, hashtag_file = snapshot
+        self._dirty_members.update(int(user_dict["id"]) for user_dict in member_list)
+        if hashtag_file is not None:
+            self._hashtag_file_dirty = True
+
+    def _write_snapshot(self, snapshot: Tuple[list, Optional[dict]]) -> None:
+        member_list, hashtag_file = snapshot
+        if self._storage is not None:
+            if len(member_list) > 0:
+                self._storage.save_members(member_list)
+        else:
+            for user_dict in member_list:
+                utils.json_save(f"{self.root}/{user_dict['id']}.json", user_dict, atomic=True)
+        if hashtag_file is not None:
+            utils.json_save(self.hashtag_file_path, hashtag_file, atomic=True)
+
+    async def flush(self) -> None:
+        """
+        在工作线程中批量写入所有待保存的用户数据
+        """
+        snapshot = self._take_snapshot()
+        if len(snapshot[0]) > 0 or snapshot[1] is not None:
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self._write_snapshot, snapshot)
+            except (OSError, sqlite3.Error) as e:
+                # 写入失败时重新标记并安排写入，防止在没有新修改时数据一直未被保存
+                self._restore_snapshot(snapshot)
+                self._schedule_flush()
+                await output_console.Console().rp(
+                    f"用户数据保存失败，将在{MEMBER_SAVE_DELAY}秒后重试：{e}", "[用户库]",
+                    message_type=utils.PrintType.WARNING, print_head=True
+                )
+                return
+        self.evict_idle_members()
+
+    def save_all(self) -> None:
+        """
+        立即同步写入所有待保存的用户数据，用于重启或关闭前
+        """
+        snapshot = self._take_snapshot()
+        try:
+            self._write_snapshot(snapshot)
+        except (OSError, sqlite3.Error):
+            self._restore_snapshot(snapshot)
+            raise
+
     def check(self, ctx: discord.ApplicationContext) -> None:
         user_id = ctx.user.id
         user_name = ctx.user.name
-        path = f"{self.root}/{user_id}.json"
-
-        # 如果用户文件存在
-        if os.path.exists(path):
-            user_dict = utils.json_load(path)
-            # 更新用户名
-            if user_name != user_dict["name"]:
-                user_dict["name"] = user_name
-            if ctx.guild is not None:
-                # 更新用户服务器数据
-                if ctx.guild.id not in user_dict["guilds"]:
-                    user_dict["guilds"][ctx.guild.id] = {"nickname": ctx.user.nick, "language": lang.system_language}
-                # 更新用户此服务器的昵称
-                if ctx.user.nick != user_dict["guilds"][ctx.guild.id]["nickname"]:
-                    user_dict["guilds"][ctx.guild.id]["nickname"] = ctx.user.nick
-            # 更新#Members文件
-            self.load_hashtag_file()
-            if user_id not in self.hashtag_file or user_name != self.hashtag_file[user_id]:
-                self.hashtag_file[user_id] = user_name
-                self.save_hashtag_file()
-            # 保存变动
-            utils.json_save(path, user_dict)
+        user_dict = self._get_member(user_id)
+        changed = False
 
         # 如果用户文件不存在
-        else:
-            temp_dict = {
+        if user_dict is None:
+            user_dict = {
                 "id": user_id,
                 "name": user_name,
                 "group": "standard",
                 "language": lang.system_language,
-                "guilds": {ctx.guild.id: {
-                    "nickname": ctx.user.nick},
-                },
+                "guilds": {},
                 "data": {"first_contact": utils.ctime_str(), "play_counter": 0},
                 "property": {"playlists": []}
             }
-            utils.json_save(path, temp_dict)
-            # 更新#Members文件
-            self.load_hashtag_file()
+            self._member_dict[user_id] = user_dict
+            changed = True
+
+        # 更新用户名
+        if user_name != user_dict["name"]:
+            user_dict["name"] = user_name
+            changed = True
+        if ctx.guild is not None:
+            guild_key = str(ctx.guild.id)
+            # 更新用户服务器数据
+            if guild_key not in user_dict["guilds"]:
+                user_dict["guilds"][guild_key] = {"nickname": ctx.user.nick, "language": lang.system_language}
+                changed = True
+            # 更新用户此服务器的昵称
+            elif ctx.user.nick != user_dict["guilds"][guild_key]["nickname"]:
+                user_dict["guilds"][guild_key]["nickname"] = ctx.user.nick
+                changed = True
+
+        # 更新#Members索引（以内存中的内容为准，随用户数据一起延迟写入）
+        if user_id not in self.hashtag_file or user_name != self.hashtag_file[user_id]:
             self.hashtag_file[user_id] = user_name
-            self.save_hashtag_file()
+            self._hashtag_file_dirty = True
+            changed = True
 
-    def allow(self, user_id, operation: str) -> bool:
+        if changed:
+            self._mark_dirty(user_id)
 
-        path = f"{self.root}/{user_id}.json"
-        try:
-            user_dict = utils.json_load(path)
-            group = user_dict["group"]
-            return self.group_config[group][operation]
-        except KeyError:
+    def allow(self, user_id, operation: str) -> bool:
+        user_dict = self._get_member(user_id)
+        if user_dict is None:
             return False
+        return operation in self._group_permissions.get(user_dict["group"], ())
 
     def get_lang(self, user_id) -> str:
-        path = f"{self.root}/{user_id}.json"
-        user_dict = utils.json_load(path)
-        return user_dict["language"]
+        return self._get_member(user_id)["language"]
 
     def get_guild_lang(self, ctx: discord.ApplicationContext) -> str:
-        user_id = ctx.user.id
-        path = f"{self.root}/{user_id}.json"
-        user_dict = utils.json_load(path)
-        return user_dict["guilds"][ctx.guild.id]["language"]
+        return self._get_member(ctx.user.id)["guilds"][str(ctx.guild.id)]["language"]
 
     def get_group(self, user_id) -> str:
-        path = f"{self.root}/{user_id}.json"
-        user_dict = utils.json_load(path)
-        return user_dict["group"]
+        return self._get_member(user_id)["group"]
 
     def play_counter_increment(self, user_id) -> None:
-        path = f"{self.root}/{user_id}.json"
-        user_dict = utils.json_load(path)
+        user_dict = self._get_member(user_id)
         user_dict["data"]["play_counter"] += 1
-        utils.json_save(path, user_dict)
+        self._mark_dirty(user_id)
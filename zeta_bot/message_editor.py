@@ -0,0 +1,140 @@
+from typing import *
+import asyncio
+import time
+
+import discord
+
+from zeta_bot import (
+    output_console,
+)
+
+# 控制台
+console = output_console.Console()
+
+# 同一信息两次编辑之间的最短间隔（秒）
+MESSAGE_EDIT_INTERVAL = 1.0
+# 保留的编辑时间记录数量，超过后清理已过间隔的记录
+MESSAGE_EDIT_RECORD_LIMIT = 1024
+
+
+def message_key(response) -> Hashable:
+    """
+    返回<response>（Message，InteractionMessage或Interaction）在编辑调度器中的键
+    """
+    response_id = getattr(response, "id", None)
+    return response_id if response_id is not None else id(response)
+
+
+class MessageEditScheduler:
+    """
+    Discord信息编辑调度器：以信息为键，每个信息只保留最后一次提交的编辑，并且两次编辑之间至少间隔<interval>秒
+    调用者提交后不需要等待编辑完成，编辑函数在实际执行时才读取内容（例如共享的Embed），因此连续的进度更新只会产生少量编辑
+    """
+    def __init__(self, interval: float = MESSAGE_EDIT_INTERVAL, name: str = "信息编辑调度器"):
+        self._interval = interval
+        self._name = name
+        # 等待执行的编辑 {key: 编辑函数}
+        self._pending: Dict[Hashable, Callable[[], Awaitable]] = {}
+        # 正在处理编辑的任务 {key: Task}
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        # 不经过调度的后台任务，保留引用防止任务在完成前被回收
+        self._background: Set[asyncio.Task] = set()
+        # 最后一次编辑的时间 {key: time.monotonic()}
+        self._last_edit: Dict[Hashable, float] = {}
+
+        # 统计数据
+        self._submitted_num = 0
+        self._edited_num = 0
+
+    def submit(self, key: Hashable, edit_function: Callable[[], Awaitable]) -> None:
+        """
+        提交对<key>的编辑，替换该信息尚未执行的编辑
+
+        :param key: 信息的键，见message_key
+        :param edit_function: 执行编辑的异步函数
+        """
+        self._submitted_num += 1
+        self._pending[key] = edit_function
+        task = self._tasks.get(key)
+        if task is None or task.done():
+            self._tasks[key] = asyncio.create_task(self._run(key))
+
+    def run(self, edit_function: Callable[[], Awaitable]) -> None:
+        """
+        在后台直接执行<edit_function>，用于无法作为键的目标（例如需要发送新信息时）
+
+        :param edit_function: 执行编辑或发送的异步函数
+        """
+        task = asyncio.create_task(self._run_once(edit_function))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    @staticmethod
+    async def _run_once(edit_function: Callable[[], Awaitable]) -> None:
+        try:
+            await edit_function()
+        except Exception as e:
+            await console.on_error(e)
+
+    async def _run(self, key: Hashable) -> None:
+        try:
+            while key in self._pending:
+                wait_time = self._last_edit.get(key, 0.0) + self._interval - time.monotonic()
+                if wait_time > 0:
+                    await asyncio.sleep(wait_time)
+
+                edit_function = self._pending.pop(key, None)
+                if edit_function is None:
+                    break
+                self._last_edit[key] = time.monotonic()
+                try:
+                    await edit_function()
+                    self._edited_num += 1
+                # 信息已被删除
+                except discord.NotFound:
+                    self._pending.pop(key, None)
+                    break
+                except Exception as e:
+                    await console.on_error(e)
+        finally:
+            self._tasks.pop(key, None)
+            self._prune()
+
+    def _prune(self) -> None:
+        if len(self._last_edit) <= MESSAGE_EDIT_RECORD_LIMIT:
+            return
+        current_time = time.monotonic()
+        for key in [key for key, edit_time in self._last_edit.items() if current_time - edit_time > self._interval]:
+            if key not in self._tasks:
+                del self._last_edit[key]
+
+    async def wait(self, key: Hashable) -> None:
+        """
+        等待<key>已提交的编辑全部完成
+        """
+        task = self._tasks.get(key)
+        if task is not None:
+            await asyncio.shield(task)
+
+    async def wait_all(self, timeout: Optional[float] = None) -> None:
+        """
+        等待所有已提交的编辑与后台任务完成，用于重启或关闭前，超过<timeout>秒后不再等待
+        """
+        task_list = list(self._tasks.values()) + list(self._background)
+        if len(task_list) > 0:
+            await asyncio.wait(task_list, timeout=timeout)
+
+    def get_metrics(self) -> Dict[str, int]:
+        return {
+            "submitted": self._submitted_num,
+            "edited": self._edited_num,
+            "pending": len(self._pending),
+            "background": len(self._background),
+        }
+
+    def print_info(self):
+        metrics = self.get_metrics()
+        print(
+            f"{self._name} 当前状态：\n"
+            f"已提交 {metrics['submitted']}，实际编辑 {metrics['edited']}，等待中 {metrics['pending']}，后台任务 {metrics['background']}\n"
+        )
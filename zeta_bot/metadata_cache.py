@@ -0,0 +1,264 @@
+from typing import *
+from collections import OrderedDict
+import asyncio
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from utils import Result, success_result
+
+from zeta_bot import (
+    decorator,
+    output_console,
+    negative_cache,
+)
+
+# 控制台
+console = output_console.Console()
+
+# 磁盘缓存文件路径
+METADATA_CACHE_PATH = "./data/metadata_cache.db"
+# 内存中保留的条目数量上限
+METADATA_CACHE_MEMORY_CAPACITY = 512
+
+# 各平台的缓存时间 (新鲜时间, 过期后仍可使用的时间)，单位为秒
+# 新鲜时间内直接使用缓存；过期但仍在可用时间内时先返回缓存，同时在后台重新获取（stale-while-revalidate）
+# yt-dlp信息中包含直接串流使用的音频链接（YouTube约6小时后失效），因此两项时间都较短
+METADATA_CACHE_TTL = {
+    "bilibili": (6 * 3600, 7 * 86400),
+    "youtube": (1800, 1800),
+    "ytdlp": (1800, 1800),
+    "go_music": (86400, 7 * 86400),
+    "go_music_list": (1800, 86400),
+    # 搜索结果
+    "search": (600, 1800),
+}
+# 未知平台使用的缓存时间
+METADATA_CACHE_DEFAULT_TTL = (1800, 3600)
+
+
+class CacheEntry:
+    """
+    一条缓存的获取结果，只保存成功的结果（Result.result与Result.extra）
+    """
+    def __init__(self, platform: str, data: Any, extra: Optional[dict], fetched_at: float):
+        self.platform = platform
+        self.data = data
+        self.extra = extra
+        self.fetched_at = fetched_at
+
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+    def to_result(self) -> Result:
+        # 返回副本，防止调用者修改缓存中的字典
+        result = success_result(result=copy.deepcopy(self.data))
+        result.extra = copy.deepcopy(self.extra)
+        return result
+
+
+@decorator.Singleton
+class MetadataCache:
+    """
+    [单例] 各平台get_info结果的缓存：内存LRU + SQLite磁盘两级，以规范化的id为键，按平台设置缓存时间
+    同一键同时只会发起一次实际请求，失败的结果不会被缓存，其中资源失效或受限的失败由NegativeCache记录
+    """
+    def __init__(self, path: str = METADATA_CACHE_PATH, memory_capacity: int = METADATA_CACHE_MEMORY_CAPACITY,
+                 name: str = "信息缓存"):
+        self._path = path
+        self._memory_capacity = memory_capacity
+        self._name = name
+        self._memory: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        # 正在进行的请求 {key: Task}
+        self._in_flight: Dict[str, asyncio.Task] = {}
+
+        directory = os.path.dirname(self._path)
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self._path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._lock:
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS metadata (
+                    key TEXT PRIMARY KEY,
+                    platform TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    extra TEXT,
+                    fetched_at REAL NOT NULL
+                )
+                """
+            )
+        self._purge_expired()
+
+        # 统计数据
+        self._hit_num = 0
+        self._stale_num = 0
+        self._miss_num = 0
+
+    @staticmethod
+    def _ttl(platform: str) -> Tuple[float, float]:
+        return METADATA_CACHE_TTL.get(platform, METADATA_CACHE_DEFAULT_TTL)
+
+    def _purge_expired(self) -> None:
+        """
+        删除磁盘中已超过可用时间的条目
+        """
+        current_time = time.time()
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN")
+            for platform, (fresh_time, stale_time) in METADATA_CACHE_TTL.items():
+                self._connection.execute(
+                    "DELETE FROM metadata WHERE platform = ? AND fetched_at < ?",
+                    (platform, current_time - fresh_time - stale_time)
+                )
+
+    def _memory_put(self, key: str, entry: CacheEntry) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._memory_capacity:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, key: str) -> Optional[CacheEntry]:
+        """
+        依次在内存和磁盘中查找<key>，磁盘中找到的条目会被放入内存
+        """
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            return entry
+
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT platform, data, extra, fetched_at FROM metadata WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            entry = CacheEntry(row[0], json.loads(row[1]), None if row[2] is None else json.loads(row[2]), row[3])
+        except json.JSONDecodeError:
+            return None
+        self._memory_put(key, entry)
+        return entry
+
+    def put(self, key: str, platform: str, result: Result) -> None:
+        """
+        将成功的<result>写入两级缓存，无法转换为json的结果只保留在内存中
+        """
+        if result is None or not result.success or result.result is None:
+            return
+        entry = CacheEntry(platform, copy.deepcopy(result.result), copy.deepcopy(result.extra), time.time())
+        self._memory_put(key, entry)
+        try:
+            data = json.dumps(entry.data, ensure_ascii=False)
+            extra = None if entry.extra is None else json.dumps(entry.extra, ensure_ascii=False)
+        except (TypeError, ValueError):
+            return
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO metadata (key, platform, data, extra, fetched_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET platform = excluded.platform, data = excluded.data, "
+                "extra = excluded.extra, fetched_at = excluded.fetched_at",
+                (key, platform, data, extra, entry.fetched_at)
+            )
+
+    def invalidate(self, key: str) -> None:
+        """
+        删除<key>的缓存，例如资源已失效时
+        """
+        self._memory.pop(key, None)
+        with self._lock:
+            self._connection.execute("DELETE FROM metadata WHERE key = ?", (key,))
+
+    def _fetch(self, key: str, platform: str, fetch_function: Callable[[], Awaitable[Result]]) -> asyncio.Task:
+        """
+        发起对<key>的实际请求，同一键的请求正在进行时返回该请求
+        """
+        task = self._in_flight.get(key)
+        if task is not None:
+            return task
+
+        async def fetch_and_store() -> Result:
+            try:
+                result = await fetch_function()
+                self.put(key, platform, result)
+                negative_cache.NegativeCache().record(key, result)
+                return result
+            finally:
+                self._in_flight.pop(key, None)
+
+        task = asyncio.create_task(fetch_and_store())
+        self._in_flight[key] = task
+        return task
+
+    async def get_or_fetch(self, key: str, platform: str, fetch_function: Callable[[], Awaitable[Result]]) -> Result:
+        """
+        返回<key>的缓存结果，不存在或已不可用时调用<fetch_function>获取
+
+        :param key: 规范化的资源id，例如"bilibili:BV1xx411c7mD"
+        :param platform: 平台名称，决定缓存时间，见METADATA_CACHE_TTL
+        :param fetch_function: 实际获取信息的函数，返回Result
+        :return: 与fetch_function相同格式的Result
+        """
+        # 近期确认失效或受限的资源直接返回记录的失败原因
+        failed = negative_cache.NegativeCache().lookup(key)
+        if failed is not None:
+            await console.rp(f"资源近期获取失败，直接返回记录的原因：{key}，{failed.message}", f"[{self._name}]")
+            return failed
+
+        fresh_time, stale_time = self._ttl(platform)
+        entry = self._lookup(key)
+        if entry is not None:
+            age = entry.age()
+            if age < fresh_time:
+                self._hit_num += 1
+                await console.rp(f"使用缓存信息：{key}", f"[{self._name}]")
+                return entry.to_result()
+            if age < fresh_time + stale_time:
+                self._stale_num += 1
+                await console.rp(f"使用过期缓存信息并在后台更新：{key}", f"[{self._name}]")
+                # 后台请求在完成前保存在self._in_flight中
+                self._fetch(key, platform, fetch_function)
+                return entry.to_result()
+
+        self._miss_num += 1
+        return await asyncio.shield(self._fetch(key, platform, fetch_function))
+
+    def get_metrics(self) -> Dict[str, int]:
+        return {
+            "memory": len(self._memory),
+            "hit": self._hit_num,
+            "stale": self._stale_num,
+            "miss": self._miss_num,
+        }
+
+    def print_info(self):
+        metrics = self.get_metrics()
+        print(
+            f"{self._name} 当前状态：\n"
+            f"内存条目 {metrics['memory']} / {self._memory_capacity}，"
+            f"命中 {metrics['hit']}，过期命中 {metrics['stale']}，未命中 {metrics['miss']}\n"
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+async def get_or_fetch(key: str, platform: str, fetch_function: Callable[[], Awaitable[Result]]) -> Result:
+    """
+    通过进程共享的信息缓存获取<key>的结果
+    """
+    return await MetadataCache().get_or_fetch(key, platform, fetch_function)
+
+
+def invalidate(key: str) -> None:
+    """
+    删除进程共享的信息缓存中<key>的缓存
+    """
+    MetadataCache().invalidate(key)
@@ -0,0 +1,117 @@
+from typing import *
+from collections import OrderedDict
+import time
+
+from utils import Result, failed_result
+
+from zeta_bot import (
+    decorator,
+)
+
+# 记录的失败条目数量上限
+NEGATIVE_CACHE_CAPACITY = 1024
+
+# 被视为资源失效或受限的异常类（按类名匹配，包括子类）及其缓存时间（秒）
+# 只有不可重试（retryable=False）的失败会被记录，网络波动等可重试的失败不会被记录
+NEGATIVE_CACHE_TTL = {
+    # 哔哩哔哩：视频失效、区域版权限制
+    "ResponseCodeException": 600,
+    # 哔哩哔哩：BV号错误
+    "ArgsException": 3600,
+    # go-music-api：会员或区域版权限制
+    "ResourceRestrictedError": 600,
+    # yt-dlp：视频失效、区域限制、会员限定
+    "UnavailableVideoError": 1800,
+    "DownloadError": 600,
+    "ExtractorError": 300,
+}
+
+
+class NegativeEntry:
+    """
+    一条失败记录
+    """
+    def __init__(self, exception: Exception, message: str, expires_at: float):
+        self.exception = exception
+        self.message = message
+        self.expires_at = expires_at
+
+    def is_expired(self) -> bool:
+        return time.time() >= self.expires_at
+
+
+@decorator.Singleton
+class NegativeCache:
+    """
+    [单例] 失败结果缓存：记录因资源失效或受限而失败的键（信息缓存的键或音频uid），在缓存时间内直接返回相同的失败原因
+    返回的失败结果不可重试，因此也不会进入各处的重试循环或下载调度器
+    """
+    def __init__(self, capacity: int = NEGATIVE_CACHE_CAPACITY, name: str = "失败缓存"):
+        self._capacity = capacity
+        self._name = name
+        self._entries: "OrderedDict[str, NegativeEntry]" = OrderedDict()
+        self._hit_num = 0
+
+    @staticmethod
+    def _ttl(exception: Optional[Exception]) -> Optional[int]:
+        """
+        返回<exception>对应的缓存时间，不需要记录时返回None
+        """
+        if exception is None:
+            return None
+        for exception_class in type(exception).__mro__:
+            ttl = NEGATIVE_CACHE_TTL.get(exception_class.__name__)
+            if ttl is not None:
+                return ttl
+        return None
+
+    def record(self, key: str, result: Optional[Result]) -> bool:
+        """
+        如果<result>为资源失效或受限导致的不可重试失败，则记录<key>
+        <result>为成功结果时删除<key>的失败记录（例如同时进行的另一个请求记录了失败，而资源实际上已恢复）
+
+        :return: 是否被记录
+        """
+        if result is not None and result.success:
+            self.forget(key)
+            return False
+        if result is None or result.retryable:
+            return False
+        ttl = self._ttl(result.exception)
+        if ttl is None:
+            return False
+
+        self._entries[key] = NegativeEntry(result.exception, result.message, time.time() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._capacity:
+            self._entries.popitem(last=False)
+        return True
+
+    def lookup(self, key: str) -> Optional[Result]:
+        """
+        返回<key>仍在缓存时间内的失败结果，没有记录时返回None
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.is_expired():
+            del self._entries[key]
+            return None
+        self._hit_num += 1
+        return failed_result(exception=entry.exception, message=entry.message, retryable=False)
+
+    def forget(self, key: str) -> None:
+        """
+        删除<key>的失败记录，例如资源成功获取时
+        """
+        self._entries.pop(key, None)
+
+    def get_metrics(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "hit": self._hit_num,
+        }
+
+    def print_info(self):
+        metrics = self.get_metrics()
+        print(f"{self._name} 当前状态：\n记录 {metrics['entries']} / {self._capacity}，命中 {metrics['hit']}\n")
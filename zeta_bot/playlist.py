@@ -1,11 +1,14 @@
 from typing import Union, List
 
+import msgspec
+
 import errors
 import utils
 
 from zeta_bot import (
     audio
 )
+from zeta_bot.schema import PlaylistRecord
 
 # TODO 完成自建歌单
 
@@ -15,6 +18,8 @@ class Playlist:
         self._name = name
         self._playlist: list[audio.Audio] = []
         self._duration = 0
+        # 总时长文本的缓存 (总时长, 文本)，总时长变化时重新生成
+        self._duration_str_cache = (0, utils.convert_duration_to_str(0))
         self._limitation: Union[int, None] = limitation
         self._owner = owner
 
@@ -45,6 +50,15 @@ class Playlist:
             result.append((item.get_title(), item.get_duration_str()))
         return result
 
+    def get_page_lines(self, start: int, end: int) -> List[str]:
+        """
+        返回索引<start>至<end>（不包括）之间音频的已转义文本，用于只生成播放列表菜单的一页
+
+        :param start: 起始索引
+        :param end: 结束索引（不包括），超出列表长度时截止至列表末尾
+        """
+        return [item.get_escaped_line() for item in self._playlist[start:end]]
+
     def get_audio_str_list(self, index_start: bool = False) -> List[str]:
         temp_list = []
         if not index_start:
@@ -100,6 +114,20 @@ class Playlist:
         else:
             return False
 
+    def extend_audio(self, new_audio_list: List[audio.Audio]) -> int:
+        """
+        向播放列表的末尾批量添加音频，一次性更新播放列表时长
+        如果超过播放列表的数量上限，则只添加上限以内的部分
+
+        :param new_audio_list: 新增的音频列表
+        :return: 实际添加的音频数量
+        """
+        if self._limitation is not None:
+            new_audio_list = new_audio_list[:max(self._limitation - len(self._playlist), 0)]
+        self._playlist.extend(new_audio_list)
+        self._duration += sum(item.get_duration() for item in new_audio_list)
+        return len(new_audio_list)
+
     def insert_audio(self, new_audio: audio.Audio, index: int) -> bool:
         """
         在播放列表中索引<index>之前插入一个音频，并更新播放列表时长
@@ -115,6 +143,21 @@ class Playlist:
         else:
             return False
 
+    def replace_audio(self, old_audio: audio.Audio, new_audio: audio.Audio) -> bool:
+        """
+        将播放列表中的音频<old_audio>（以对象本身区分）替换为<new_audio>，并更新播放列表时长
+
+        :param old_audio: 被替换的音频
+        :param new_audio: 新的音频
+        :return: 布尔值，<old_audio>是否仍在播放列表中并被替换
+        """
+        for index, item in enumerate(self._playlist):
+            if item is old_audio:
+                self._playlist[index] = new_audio
+                self._duration += new_audio.get_duration() - old_audio.get_duration()
+                return True
+        return False
+
     def move_audio(self, from_index: int, to_index: int) -> None:
         """
         将<from_index>索引的音频移动到<to_index>的索引位置
@@ -169,18 +212,38 @@ class Playlist:
             self._duration -= self.get_audio(index).get_duration()
             del self._playlist[index]
 
+    def remove_range(self, start: int, end: int) -> List[audio.Audio]:
+        """
+        将索引<start>（包含）到<end>（不包含）之间的音频移出播放列表，一次性更新播放列表时长
+
+        :param start: 起始索引（包含）
+        :param end: 结束索引（不包含）
+        :return: 被移除的音频列表
+        """
+        removed_list = self._playlist[start:end]
+        if len(removed_list) > 0:
+            del self._playlist[start:end]
+            self._duration -= sum(item.get_duration() for item in removed_list)
+        return removed_list
+
+    def clear(self, skip_first=False) -> List[audio.Audio]:
+        """
+        清空播放列表
+
+        :param skip_first: 是否保留第一个音频（正在播放的音频）
+        :return: 被移除的音频列表
+        """
+        if skip_first:
+            return self.remove_range(1, len(self._playlist))
+        return self.remove_range(0, len(self._playlist))
+
     def remove_all(self, skip_first=False) -> None:
         """
         将播放列表中的全部音频移出播放列表
 
         :return:
         """
-        if not skip_first:
-            for i in range(len(self._playlist) - 1, -1, -1):
-                self.remove_audio(i)
-        else:
-            for i in range(len(self._playlist) - 1, 0, -1):
-                self.remove_audio(i)
+        self.clear(skip_first)
 
     def get_duration(self) -> int:
         """
@@ -192,7 +255,9 @@ class Playlist:
         """
         返回当前播放列表中剩余的音频的总时长，格式为字符串
         """
-        return utils.convert_duration_to_str(self._duration)
+        if self._duration_str_cache[0] != self._duration:
+            self._duration_str_cache = (self._duration, utils.convert_duration_to_str(self._duration))
+        return self._duration_str_cache[1]
 
     def get_owner(self) -> str:
         """
@@ -208,18 +273,22 @@ class Playlist:
         """
         return len(self._playlist) == 0
 
-    def encode(self) -> dict:
-        return {
-            "name": self._name,
-            "owner": self._owner,
-            "limitation": self._limitation,
-            "duration": self._duration,
-            "playlist": self._playlist
-        }
-
-
-def playlist_decoder(info_dict: dict) -> Playlist:
-    new_playlist = Playlist(info_dict["name"], info_dict["limitation"], info_dict["owner"])
-    for item in info_dict["playlist"]:
-        new_playlist.append_audio(audio.audio_decoder(item))
+    def encode(self) -> PlaylistRecord:
+        return PlaylistRecord(
+            name=self._name,
+            owner=self._owner,
+            limitation=self._limitation,
+            duration=self._duration,
+            playlist=[item.encode() for item in self._playlist]
+        )
+
+
+def playlist_decoder(info: Union[dict, PlaylistRecord]) -> Playlist:
+    """
+    通过PlaylistRecord或者读取到的字典重建Playlist
+    """
+    if isinstance(info, dict):
+        info = msgspec.convert(info, PlaylistRecord, strict=False)
+    new_playlist = Playlist(info.name, info.limitation, info.owner)
+    new_playlist.extend_audio([audio.audio_decoder(item) for item in info.playlist if item is not None])
     return new_playlist
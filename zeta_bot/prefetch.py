@@ -0,0 +1,117 @@
+from typing import *
+import asyncio
+import time
+
+import utils
+
+from zeta_bot import (
+    output_console,
+    audio,
+    file_management,
+    download_scheduler,
+)
+from zeta_bot.download_scheduler import DownloadPriority
+from zeta_bot.resource import DownloadHandler, ResourceClassifier
+
+# 控制台
+console = output_console.Console()
+
+# 资源分类器
+resource_classifier = ResourceClassifier()
+
+# 预检查的播放列表条目数量（不包括正在播放的音频）
+PREFETCH_LOOKAHEAD = 3
+
+# 直接串流音频的链接超过该时间（秒）后重新获取，防止链接过期
+STREAM_URL_TTL = 1800
+
+
+class Prefetcher:
+    """
+    播放列表预取：在后台检查各服务器播放列表中接下来的<lookahead>个音频，文件丢失或大小不符时通过下载调度器以预下载优先级重新获取
+    占位条目（PlaceholderAudio）同样在进入该范围时才被获取，因此大型播放列表只会占用有限的音频库空间
+    播放列表中的音频由服务器在音频库中锁定，不会被淘汰，修复后的音频通过GuildPlaylist.replace_audio替换并重新锁定
+    """
+    def __init__(self, scheduler: download_scheduler.DownloadScheduler, audio_library: file_management.AudioFileLibrary,
+                 lookahead: int = PREFETCH_LOOKAHEAD, name: str = "播放列表预取"):
+        self._scheduler = scheduler
+        self._audio_library = audio_library
+        self._lookahead = lookahead
+        self._name = name
+        # 正在检查的服务器 {guild_id: Task}
+        self._tasks: Dict[int, asyncio.Task] = {}
+        # 检查期间播放列表再次变化的服务器，检查结束后需要重新检查
+        self._rerun: Set[int] = set()
+
+    def schedule(self, guild_playlist) -> None:
+        """
+        安排对<guild_playlist>（GuildPlaylist）的后台检查，如果该服务器正在检查中则在结束后重新检查一次
+        """
+        guild_id = guild_playlist.get_guild().get_id()
+        task = self._tasks.get(guild_id)
+        if task is not None and not task.done():
+            self._rerun.add(guild_id)
+            return
+        self._tasks[guild_id] = asyncio.create_task(self._run(guild_id, guild_playlist))
+
+    async def _run(self, guild_id: int, guild_playlist) -> None:
+        try:
+            while True:
+                self._rerun.discard(guild_id)
+                for index in range(1, self._lookahead + 1):
+                    target_audio = guild_playlist.get_audio(index)
+                    if target_audio is None:
+                        break
+                    await self._repair(guild_playlist, target_audio, DownloadPriority.PREFETCH)
+                if guild_id not in self._rerun:
+                    break
+        except Exception as e:
+            await console.on_error(e)
+        finally:
+            self._tasks.pop(guild_id, None)
+
+    async def _repair(self, guild_playlist, target_audio: audio.Audio, priority: DownloadPriority) -> bool:
+        """
+        检查<target_audio>的文件，如果文件丢失或损坏则重新获取并替换播放列表中的条目
+
+        :return: 检查结束时音频文件是否可用
+        """
+        if target_audio.is_stream():
+            # go-music-api的串流链接为服务代理地址，不会过期
+            if resource_classifier.handler(target_audio.get_download_type()) is DownloadHandler.GO_MUSIC_API or \
+                    time.time() - target_audio.get_stream_time() < STREAM_URL_TTL:
+                return True
+        elif not target_audio.is_placeholder() and self._audio_library.verify_audio(target_audio):
+            return True
+
+        if target_audio.is_placeholder():
+            await console.rp(f"开始获取播放列表中的占位条目：{target_audio.get_title()}", f"[{self._name}]")
+        else:
+            await console.rp(
+                f"播放列表中的音频文件丢失、不完整或串流链接即将过期，开始重新获取：{target_audio.get_title()}",
+                f"[{self._name}]",
+                message_type=utils.PrintType.WARNING
+            )
+        result = await self._scheduler.refetch(target_audio, priority)
+        if result.result is None:
+            await console.rp(
+                f"音频重新获取失败：{target_audio.get_title()}，{result.message}",
+                f"[{self._name}]",
+                message_type=utils.PrintType.ERROR
+            )
+            return False
+
+        if result.result is not target_audio:
+            guild_playlist.replace_audio(target_audio, result.result)
+        return True
+
+    async def ensure_playable(self, guild_playlist) -> bool:
+        """
+        确保<guild_playlist>的第一个音频的文件可以播放，必要时以最高优先级重新获取
+
+        :return: 第一个音频是否可以播放，播放列表为空时返回False
+        """
+        target_audio = guild_playlist.get_audio(0)
+        if target_audio is None:
+            return False
+        return await self._repair(guild_playlist, target_audio, DownloadPriority.NOW_PLAYING)
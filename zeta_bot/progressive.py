@@ -0,0 +1,135 @@
+from typing import *
+import asyncio
+import os
+import threading
+
+from zeta_bot import (
+    audio,
+)
+
+# 开始边下载边播放前需要缓冲的数据量（字节）
+PROGRESSIVE_START_BYTES = 256 * 1024
+
+# 读取等待新数据的超时时间（秒），超时后重新检查状态
+PROGRESSIVE_READ_TIMEOUT = 1.0
+
+
+class ProgressiveBuffer:
+    """
+    边下载边播放的数据管道：下载器将数据写入正在下载的文件（.part）并通知已写入的数据量，FFmpeg（pipe=True）从该文件中读取
+    只支持一个读取者，内存中只保留读取位置，不会缓存音频数据
+    feed、replace_file和finish在事件循环中调用，read在FFmpeg的写入线程中调用
+    """
+    def __init__(self, start_bytes: int = PROGRESSIVE_START_BYTES):
+        self._start_bytes = start_bytes
+        self._condition = threading.Condition()
+        # 正在写入的文件路径，下载完成后为替换后的目标文件路径
+        self._path: Optional[str] = None
+        self._received = 0
+        self._read_offset = 0
+        self._finished = False
+        self._success = False
+        self._closed = False
+        # 读取者是否正在读取文件（读取时不持有锁，替换或删除文件前需要等待读取完成）
+        self._reading = False
+        # 下载开始前由下载器设置，为下载完成后将加入音频库的音频
+        self.audio: Optional[audio.Audio] = None
+        # 缓冲足够的数据或下载结束时被设置
+        self.ready = asyncio.Event()
+
+    def set_audio(self, target_audio: audio.Audio) -> None:
+        self.audio = target_audio
+
+    def set_file(self, path: str) -> None:
+        """
+        设置下载器正在写入的文件，需要在第一次feed之前调用
+        """
+        with self._condition:
+            self._path = path
+
+    def feed(self, size: int) -> None:
+        """
+        通知已向文件写入（并flush）了<size>字节
+        """
+        with self._condition:
+            if self._closed:
+                return
+            self._received += size
+            self._condition.notify_all()
+        if self._received >= self._start_bytes:
+            self.ready.set()
+
+    def replace_file(self, target_path: str) -> None:
+        """
+        将正在写入的文件替换为<target_path>，等待正在进行的读取完成后再替换（Windows下被打开的文件无法被替换）
+        """
+        with self._condition:
+            while self._reading:
+                self._condition.wait()
+            os.replace(self._path, target_path)
+            self._path = target_path
+
+    def finish(self, success: bool) -> None:
+        """
+        标记下载结束，重复调用时只有第一次生效
+        下载失败时需要在删除临时文件之前调用，返回时读取者已不会再打开该文件
+        """
+        with self._condition:
+            if self._finished:
+                return
+            self._finished = True
+            self._success = success
+            self._condition.notify_all()
+            while self._reading:
+                self._condition.wait()
+        self.ready.set()
+
+    def close(self) -> None:
+        """
+        读取者不再需要数据（例如播放被跳过），之后的read都返回空字节串
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def read(self, size: int = -1) -> bytes:
+        """
+        从文件的读取位置读取最多<size>字节，没有新数据时阻塞等待
+        下载结束且数据读完、下载失败或管道被关闭后返回空字节串
+        """
+        with self._condition:
+            while self._read_offset >= self._received and not self._finished and not self._closed:
+                self._condition.wait(PROGRESSIVE_READ_TIMEOUT)
+            if self._closed or (self._finished and not self._success) or self._path is None:
+                return b""
+            available = self._received - self._read_offset
+            if available <= 0:
+                return b""
+            if 0 <= size < available:
+                available = size
+            path = self._path
+            offset = self._read_offset
+            self._reading = True
+
+        # 读取文件时不持有锁，防止事件循环中的feed等待磁盘读取
+        data = b""
+        try:
+            # 每次读取后关闭文件，使下载器可以在读取间隙替换文件
+            with open(path, "rb") as file:
+                file.seek(offset)
+                data = file.read(available)
+        finally:
+            with self._condition:
+                self._reading = False
+                self._read_offset += len(data)
+                self._condition.notify_all()
+        return data
+
+    def is_finished(self) -> bool:
+        return self._finished
+
+    def is_success(self) -> bool:
+        return self._finished and self._success
+
+    def get_received(self) -> int:
+        return self._received
@@ -159,7 +159,7 @@ DEFAULT_DOWNLOAD_HANDLER: Dict[MediaPlatform, DownloadHandler] = {
 def write_default_download_handler_json(json_path: str):
     converted_dict = {}
     for platform in DEFAULT_DOWNLOAD_HANDLER.keys():
-        converted_dict[platform.encode()] = DEFAULT_DOWNLOAD_HANDLER[platform]
+        converted_dict[platform.encode()] = DEFAULT_DOWNLOAD_HANDLER[platform].encode()
     utils.json_save(json_path, converted_dict)
 
 
@@ -0,0 +1,118 @@
+from typing import *
+
+import msgspec
+
+
+class AudioRecord(msgspec.Struct):
+    """
+    Audio的存储格式
+    """
+    title: str
+    uid: str
+    source: str
+    source_id: str
+    download_type: str
+    path: str
+    # 部分平台返回的时长为浮点数或null，读取时不做严格检查，重建Audio时统一转换为整数
+    duration: Union[int, float, None] = 0
+    duration_str: str = ""
+    cover_path: Optional[str] = None
+    cover_url: Optional[str] = None
+    # 重新获取音频所需的来源原始信息，旧版本数据中不存在
+    source_info: Optional[Dict[str, Any]] = None
+
+
+class PlaylistRecord(msgspec.Struct):
+    """
+    Playlist的存储格式，列表中的null会在加载时被跳过
+    """
+    name: str
+    owner: Any = None
+    limitation: Optional[int] = None
+    duration: Union[int, float, None] = 0
+    playlist: List[Optional[AudioRecord]] = []
+
+
+class GuildRecord(msgspec.Struct):
+    """
+    服务器数据文件的存储格式
+    """
+    id: int
+    name: str
+    playlist: PlaylistRecord
+    playedlist: PlaylistRecord
+
+
+class LibraryNodeRecord(msgspec.Struct):
+    """
+    音频库索引（DoubleLinkedListDict）中一个节点的存储格式
+    """
+    item: AudioRecord
+    key: str
+
+
+class LibraryJournalRecord(msgspec.Struct):
+    """
+    音频库操作日志中一条记录的存储格式
+    """
+    op: str
+    key: str
+    item: Optional[AudioRecord] = None
+
+
+# 预先生成的解码器，避免每次解码时重新解析类型
+# strict=False允许数字与字符串之间的转换（例如"213"），以兼容旧版本或其他平台写入的数据
+journal_record_decoder = msgspec.json.Decoder(LibraryJournalRecord, strict=False)
+audio_record_decoder = msgspec.json.Decoder(AudioRecord, strict=False)
+
+
+def convert_list_lenient(raw_list: Any, item_type: Any) -> Tuple[list, int]:
+    """
+    将<raw_list>中的元素逐个转换为<item_type>，跳过null以及不符合格式的元素
+    用于整体转换失败时尽可能保留有效数据，而不是丢弃整个列表
+
+    :return: (转换成功的元素列表, 被跳过的元素数量)
+    """
+    if not isinstance(raw_list, list):
+        return [], 0
+    result = []
+    skipped_num = 0
+    for raw_item in raw_list:
+        if raw_item is None:
+            continue
+        try:
+            result.append(msgspec.convert(raw_item, item_type, strict=False))
+        except msgspec.ValidationError:
+            skipped_num += 1
+    return result, skipped_num
+
+
+def convert_playlist_record_lenient(raw: Any, default_name: str = "") -> Tuple[PlaylistRecord, int]:
+    """
+    逐条转换播放列表，跳过不符合格式的音频
+
+    :return: (PlaylistRecord, 被跳过的音频数量)
+    """
+    if not isinstance(raw, dict):
+        return PlaylistRecord(name=default_name), 0
+    audio_list, skipped_num = convert_list_lenient(raw.get("playlist"), AudioRecord)
+    try:
+        record = msgspec.convert({**raw, "playlist": []}, PlaylistRecord, strict=False)
+    except msgspec.ValidationError:
+        record = PlaylistRecord(name=default_name)
+    record.playlist = audio_list
+    return record, skipped_num
+
+
+def convert_guild_record_lenient(raw: Any, guild_id: int, guild_name: str) -> Tuple[GuildRecord, int]:
+    """
+    整体转换GuildRecord失败时使用，分别转换主播放列表和历史播放列表，跳过不符合格式的音频
+
+    :return: (GuildRecord, 被跳过的音频数量)
+    """
+    if not isinstance(raw, dict):
+        raw = {}
+    playlist_record, playlist_skipped = convert_playlist_record_lenient(raw.get("playlist"))
+    playedlist_record, playedlist_skipped = convert_playlist_record_lenient(raw.get("playedlist"))
+    record = GuildRecord(id=guild_id, name=guild_name, playlist=playlist_record, playedlist=playedlist_record)
+    return record, playlist_skipped + playedlist_skipped
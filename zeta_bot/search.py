@@ -0,0 +1,99 @@
+from typing import *
+import asyncio
+
+import utils
+from utils import Result, success_result, failed_result
+
+from zeta_bot import (
+    output_console,
+    bilibili,
+    ytdlp,
+    metadata_cache,
+)
+
+# 控制台
+console = output_console.Console()
+
+# 各平台搜索的超时时间（秒），超时的平台显示为搜索失败，不影响其他平台的结果
+SEARCH_SITE_TIMEOUT = {"哔哩哔哩": 10, "YouTube": 20}
+
+
+async def search_site(site: str, query: str, query_num: int = 5) -> Result:
+    """
+    在<site>搜索<query>，近期相同的搜索直接使用信息缓存中的结果
+
+    :return: 包含搜索结果列表的Result，超时或出错时为失败结果
+    """
+    if site == "哔哩哔哩":
+        search_function = bilibili.search
+    else:
+        search_function = ytdlp.youtube_search
+
+    async def fetch() -> Result:
+        try:
+            return success_result(result=await asyncio.wait_for(search_function(query, query_num=query_num), SEARCH_SITE_TIMEOUT[site]))
+        except asyncio.TimeoutError as e:
+            await console.rp(f"{site}搜索超时：{query}", "[搜索]", message_type=utils.PrintType.WARNING)
+            return failed_result(exception=e, message="搜索超时", retryable=True)
+        except Exception as e:
+            await console.on_error(e)
+            return failed_result(exception=e, message="搜索失败", retryable=True)
+
+    return await metadata_cache.get_or_fetch(f"search:{site}:{query_num}:{query.strip().lower()}", "search", fetch)
+
+
+async def search_sites(site_list: List[str], query: str, query_num: int = 5) -> AsyncIterator[Tuple[Dict[str, Result], List[str]]]:
+    """
+    在<site_list>中的各平台同时搜索<query>，每有平台完成时生成一次 (已完成的搜索结果, 仍在搜索中的平台)
+    已完成的搜索结果按完成的先后顺序排列，已显示的序号不会因为之后完成的平台而改变
+    提前停止迭代时取消仍在进行的搜索
+    """
+    search_result: Dict[str, Result] = {}
+    task_dict = {asyncio.create_task(search_site(key, query, query_num)): key for key in site_list}
+    pending = set(task_dict.keys())
+    try:
+        while len(pending) > 0:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                search_result[task_dict[task]] = task.result()
+            yield dict(search_result), [key for key in site_list if key not in search_result]
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def render_search_result(search_result: Dict[str, Result], pending_site_list: List[str]) -> Tuple[str, str, List[dict]]:
+    """
+    生成搜索菜单的文本
+
+    :param search_result: 已完成的各平台搜索结果
+    :param pending_site_list: 仍在搜索中的平台
+    :return: (标题文本, 网址文本, 按序号排列的结果列表)
+    """
+    title_str = f""
+    address_str = f""
+    resource_list = []
+    counter = 1
+    for key, result in search_result.items():
+        title_str += f"{key}\n"
+        address_str += f"{key}\n"
+        if not result:
+            title_str += f"> {result.message}\n"
+            address_str += f"> {result.message}\n"
+            continue
+        for item in result.result:
+            title_str += f"> [{counter}] **{utils.markdown_escape(item['title'])}** [{utils.convert_duration_to_str(item['duration'])}]\n"
+            address_str += (
+                f"> [{counter}] **{utils.markdown_escape(item['title'])}** [{utils.convert_duration_to_str(item['duration'])}]\n"
+                f"> {item['id']}\n"
+            )
+            resource_list.append(item)
+            counter += 1
+
+    for key in pending_site_list:
+        title_str += f"{key}\n> 搜索中...\n"
+        address_str += f"{key}\n> 搜索中...\n"
+
+    title_str += "\n**请选择要播放的音频序号**"
+    address_str += "\n**请选择要播放的音频序号**"
+    return title_str, address_str, resource_list
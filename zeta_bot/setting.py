@@ -274,7 +274,7 @@ bot_setting_configs = [
         "description": "本机器人的所有者（最高管理员）的纯数字ID，将获得全部权限，纯数字ID可以通过打开Discord开发者模式（位于 用户设置 → 高级设置 → 开发者模式）后，右键用户选择\"复制ID\"获得",
         "input_description": "请输入给予本机器人最高管理权限的Discord用户的用户ID（纯数字ID）",
         "dependent": None,
-        "regex": "\d+",
+        "regex": r"\d+",
         "options": None,
         "value": "000000000000000000"
     },
@@ -300,6 +300,17 @@ bot_setting_configs = [
         "options": None,
         "value": "2048"
     },
+    {
+        "id": "audio_library_eviction_policy",
+        "name": "音频库淘汰策略",
+        "type": "str",
+        "description": "音频库缓存超过容量上限时选择删除文件的策略：lru为删除最久没有使用的音频，lfu为删除使用次数最少的音频，gdsf为综合使用次数与文件大小优先删除体积大且很少使用的音频（使用次数只在本次运行期间统计）",
+        "input_description": "请选择音频库淘汰策略（输入lru，lfu或gdsf）",
+        "dependent": None,
+        "regex": None,
+        "options": ["lru", "lfu", "gdsf"],
+        "value": "lru"
+    },
     {
         "id": "guild_past_list_size",
         "name": "历史播放列表上限",
@@ -351,7 +362,7 @@ bot_setting_configs = [
         "description": "每日自动重启的时间",
         "input_description": "请设置自动重启时间（输入格式为\"小时:分钟:秒\"，示例：04:30:00）",
         "dependent": "auto_reboot",
-        "regex": "([01]\d|2[0123]|\d):([012345]\d|\d):([012345]\d|\d)",
+        "regex": r"([01]\d|2[0123]|\d):([012345]\d|\d):([012345]\d|\d)",
         "options": None,
         "value": "00:00:00"
     },
@@ -384,7 +395,7 @@ bot_setting_configs = [
         "description": "每日自动重启前通知的时间",
         "input_description": "请设置自动重启提前通知时间（输入格式为\"小时:分钟:秒\"，示例：04:25:00）",
         "dependent": "ar_reminder",
-        "regex": "([01]\d|2[0123]|\d):([012345]\d|\d):([012345]\d|\d)",
+        "regex": r"([01]\d|2[0123]|\d):([012345]\d|\d):([012345]\d|\d)",
         "options": None,
         "value": "23:55:00"
     },
@@ -399,6 +410,28 @@ bot_setting_configs = [
         "options": None,
         "value": "http://127.0.0.1:8080"
     },
+    {
+        "id": "storage_backend",
+        "name": "数据存储后端",
+        "type": "str",
+        "description": "用户数据、服务器播放列表以及音频库索引的存储方式：json为每项数据独立的json文件，sqlite为单个SQLite数据库（WAL模式，适合服务器数量较多的情况，首次启用时会自动导入现有的json数据）",
+        "input_description": "请选择数据存储后端（输入json或sqlite）",
+        "dependent": None,
+        "regex": None,
+        "options": ["json", "sqlite"],
+        "value": "json"
+    },
+    {
+        "id": "icon_asset_channel",
+        "name": "图标频道ID",
+        "type": "str",
+        "description": "用于存放机器人图标的文字频道的纯数字ID，设置后每个图标只上传一次，之后的信息通过CDN链接引用图标而不再附带图标文件，机器人需要有在该频道发送信息和附件的权限，输入0为不使用",
+        "input_description": "请输入图标频道ID（纯数字ID，输入0为不使用）",
+        "dependent": None,
+        "regex": r"\d+",
+        "options": None,
+        "value": "0"
+    },
     # {
     #     "id": "chat_ai",
     #     "name": "聊天AI",
@@ -0,0 +1,297 @@
+from typing import *
+import os
+import json
+import sqlite3
+import threading
+
+import msgspec
+
+import errors
+import utils
+
+from zeta_bot import (
+    schema,
+    file_management,
+)
+
+
+def compact_dumps(item) -> str:
+    """
+    将<item>转换为紧凑的json字符串（无缩进），对象通过其encode()方法转换
+    """
+    return utils.json_dumps(item, indent=None)
+
+
+class SQLiteStorage:
+    """
+    可选的SQLite存储后端（WAL模式），用于替代分散的json文件：
+    用户数据、服务器主播放列表、服务器历史播放记录以及音频库索引分别存储在带索引的数据表中，单条记录的修改不需要重写整个文件
+    连接可以被工作线程使用，所有操作由内部锁串行化
+    """
+    def __init__(self, path: str):
+        self._path = path
+        directory = os.path.dirname(self._path)
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self._path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._create_tables()
+
+    def _create_tables(self) -> None:
+        with self._lock:
+            self._connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+                CREATE TABLE IF NOT EXISTS members (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT,
+                    member_group TEXT,
+                    data TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS guilds (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT,
+                    playlist TEXT NOT NULL,
+                    playedlist_meta TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS played_history (
+                    guild_id INTEGER NOT NULL,
+                    position INTEGER NOT NULL,
+                    audio TEXT NOT NULL,
+                    PRIMARY KEY (guild_id, position)
+                );
+                CREATE TABLE IF NOT EXISTS library_entries (
+                    key TEXT PRIMARY KEY,
+                    position INTEGER NOT NULL,
+                    item TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_library_entries_position ON library_entries (position);
+                """
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    # ---------- 元数据 ----------
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value)
+            )
+
+    def is_migrated(self) -> bool:
+        return self.get_meta("migrated_from_json") is not None
+
+    # ---------- 用户 ----------
+
+    def load_member(self, user_id: int) -> Optional[dict]:
+        with self._lock:
+            row = self._connection.execute("SELECT data FROM members WHERE id = ?", (int(user_id),)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def save_members(self, member_list: List[dict]) -> None:
+        """
+        在一个事务中写入多个用户数据
+        """
+        rows = [(int(item["id"]), item["name"], item["group"], compact_dumps(item)) for item in member_list]
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN")
+            self._connection.executemany(
+                "INSERT INTO members (id, name, member_group, data) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET name = excluded.name, member_group = excluded.member_group, data = excluded.data",
+                rows
+            )
+
+    # ---------- 服务器 ----------
+
+    def load_guild(self, guild_id: int) -> Optional[dict]:
+        """
+        读取服务器数据，返回与Guild.encode()生成的json相同结构的字典，不存在则返回None
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT id, name, playlist, playedlist_meta FROM guilds WHERE id = ?", (int(guild_id),)
+            ).fetchone()
+            if row is None:
+                return None
+            history_rows = self._connection.execute(
+                "SELECT audio FROM played_history WHERE guild_id = ? ORDER BY position", (int(guild_id),)
+            ).fetchall()
+        playedlist_dict = json.loads(row[3])
+        playedlist_dict["playlist"] = [json.loads(item[0]) for item in history_rows]
+        return {
+            "id": row[0],
+            "name": row[1],
+            "playlist": json.loads(row[2]),
+            "playedlist": playedlist_dict
+        }
+
+    def save_guild(self, guild_id: int, guild_name: str, playlist, playedlist_meta: dict, history_append: list,
+                   history_length: int, replace_history: bool = False) -> None:
+        """
+        在一个事务中写入服务器的主播放列表和历史播放记录
+        历史播放记录只追加新增的部分，并删除最早的记录使数量保持为<history_length>
+
+        :param guild_id: 服务器ID
+        :param guild_name: 服务器名称
+        :param playlist: 主播放列表（PlaylistRecord或字典）
+        :param playedlist_meta: 历史播放列表中除音频列表以外的信息
+        :param history_append: 新增的历史记录（AudioRecord或字典），按从旧到新的顺序
+        :param history_length: 写入后应保留的历史记录数量
+        :param replace_history: 是否用<history_append>替换该服务器的全部历史记录
+        """
+        guild_id = int(guild_id)
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN")
+            self._connection.execute(
+                "INSERT INTO guilds (id, name, playlist, playedlist_meta) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET name = excluded.name, playlist = excluded.playlist, "
+                "playedlist_meta = excluded.playedlist_meta",
+                (guild_id, guild_name, compact_dumps(playlist), compact_dumps(playedlist_meta))
+            )
+
+            if replace_history:
+                self._connection.execute("DELETE FROM played_history WHERE guild_id = ?", (guild_id,))
+                next_position = 0
+            else:
+                row = self._connection.execute(
+                    "SELECT MAX(position) FROM played_history WHERE guild_id = ?", (guild_id,)
+                ).fetchone()
+                next_position = 0 if row[0] is None else row[0] + 1
+
+            if len(history_append) > 0:
+                self._connection.executemany(
+                    "INSERT INTO played_history (guild_id, position, audio) VALUES (?, ?, ?)",
+                    [(guild_id, next_position + i, compact_dumps(item)) for i, item in enumerate(history_append)]
+                )
+            # 只保留最新的<history_length>条记录
+            self._connection.execute(
+                "DELETE FROM played_history WHERE guild_id = ? AND position < ?",
+                (guild_id, next_position + len(history_append) - history_length)
+            )
+
+    # ---------- 音频库索引 ----------
+
+    def load_library(self) -> Tuple[List[schema.LibraryNodeRecord], int]:
+        """
+        按从最久未使用到最近使用的顺序返回音频库索引，不符合格式的记录会被跳过
+
+        :return: (音频库索引, 被跳过的记录数量)
+        """
+        with self._lock:
+            rows = self._connection.execute("SELECT key, item FROM library_entries ORDER BY position").fetchall()
+        result = []
+        skipped_num = 0
+        for key, item in rows:
+            try:
+                result.append(schema.LibraryNodeRecord(item=schema.audio_record_decoder.decode(item), key=key))
+            except msgspec.DecodeError:
+                skipped_num += 1
+        return result, skipped_num
+
+    def touch_library_entry(self, key: str, item) -> None:
+        """
+        插入或更新一条音频库索引，并将其标记为最近使用
+        """
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO library_entries (key, position, item) "
+                "VALUES (?, (SELECT COALESCE(MAX(position), 0) + 1 FROM library_entries), ?) "
+                "ON CONFLICT(key) DO UPDATE SET position = excluded.position, item = excluded.item",
+                (key, compact_dumps(item))
+            )
+
+    def remove_library_entry(self, key: str) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM library_entries WHERE key = ?", (key,))
+
+    def remove_library_entries(self, key_list: List[str]) -> None:
+        """
+        在一个事务中删除多条音频库索引
+        """
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN")
+            self._connection.executemany("DELETE FROM library_entries WHERE key = ?", [(key,) for key in key_list])
+
+    def save_library(self, entry_list: List[dict]) -> None:
+        """
+        在一个事务中用<entry_list>（格式与DoubleLinkedListDict.encode()相同）替换整个音频库索引
+        """
+        rows = [(item["key"], position, compact_dumps(item["item"])) for position, item in enumerate(entry_list)]
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN")
+            self._connection.execute("DELETE FROM library_entries")
+            self._connection.executemany("INSERT INTO library_entries (key, position, item) VALUES (?, ?, ?)", rows)
+
+    # ---------- 迁移 ----------
+
+    def migrate_from_json(self, member_root: str, guild_root: str, library_path: str) -> Dict[str, int]:
+        """
+        将现有的json文件数据导入数据库，已损坏的文件会被跳过，原文件保持不变
+        音频库索引会先应用<library_path>同名的.journal操作日志中尚未合并的记录
+
+        :param member_root: 用户文件目录
+        :param guild_root: 服务器文件目录
+        :param library_path: 音频库索引文件路径
+        :return: 各类数据导入的数量
+        """
+        counter = {"members": 0, "guilds": 0, "library_entries": 0}
+
+        member_list = []
+        if os.path.isdir(member_root):
+            for name in os.listdir(member_root):
+                if not name.endswith(".json") or name.startswith("#"):
+                    continue
+                try:
+                    member_list.append(utils.json_load(f"{member_root}/{name}"))
+                except errors.JSONFileError:
+                    continue
+        self.save_members(member_list)
+        counter["members"] = len(member_list)
+
+        if os.path.isdir(guild_root):
+            for name in os.listdir(guild_root):
+                guild_path = f"{guild_root}/{name}/{name}.json"
+                if not os.path.isfile(guild_path):
+                    continue
+                try:
+                    guild_dict = utils.json_load(guild_path)
+                    history = guild_dict["playedlist"].get("playlist") or []
+                    playedlist_meta = {key: value for key, value in guild_dict["playedlist"].items() if key != "playlist"}
+                    self.save_guild(
+                        guild_dict["id"], guild_dict["name"], guild_dict["playlist"], playedlist_meta,
+                        history, len(history), replace_history=True
+                    )
+                except (errors.JSONFileError, KeyError):
+                    continue
+                counter["guilds"] += 1
+
+        # 音频库索引由快照文件与尚未合并的操作日志组成，需要将日志应用到快照上
+        journal_path = f"{os.path.splitext(library_path)[0]}.journal"
+        if os.path.isfile(library_path) or os.path.isfile(journal_path):
+            try:
+                snapshot = utils.json_load(library_path, List[schema.LibraryNodeRecord])
+            except errors.JSONSchemaError as e:
+                snapshot = schema.convert_list_lenient(e.raw, schema.LibraryNodeRecord)[0]
+            except (errors.JSONFileError, FileNotFoundError):
+                snapshot = []
+            entry_list = msgspec.to_builtins(file_management.LibraryJournal(journal_path).replay(snapshot))
+            self.save_library(entry_list)
+            counter["library_entries"] = len(entry_list)
+
+        self.set_meta("migrated_from_json", utils.ctime_str())
+        return counter
@@ -1,6 +1,11 @@
 from __future__ import unicode_literals
 from typing import *
 from enum import Enum
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import copy
+import threading
+import urllib.parse
 
 import yt_dlp
 from yt_dlp import YoutubeDL
@@ -11,7 +16,8 @@ from utils import Result, success_result, failed_result
 
 from zeta_bot import (
     output_console,
-    audio
+    audio,
+    metadata_cache,
 )
 from zeta_bot.resource import MediaPlatform, LinkType, DownloadHandler, DownloadType, ResourceClassifier
 
@@ -28,20 +34,191 @@ SOURCE_MAP = {
     "unknown": "未知来源",
 }
 
+# yt-dlp工作线程数量
+YTDLP_WORKER_NUM = 2
+# 信息提取、搜索以及下载的超时时间（秒）
+YTDLP_INFO_TIMEOUT = 60
+YTDLP_SEARCH_TIMEOUT = 30
+YTDLP_DOWNLOAD_TIMEOUT = 1800
+# yt-dlp单次网络读写的超时时间（秒），信息提取过程中无法被取消，超时后工作线程只能等待网络操作超时才会被释放
+YTDLP_SOCKET_TIMEOUT = 20
+
+INFO_OPTIONS = {
+    'format': 'bestaudio/best',
+    'extract_flat': True,
+    "quiet": True,
+}
+
+SEARCH_OPTIONS = {
+    'format': 'bestaudio/best',
+    'outtmpl': "./downloads/" + '/%(title)s.%(ext)s',
+    'default_search': "ytsearch",
+    'extract_flat': True,
+    "quiet": True,
+}
+
+DOWNLOAD_OPTIONS = {
+    "format": "bestaudio/best",
+    "extract_flat": True,
+    "quiet": True,
+}
+
+
+class CancellableYoutubeDL(YoutubeDL):
+    """
+    在每次网络请求前调用<cancel_check>的YoutubeDL，使已超时或被取消的信息提取在下一次请求时中断
+    """
+    def __init__(self, params: dict, cancel_check: Callable[[], None]):
+        super().__init__(params)
+        self._cancel_check = cancel_check
+
+    def urlopen(self, req):
+        self._cancel_check()
+        return super().urlopen(req)
+
+
+class YtdlpWorkerPool:
+    """
+    yt-dlp工作线程池：同步的信息提取和下载在工作线程中运行，不再阻塞事件循环（语音发送与指令响应）
+    每个工作线程为每种参数组合保留一个已创建的YoutubeDL实例重复使用，避免每次调用重新加载提取器
+    超时的任务会在下一次网络请求或下载进度回调时中断，正在进行的单次网络操作由YTDLP_SOCKET_TIMEOUT限制时间，
+    因此卡住的任务最终会以异常结束并释放工作线程，而不会长期占用线程池
+    """
+    def __init__(self, worker_num: int = YTDLP_WORKER_NUM):
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(
+            max_workers=worker_num, thread_name_prefix="yt-dlp", initializer=self._warm_up
+        )
+
+    def _warm_up(self) -> None:
+        """
+        工作线程启动时预先创建常用的YoutubeDL实例
+        """
+        self._get_ydl(INFO_OPTIONS)
+        self._get_ydl(SEARCH_OPTIONS)
+
+    def _get_ydl(self, ydl_opts: dict) -> YoutubeDL:
+        """
+        返回当前工作线程中参数为<ydl_opts>的YoutubeDL实例，不存在时创建
+        """
+        instance_dict = getattr(self._local, "instance_dict", None)
+        if instance_dict is None:
+            instance_dict = {}
+            self._local.instance_dict = instance_dict
+
+        key = repr(sorted(ydl_opts.items()))
+        ydl = instance_dict.get(key)
+        if ydl is None:
+            ydl = CancellableYoutubeDL(
+                {"socket_timeout": YTDLP_SOCKET_TIMEOUT, **ydl_opts, "progress_hooks": [self._progress_hook]},
+                self._check_cancelled
+            )
+            instance_dict[key] = ydl
+        return ydl
+
+    def _progress_hook(self, progress: dict) -> None:
+        """
+        下载进度回调，当前任务已被取消或超时时中断下载
+        """
+        self._check_cancelled()
+
+    def _check_cancelled(self) -> None:
+        """
+        当前工作线程中的任务已被取消或超时时抛出DownloadCancelled
+        """
+        cancel_event = getattr(self._local, "cancel_event", None)
+        if cancel_event is not None and cancel_event.is_set():
+            raise yt_dlp.utils.DownloadCancelled("任务已被取消")
+
+    async def run(self, function: Callable[[YoutubeDL], Any], ydl_opts: dict, timeout: Optional[float] = None) -> Any:
+        """
+        在工作线程中使用参数为<ydl_opts>的YoutubeDL实例运行<function>
+
+        :param function: 接收YoutubeDL实例的同步函数
+        :param ydl_opts: YoutubeDL参数
+        :param timeout: 超时时间（秒），超时抛出asyncio.TimeoutError
+        :return: <function>的返回值，<function>中的异常会被重新抛出
+        """
+        cancel_event = threading.Event()
+
+        def job():
+            if cancel_event.is_set():
+                raise yt_dlp.utils.DownloadCancelled("任务已被取消")
+            self._local.cancel_event = cancel_event
+            try:
+                return function(self._get_ydl(ydl_opts))
+            finally:
+                self._local.cancel_event = None
+
+        future = asyncio.get_running_loop().run_in_executor(self._executor, job)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            # 尚未开始的任务不会再运行，正在运行的任务会在下一次网络请求或进度回调时中断
+            cancel_event.set()
+            raise
+
+    def shutdown(self) -> None:
+        """
+        取消等待中的任务并关闭线程池
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# yt-dlp工作线程池
+worker_pool = YtdlpWorkerPool()
+
+def cache_key(url: str) -> Tuple[str, str]:
+    """
+    返回<url>在信息缓存中的键与平台，YouTube单一视频链接的各种形式统一为视频id
+
+    :return: (键, 平台)
+    """
+    url = str(url).strip()
+    parsed = urllib.parse.urlparse(url)
+    host = parsed.netloc.lower()
+    for prefix in ("www.", "m.", "music."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    query = urllib.parse.parse_qs(parsed.query)
+
+    if "list" not in query:
+        if host == "youtu.be" and parsed.path.strip("/") != "":
+            return f"youtube:{parsed.path.strip('/')}", "youtube"
+        if host == "youtube.com" and parsed.path == "/watch" and "v" in query:
+            return f"youtube:{query['v'][0]}", "youtube"
+    return f"ytdlp:{url}", "ytdlp"
+
+
 async def get_info(url, cookie_file_path=None) -> Result:
-    ydl_opts = {
-        'format': 'bestaudio/best',
-        'extract_flat': True,
-        "quiet": True,
-    }
+    """
+    返回视频或播放列表信息，优先使用信息缓存
+    """
+    key, platform = cache_key(url)
+    result = await metadata_cache.get_or_fetch(key, platform, lambda: fetch_info(url, cookie_file_path))
+
+    # 其他形式的YouTube视频链接也以视频id缓存，便于重新获取时使用
+    if result.success and platform == "ytdlp" and result.result.get("extractor_key") == "Youtube" and \
+            result.result.get("_type", "video") == "video":
+        metadata_cache.MetadataCache().put(f"youtube:{result.result['id']}", "youtube", result)
+    return result
+
+
+async def fetch_info(url, cookie_file_path=None) -> Result:
+    """
+    通过yt-dlp提取视频或播放列表信息，不使用缓存
+    """
+    ydl_opts = dict(INFO_OPTIONS)
     if cookie_file_path is not None:
         ydl_opts["cookiefile"] = str(cookie_file_path)
 
     await console.rp(f"开始提取信息：{url}", f"[{level}]")
 
     try:
-        with YoutubeDL(ydl_opts) as ydl:
-            info_dict = ydl.extract_info(url, download=False)
+        # sanitize_info将结果转换为可以写入json的字典，以便保存到磁盘缓存
+        info_dict = await worker_pool.run(
+            lambda ydl: ydl.sanitize_info(ydl.extract_info(url, download=False)), ydl_opts, YTDLP_INFO_TIMEOUT
+        )
 
         video_id = info_dict["id"]
         video_title = info_dict["title"]
@@ -72,6 +249,14 @@ async def get_info(url, cookie_file_path=None) -> Result:
             print_head=True
         )
         return failed_result(exception=e, message="视频/音频不可用", retryable=False)
+    except asyncio.TimeoutError as e:
+        await console.rp(
+            "YT-DLP处理超时",
+            f"[{level}]",
+            message_type=utils.PrintType.ERROR,
+            print_head=True
+        )
+        return failed_result(exception=e, message="YT-DLP处理超时", retryable=True)
     else:
         if info_dict is None:
             await console.rp(
@@ -112,6 +297,56 @@ def construct_uid(video_id: str, download_type: DownloadType) -> str:
     return uid
 
 
+def get_placeholder_audio(entry: dict, download_type: DownloadType = DownloadType.YOUTUBE_PLAYLIST) -> audio.PlaceholderAudio:
+    """
+    通过播放列表信息中的一项（info_dict["entries"]中的元素）生成占位条目，在即将播放时才会获取
+    """
+    return audio.PlaceholderAudio(
+        title=entry["title"],
+        uid=construct_uid(video_id=entry["id"], download_type=download_type),
+        source="youtube" if download_type.name.startswith("YOUTUBE") else "unknown",
+        source_id=entry["id"],
+        download_type=download_type,
+        duration=int(entry["duration"] or 0)
+    )
+
+
+async def get_stream_audio(info_dict: dict, download_type: DownloadType = DownloadType.YOUTUBE_SINGLE) -> Result:
+    """
+    使用get_info已选择的音频格式链接，返回不保存文件、直接串流播放的音频
+    """
+    if "url" not in info_dict:
+        await console.rp(
+            f"{info_dict['id']}串流链接获取失败，信息中没有音频格式链接",
+            f"[{level}]",
+            message_type=utils.PrintType.ERROR,
+            print_head=True
+        )
+        return failed_result(exception=None, message="串流链接获取失败", retryable=False)
+
+    if download_type.name.startswith("YOUTUBE"):
+        source = "youtube"
+    elif download_type.name.startswith("NETEASE"):
+        source = "netease"
+    else:
+        source = "unknown"
+
+    new_audio = audio.Audio(
+        title=info_dict["title"],
+        uid=construct_uid(video_id=info_dict["id"], download_type=download_type),
+        source=source,
+        source_id=info_dict["id"],
+        download_type=download_type,
+        path="",
+        duration=int(info_dict["duration"] or 0)
+    )
+    new_audio.set_stream(info_dict["url"], info_dict.get("http_headers"))
+    if "thumbnail" in info_dict.keys():
+        new_audio.set_cover_url(info_dict["thumbnail"])
+
+    return success_result(result=new_audio)
+
+
 async def audio_download(youtube_url, info_dict: dict, download_dir: str, download_type: DownloadType = DownloadType.YOUTUBE_SINGLE, cookie_file_path=None) -> Result:
     if resource_classifier.handler(download_type) is not DownloadHandler.YT_DLP:
         raise ValueError(f"错误下载类型：{download_type.name}")
@@ -122,28 +357,33 @@ async def audio_download(youtube_url, info_dict: dict, download_dir: str, downlo
     video_id = info_dict["id"]
     video_title = info_dict["title"]
     file_extension = info_dict["ext"]
-    video_duration = info_dict["duration"]
+    video_duration = int(info_dict["duration"] or 0)
     size = utils.convert_byte(int(info_dict["filesize"]))
 
     uid = construct_uid(video_id=video_id, download_type=download_type)
     file_title = utils.legal_name(f"{uid} - {video_title}")
     download_path = f"{download_dir}/{file_title}.{file_extension}"
 
-    ydl_opts = {
-        "format": "bestaudio/best",
-        "outtmpl": download_path,
-        "extract_flat": True,
-        "quiet": True,
-    }
-
+    ydl_opts = dict(DOWNLOAD_OPTIONS)
     if cookie_file_path is not None:
         ydl_opts["cookiefile"] = str(cookie_file_path)
 
+    def download(ydl: YoutubeDL) -> None:
+        # 重复使用的实例每次下载前设置输出路径
+        ydl.params["outtmpl"]["default"] = download_path
+        # 信息中已包含音频格式时直接使用，不再重新提取；链接过期等原因失败时再通过链接下载
+        if "formats" in info_dict:
+            try:
+                ydl.process_ie_result(copy.deepcopy(info_dict), download=True)
+                return
+            except yt_dlp.utils.DownloadError:
+                pass
+        ydl.download([youtube_url])
+
     await console.rp(f"开始下载：{file_title}.{file_extension}", f"[{level}]")
 
     try:
-        with YoutubeDL(ydl_opts) as ydl:
-            ydl.download([youtube_url])
+        await worker_pool.run(download, ydl_opts, YTDLP_DOWNLOAD_TIMEOUT)
 
         if download_type.name.startswith("YOUTUBE"):
             source = "youtube"
@@ -199,6 +439,14 @@ async def audio_download(youtube_url, info_dict: dict, download_dir: str, downlo
             print_head=True
         )
         return failed_result(exception=e, message="视频/音频不可用", retryable=False)
+    except asyncio.TimeoutError as e:
+        await console.rp(
+            "YT-DLP处理超时",
+            f"[{level}]",
+            message_type=utils.PrintType.ERROR,
+            print_head=True
+        )
+        return failed_result(exception=e, message="YT-DLP处理超时", retryable=True)
     else:
         if new_audio is None:
             await console.rp(
@@ -216,21 +464,18 @@ async def youtube_search(query, query_num=5) -> list:
 
     query = query.strip()
 
-    ydl_opts = {
-        'format': 'bestaudio/best',
-        'outtmpl': "./downloads/" + '/%(title)s.%(ext)s',
-        'default_search': "ytsearch",
-        'extract_flat': True,
-        "quiet": True,
-    }
-
     if query == "":
         return []
 
     await console.rp(f"开始搜索：{query}", f"[{level}]")
 
-    with YoutubeDL(ydl_opts) as ydl:
-        extracted_info = ydl.extract_info(f"ytsearch{query_num}:{query}", download=False)
+    try:
+        extracted_info = await worker_pool.run(
+            lambda ydl: ydl.extract_info(f"ytsearch{query_num}:{query}", download=False), SEARCH_OPTIONS, YTDLP_SEARCH_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        await console.rp(f"搜索超时：{query}", f"[{level}]", message_type=utils.PrintType.ERROR, print_head=True)
+        return []
 
     result = []
     log_message = f"搜索 {query} 结果为："